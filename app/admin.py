@@ -0,0 +1,96 @@
+import asyncio
+import hmac
+import threading
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from app.models import RoutingUpdate
+from app.traffic import traffic
+from app.profiling import SamplingProfiler, monitor, profiles
+from app.similarity import similarity_cache
+from app.memory import accountant
+from app.config import ADMIN_TOKEN, PROFILE_SAMPLE_INTERVAL, PROFILE_MAX_SECONDS
+
+def is_admin(request: Request) -> bool:
+    provided = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(provided.encode(), ADMIN_TOKEN.encode())
+
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+
+    if not is_admin(request):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/routing")
+def get_routing():
+    return traffic.stats()
+
+@router.put("/routing")
+def update_routing(update: RoutingUpdate, request: Request):
+    log = request.state.logger
+    traffic.set_split(update.gateway_percent)
+    if update.reset:
+        traffic.reset()
+    log.info(f"routing updated: gateway_percent={traffic.gateway_percent} reset={update.reset}")
+    return traffic.stats()
+
+# one sampling session at a time; two would just measure each other
+profiling = asyncio.Lock()
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(request: Request, seconds: float = 10.0):
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {PROFILE_MAX_SECONDS}")
+    if profiling.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    async with profiling:
+        # this handler runs on the event loop thread, which is the one worth sampling
+        profiler = SamplingProfiler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+        await asyncio.to_thread(profiler.run, seconds)
+
+    request.state.logger.info(f"cpu profile taken: {seconds}s, {sum(profiler.samples.values())} samples")
+    return profiler.collapsed()
+
+@router.get("/profile/{request_id}", response_class=PlainTextResponse)
+def request_profile(request_id: str):
+    collapsed = profiles.get(request_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="No profile for this request")
+    return collapsed
+
+@router.get("/loop")
+def loop_stats():
+    return monitor.stats()
+
+@router.get("/similarity")
+def similarity_stats():
+    return similarity_cache.stats()
+
+# async so the caches are sized on the loop thread, where nothing mutates them mid-walk
+@router.get("/memory")
+async def memory_report():
+    return accountant.report()
+
+@router.post("/memory/enforce")
+async def enforce_memory_limits(request: Request):
+    evicted = accountant.enforce()
+    request.state.logger.info(f"memory limits enforced on demand: {evicted}")
+    return {"evicted": evicted, **accountant.report()}
+
+@router.post("/memory/snapshot")
+async def memory_snapshot(request: Request, limit: int = 20):
+    if not 0 < limit <= 200:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 200")
+    # taking and comparing snapshots walks every traced block, so it stays off the loop
+    result = await asyncio.to_thread(accountant.snapshot, limit)
+    request.state.logger.info(f"tracemalloc snapshot taken: {result['traced_bytes']} bytes traced")
+    return result
+
+@router.delete("/memory/snapshot")
+def stop_memory_tracing(request: Request):
+    stopped = accountant.stop_tracing()
+    request.state.logger.info(f"tracemalloc stopped: was_tracing={stopped}")
+    return {"stopped": stopped}
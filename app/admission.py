@@ -0,0 +1,123 @@
+import asyncio
+import time
+from app.priority import WeightedFairQueue, INTERACTIVE
+
+
+class AdmissionController:
+    """Caps concurrent requests, with a bounded wait queue for the overflow.
+
+    Waiters are queued per priority class and handed free slots in weighted fair
+    order, so a burst of bulk traffic cannot push interactive requests out.
+
+    In adaptive mode the limit follows an AIMD rule: it grows by one while the
+    limit is actually being used and latency stays under target, and shrinks
+    multiplicatively when a request is slow or fails. Like TCP, it shrinks at most
+    once per round trip: a slow or failed request that was already running when
+    the limit was last cut says nothing about the new limit and is ignored.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        max_queue: int = 0,
+        queue_timeout: float = 1.0,
+        adaptive: bool = False,
+        min_limit: int = 1,
+        max_limit: int = 1000,
+        latency_target: float = 5.0,
+        backoff_ratio: float = 0.9,
+    ):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, limit)
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters = WeightedFairQueue()
+        self._last_decrease = float("-inf")
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: str = INTERACTIVE) -> bool:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+        if len(self._waiters) >= self.max_queue:
+            # a full queue sheds its lowest-priority waiter to make room for a more important one
+            evicted = self._waiters.evict_below(priority) if self.max_queue else None
+            while evicted is not None and evicted.done():
+                evicted = self._waiters.evict_below(priority)
+            if evicted is None:
+                self.rejected += 1
+                return False
+            evicted.set_result(False)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.push(priority, fut)
+        try:
+            admitted = await asyncio.wait_for(fut, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(fut)
+            self.timed_out += 1
+            return False
+        except asyncio.CancelledError:
+            self._discard(fut)
+            # the slot may have been handed over just before we were cancelled
+            if fut.done() and not fut.cancelled():
+                self.release(0.0)
+            raise
+
+        if not admitted:
+            self.rejected += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def release(self, latency: float, dropped: bool = False) -> None:
+        self.in_flight -= 1
+
+        if self.adaptive:
+            self._adjust(latency, dropped)
+
+        while self._waiters and self.in_flight < self.limit:
+            fut = self._waiters.pop()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(True)
+
+    def _adjust(self, latency: float, dropped: bool) -> None:
+        if dropped or latency > self.latency_target:
+            now = time.monotonic()
+            if now - latency >= self._last_decrease:
+                self.limit = max(self.min_limit, int(self.limit * self.backoff_ratio))
+                self._last_decrease = now
+        elif self.in_flight + 1 >= self.limit / 2:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def _discard(self, fut) -> None:
+        self._waiters.remove(fut)
+
+    def memory_sources(self) -> list:
+        return [self._waiters]
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queued_by_priority": self._waiters.depth(),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
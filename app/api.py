@@ -1,78 +1,510 @@
-from app.models import Message
+from app.models import Message, BatchItem, BotConfig, CallbackReply
 from fastapi import APIRouter, Request, HTTPException
-from app.services import send_telegram_message, ask_llm, send_message_to_gateway
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from app.services import (
+    send_telegram_message, send_telegram_media, ask_llm, send_message_to_gateway, answer_callback_query,
+    edit_message_text, MEDIA_METHODS,
+)
 from app.logger import logger, RequestLoggerAdapter
-from app.config import GATEWAY_ENABLED
+from app.bots import registry, DEFAULT_BOT_ID
+from app.media import extract_media, ask_llm_with_media, MediaTooLargeError
+from app.metrics import metrics
+from app.traffic import traffic, GATEWAY, LLM
+from app.priority import classify_text, classify_chat, COMMAND
+from app.throttle import throttle
+from app.jobs import jobs
+from app.capture import capture
+from app.commands import commands
+from app.lifecycle import work, ShuttingDownError
+from app.config import (
+    WEBHOOK_MAX_BODY_BYTES, WEBHOOK_ALLOWED_UPDATES, MEDIA_ENABLED, BATCH_MAX_ITEMS, BATCH_MAX_BODY_BYTES, BATCH_CONCURRENCY,
+    INBOUND_THROTTLE_ACTION, INBOUND_THROTTLE_REPLY, CALLBACK_HANDLER_TIMEOUT,
+)
+from typing import Dict, List, Optional
+import asyncio
+import hmac
+import json
 
 router = APIRouter()
 
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# the Bot API update types; anything else a sender puts in the body is counted as "other"
+# so metric labels stay bounded
+TELEGRAM_UPDATE_TYPES = frozenset({
+    "message", "edited_message", "channel_post", "edited_channel_post", "business_connection",
+    "business_message", "edited_business_message", "deleted_business_messages", "message_reaction",
+    "message_reaction_count", "inline_query", "chosen_inline_result", "callback_query", "shipping_query",
+    "pre_checkout_query", "purchased_paid_media", "poll", "poll_answer", "my_chat_member", "chat_member",
+    "chat_join_request", "chat_boost", "removed_chat_boost",
+})
+
+def reject_webhook(reason: str, status_code: int, detail: str) -> HTTPException:
+    metrics.inc("anygram_webhook_rejected_total", reason=reason)
+    return HTTPException(status_code=status_code, detail=detail)
+
+def authenticate_webhook(request: Request, bot: Optional[BotConfig]) -> BotConfig:
+    # runs before the body is read so junk traffic costs a header lookup only
+    provided = request.headers.get(SECRET_TOKEN_HEADER)
+
+    if bot is None:
+        bot = registry.by_secret(provided) if provided else registry.get(DEFAULT_BOT_ID)
+        if bot is None:
+            raise reject_webhook("secret_token", 401, "Invalid secret token")
+
+    if bot.secret_token and not (provided and hmac.compare_digest(provided.encode(), bot.secret_token.encode())):
+        raise reject_webhook("secret_token", 401, "Invalid secret token")
+
+    return bot
+
+async def read_update(request: Request) -> dict:
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > WEBHOOK_MAX_BODY_BYTES:
+        raise reject_webhook("body_too_large", 413, "Payload too large")
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > WEBHOOK_MAX_BODY_BYTES:
+            raise reject_webhook("body_too_large", 413, "Payload too large")
+
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise reject_webhook("invalid_json", 400, "Invalid Telegram webhook payload")
+
+    if not isinstance(data, dict):
+        raise reject_webhook("invalid_json", 400, "Invalid Telegram webhook payload")
+    return data
+
+def update_type(data: dict) -> Optional[str]:
+    return next((key for key in data if key != "update_id"), None)
+
+def resolve_bot(bot_id: str) -> BotConfig:
+    bot = registry.get(bot_id)
+    if bot is None:
+        raise HTTPException(status_code=404, detail="Unknown bot")
+    return bot
+
 @router.post("/send")
-async def send_message(request: Request, msg: Message):
+async def send_message(request: Request, msg: Message, callback_url: Optional[str] = None):
+    return await _send_message(request, msg, None, callback_url)
+
+@router.post("/{bot_id}/send")
+async def send_bot_message(bot_id: str, request: Request, msg: Message, callback_url: Optional[str] = None):
+    return await _send_message(request, msg, resolve_bot(bot_id), callback_url)
+
+@router.get("/send/jobs/{job_id}")
+async def send_job_status(job_id: str):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+def wants_async(request: Request) -> bool:
+    # ?async=true or the standard Prefer: respond-async header
+    if request.query_params.get("async", "").lower() in ("1", "true", "yes"):
+        return True
+    return "respond-async" in request.headers.get("prefer", "").lower()
+
+def parse_routing_id(routing_id: str, bot: Optional[BotConfig]):
+    # telegram:<chat_id> for the default bot, telegram:<bot_id>:<chat_id> for the others
+    parts = routing_id.split(":")
+    if len(parts) == 2:
+        origin, routed_chat_id = parts
+    elif len(parts) == 3:
+        origin, routed_bot_id, routed_chat_id = parts
+        if origin == "telegram" and bot is None:
+            bot = resolve_bot(routed_bot_id)
+    else:
+        raise HTTPException(status_code=400, detail="Invalid X-Routing-ID header format")
+    return (routed_chat_id if origin == "telegram" else None), bot
+
+def resolve_routing(request: Request, chat_id, bot: Optional[BotConfig]):
     log: RequestLoggerAdapter = request.state.logger
-    log.debug(f"Received message: {msg}")
 
-    if not msg.chat_id:
-        routing_id = request.headers.get("X-Routing-ID") or request.headers.get("X-Routing-Id") 
+    if not chat_id:
+        routing_id = request.headers.get("X-Routing-ID") or request.headers.get("X-Routing-Id")
         log.debug(f"Received X-Routing-ID: {routing_id}")
 
         if routing_id:
-            try:
-                origin, chat_id = routing_id.split(":")
-                if origin == "telegram":
-                    msg.chat_id = chat_id
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid X-Routing-ID header format")
+            chat_id, bot = parse_routing_id(routing_id, bot)
 
-    if not msg.chat_id:
+    if not chat_id:
         raise HTTPException(status_code=400, detail="chat_id is required")
 
+    if bot is None:
+        bot = registry.get(DEFAULT_BOT_ID)
+    return chat_id, bot
+
+async def _send_message(request: Request, msg: Message, bot: Optional[BotConfig], callback_url: Optional[str] = None):
+    log: RequestLoggerAdapter = request.state.logger
+    log.debug(f"Received message: {msg}")
+    capture.record(request, msg.model_dump())
+
+    msg.chat_id, bot = resolve_routing(request, msg.chat_id, bot)
+    callback_url = callback_url or request.headers.get("X-Callback-URL")
+
+    if callback_url or wants_async(request):
+        return await _enqueue_message(request, msg, bot, callback_url)
+
     try:
-        return await send_telegram_message(msg, request)
+        return await send_telegram_message(msg, request, bot=bot)
     except Exception as e:
         logger.error(f"Error sending Telegram message: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def read_batch(request: Request) -> List[dict]:
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > BATCH_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Payload too large")
+
+    # NDJSON is parsed line by line as it arrives, so only the unfinished line is buffered
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    body = bytearray()
+    received = 0
+    items: list = []
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > BATCH_MAX_BODY_BYTES:
+                raise HTTPException(status_code=413, detail="Payload too large")
+            body += chunk
+            if ndjson:
+                *lines, rest = body.split(b"\n")
+                body = bytearray(rest)
+                items.extend(json.loads(line) for line in lines if line.strip())
+                if len(items) > BATCH_MAX_ITEMS:
+                    raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+        if ndjson:
+            if body.strip():
+                items.append(json.loads(body))
+        else:
+            items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid batch payload")
+
+    if isinstance(items, dict):
+        items = items.get("items")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Invalid batch payload")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+    return items
+
+def route_batch_item(raw, bot: Optional[BotConfig]):
+    if not isinstance(raw, dict):
+        raise HTTPException(status_code=400, detail="Invalid batch item")
+    try:
+        item = BatchItem(**raw)
+    except ValidationError:
+        raise HTTPException(status_code=400, detail="Invalid batch item")
+
+    chat_id = item.chat_id
+    if not chat_id and item.routing_id:
+        chat_id, bot = parse_routing_id(item.routing_id, bot)
+    if not chat_id:
+        raise HTTPException(status_code=400, detail="chat_id is required")
+    bot = bot or registry.get(DEFAULT_BOT_ID)
+    if bot is None:
+        # BOTS_FILE without a default bot: items must name theirs in routing_id
+        raise HTTPException(status_code=404, detail="Unknown bot")
+    return Message(chat_id=chat_id, text=item.text, reply_markup=item.reply_markup), bot
+
+async def _enqueue_message(request: Request, msg: Message, bot: BotConfig, callback_url: Optional[str]):
+    log: RequestLoggerAdapter = request.state.logger
+
+    if callback_url and not jobs.callback_allowed(callback_url):
+        raise HTTPException(status_code=400, detail="Callback URL is not allowed")
+    if jobs.full:
+        raise HTTPException(status_code=503, detail="Too many pending sends, retry later",
+                            headers={"Retry-After": "1"})
+
+    job = await jobs.create(msg.chat_id, bot.id, callback_url)
+    try:
+        work.spawn(jobs.run(job, lambda: send_telegram_message(msg, request, bot=bot)), "send")
+    except ShuttingDownError:
+        await jobs.abandon(job, "Server is shutting down")
+        raise HTTPException(status_code=503, detail="Server is shutting down", headers={"Retry-After": "1"})
+
+    log.info(f"send queued as job {job['job_id']}")
+    status_url = str(request.app.url_path_for("send_job_status", job_id=job["job_id"]))
+    return JSONResponse(
+        status_code=202,
+        content={"ok": True, "job_id": job["job_id"], "status": job["status"], "status_url": status_url},
+        headers={"Location": status_url},
+    )
+
+@router.post("/send/batch")
+async def send_batch(request: Request):
+    return await _send_batch(request, None)
+
+@router.post("/{bot_id}/send/batch")
+async def send_bot_batch(bot_id: str, request: Request):
+    return await _send_batch(request, resolve_bot(bot_id))
+
+async def _send_batch(request: Request, bot: Optional[BotConfig]):
+    log: RequestLoggerAdapter = request.state.logger
+    items = await read_batch(request)
+    results: List[Optional[dict]] = [None] * len(items)
+
+    # replies to the same chat are sent one after another so they arrive in order
+    chats: Dict[tuple, List[tuple]] = {}
+    for index, raw in enumerate(items):
+        try:
+            msg, item_bot = route_batch_item(raw, bot)
+        except HTTPException as e:
+            results[index] = {"ok": False, "status": e.status_code, "error": e.detail}
+            continue
+        chats.setdefault((item_bot.id, str(msg.chat_id)), []).append((index, msg, item_bot))
+
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def send_chat(queue: List[tuple]):
+        async with slots:
+            for index, msg, item_bot in queue:
+                try:
+                    result = await send_telegram_message(msg, request, bot=item_bot)
+                    if isinstance(result, dict) and result.get("ok") is False:
+                        results[index] = {"ok": False, "status": result.get("error_code") or 502,
+                                          "error": result.get("description", "Telegram rejected the message")}
+                    else:
+                        results[index] = {"ok": True, "status": 200, "result": result}
+                except Exception as e:
+                    log.error(f"Error sending batch item {index}: {e}")
+                    results[index] = {"ok": False, "status": 500, "error": "Internal server error"}
+
+    await asyncio.gather(*(send_chat(queue) for queue in chats.values()))
+
+    sent = sum(1 for result in results if result["ok"])
+    metrics.inc("anygram_batch_items_total", sent, outcome="sent")
+    metrics.inc("anygram_batch_items_total", len(results) - sent, outcome="failed")
+    log.info(f"batch of {len(results)} items: {sent} sent, {len(results) - sent} failed")
+
+    return {"ok": sent == len(results), "sent": sent, "failed": len(results) - sent,
+            "results": [{"index": index, **result} for index, result in enumerate(results)]}
+
+@router.post("/send/{media}")
+async def send_media(media: str, request: Request, chat_id: Optional[str] = None, caption: Optional[str] = None,
+                     filename: Optional[str] = None, file_id: Optional[str] = None):
+    return await _send_media(request, media, chat_id, caption, filename, file_id, None)
+
+@router.post("/{bot_id}/send/{media}")
+async def send_bot_media(bot_id: str, media: str, request: Request, chat_id: Optional[str] = None,
+                         caption: Optional[str] = None, filename: Optional[str] = None, file_id: Optional[str] = None):
+    return await _send_media(request, media, chat_id, caption, filename, file_id, resolve_bot(bot_id))
+
+async def _send_media(request: Request, media: str, chat_id, caption, filename, file_id, bot: Optional[BotConfig]):
+    log: RequestLoggerAdapter = request.state.logger
+
+    if media not in MEDIA_METHODS:
+        raise HTTPException(status_code=404, detail=f"Unsupported media type: {media}")
+
+    chat_id, bot = resolve_routing(request, chat_id, bot)
+    content_hash = request.headers.get("X-Content-SHA256")
+    if not file_id and not content_hash and request.headers.get("content-length") == "0":
+        raise HTTPException(status_code=400, detail="A file body or file_id is required")
+
+    content_type = request.headers.get("content-type", "application/octet-stream")
+
+    try:
+        return await send_telegram_media(
+            media,
+            chat_id,
+            request,
+            body=request.stream(),
+            filename=filename or media,
+            content_type=content_type,
+            caption=caption,
+            file_id=file_id,
+            content_hash=content_hash,
+            bot=bot,
+        )
+    except Exception as e:
+        log.error(f"Error sending Telegram {media}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+ROUTE_ERRORS = {GATEWAY: "Error sending message to gateway", LLM: "Error processing query"}
+
+async def dispatch_text(path: str, prompt: str, chat_id, request: Request, bot: BotConfig) -> Optional[str]:
+    async with traffic.track(path):
+        if path == GATEWAY:
+            await send_message_to_gateway(prompt, str(chat_id), request, bot=bot)
+            return None
+        return await ask_llm(prompt, request, bot=bot)
+
 @router.post("/webhook")
 async def telegram_webhook(request: Request):
+    return await _handle_webhook(request, None)
+
+@router.post("/{bot_id}/webhook")
+async def bot_webhook(bot_id: str, request: Request):
+    return await _handle_webhook(request, resolve_bot(bot_id))
+
+async def _handle_webhook(request: Request, bot: Optional[BotConfig]):
     log: RequestLoggerAdapter = request.state.logger
 
     try:
-        data = await request.json()
+        bot = authenticate_webhook(request, bot)
+        data = await read_update(request)
         log.debug(f"message received: {data}")
+        capture.record(request, data)
+
+        kind = update_type(data)
+        if kind is None:
+            raise reject_webhook("invalid_payload", 400, "Invalid Telegram webhook payload")
+
+        if kind not in WEBHOOK_ALLOWED_UPDATES:
+            # answer 200 so Telegram does not keep retrying updates we never handle
+            metrics.inc("anygram_webhook_ignored_total",
+                        update_type=kind if kind in TELEGRAM_UPDATE_TYPES else "other")
+            return {"ok": True, "ignored": kind}
+
+        if kind == "callback_query":
+            return await _handle_callback_query(request, data["callback_query"], bot)
+
+        message = data.get("message")
+        if not isinstance(message, dict) or "chat" not in message or "id" not in message["chat"]:
+            raise reject_webhook("invalid_payload", 400, "Invalid Telegram webhook payload")
+
+        media = extract_media(message) if MEDIA_ENABLED and "text" not in message else None
+        if "text" not in message and media is None:
+            raise reject_webhook("invalid_payload", 400, "Invalid Telegram webhook payload")
 
-        if "message" not in data or "text" not in data["message"] or "chat" not in data["message"] or "id" not in data["message"]["chat"]:
-            raise HTTPException(status_code=400, detail="Invalid Telegram webhook payload")
+        chat_id = message["chat"]["id"]
+        user_id = (message.get("from") or {}).get("id")
 
-        prompt = data["message"]["text"]
-        chat_id = data["message"]["chat"]["id"]
+        # over-limit messages stop here, before any upstream call
+        scope = throttle.check(bot.id, user_id, chat_id)
+        if scope is not None:
+            log.info(f"inbound message throttled: scope={scope} user_id={user_id} chat_id={chat_id}")
+            if INBOUND_THROTTLE_ACTION == "reply" and throttle.should_notify(bot.id, chat_id):
+                try:
+                    await send_telegram_message(Message(chat_id=chat_id, text=INBOUND_THROTTLE_REPLY), request, bot=bot)
+                except Exception as e:
+                    log.error(f"Error sending throttle notice: {e}")
+            return {"ok": True, "throttled": scope}
 
-        if GATEWAY_ENABLED:
+        request.state.priority = classify_chat(chat_id, classify_text(message.get("text"), request.state.priority))
+
+        # configured commands are answered here, without an LLM round trip
+        text = message.get("text")
+        if text and text.startswith("/"):
             try:
-                await send_message_to_gateway(prompt, str(chat_id), request)
-                return {"ok": True, "source": "gateway"}
+                reply = await commands.dispatch(text, message, bot, request)
             except Exception as e:
-                log.error(f"Error sending message to gateway: {e}")
-                raise HTTPException(status_code=500, detail="Error sending message to gateway")
-        else:
+                log.error(f"Error handling command: {e}")
+                raise HTTPException(status_code=500, detail="Error processing command")
+            if reply is not None:
+                try:
+                    await send_telegram_message(Message(chat_id=chat_id, text=reply), request, bot=bot)
+                except Exception as e:
+                    log.error(f"Error sending Telegram response: {e}")
+                    raise HTTPException(status_code=500, detail="Error sending response")
+                return {"ok": True, "source": "command"}
+
+        if media is not None:
+            # the gateway envelope only carries text, so media is always answered directly
             try:
-                llm_response = await ask_llm(prompt, request)
+                llm_response = await ask_llm_with_media(media, message.get("caption", ""), request, bot=bot)
+            except MediaTooLargeError as e:
+                log.warning(f"Media rejected: {e}")
+                metrics.inc("anygram_media_rejected_total", reason="too_large")
+                return {"ok": False, "detail": "Media too large"}
             except Exception as e:
-                log.error(f"Error querying LLM: {e}")
+                log.error(f"Error querying LLM with media: {e}")
                 raise HTTPException(status_code=500, detail="Error processing query")
-            
-            msg = Message(chat_id=chat_id, text=llm_response)
-            
+        else:
+            # a bot with gateway_enabled set is pinned to that path, the rest follow the runtime split
+            pinned = bot.gateway_enabled is not None
+            path = (GATEWAY if bot.gateway_enabled else LLM) if pinned else traffic.choose()
+
             try:
-                await send_telegram_message(msg, request)
+                llm_response = await dispatch_text(path, message["text"], chat_id, request, bot)
             except Exception as e:
-                log.error(f"Error sending Telegram response: {e}")
-                raise HTTPException(status_code=500, detail="Error sending response")
-            
-            return {"ok": True, "source": "llm"}
-        
+                log.error(f"{ROUTE_ERRORS[path]}: {e}")
+                fallback = None if pinned else traffic.fallback(path)
+                if fallback is None:
+                    raise HTTPException(status_code=500, detail=ROUTE_ERRORS[path])
+
+                log.warning(f"failing over from {path} to {fallback}")
+                metrics.inc("anygram_routing_failover_total", source=path, target=fallback)
+                path = fallback
+                try:
+                    llm_response = await dispatch_text(path, message["text"], chat_id, request, bot)
+                except Exception as e:
+                    log.error(f"{ROUTE_ERRORS[path]}: {e}")
+                    raise HTTPException(status_code=500, detail=ROUTE_ERRORS[path])
+
+            if path == GATEWAY:
+                return {"ok": True, "source": "gateway"}
+
+        msg = Message(chat_id=chat_id, text=llm_response)
+
+        try:
+            await send_telegram_message(msg, request, bot=bot)
+        except Exception as e:
+            log.error(f"Error sending Telegram response: {e}")
+            raise HTTPException(status_code=500, detail="Error sending response")
+
+        return {"ok": True, "source": "llm"}
+
     except HTTPException:
         raise
     except Exception as e:
         log.error(f"Unexpected error in webhook: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
-    
\ No newline at end of file
+
+async def _handle_callback_query(request: Request, query, bot: BotConfig):
+    log: RequestLoggerAdapter = request.state.logger
+
+    if not isinstance(query, dict) or not query.get("id"):
+        raise reject_webhook("invalid_payload", 400, "Invalid Telegram webhook payload")
+
+    # the user is looking at a spinner until the query is answered, so it goes ahead of everything else
+    request.state.priority = COMMAND
+    message = query.get("message") or {}
+    chat_id = (message.get("chat") or {}).get("id")
+    user_id = (query.get("from") or {}).get("id")
+
+    reply = None
+    timed_out = False
+    scope = throttle.check(bot.id, user_id, chat_id)
+    if scope is not None:
+        log.info(f"callback query throttled: scope={scope} user_id={user_id} chat_id={chat_id}")
+    else:
+        # handlers get a deadline so a slow one cannot keep the spinner going past Telegram's timeout
+        try:
+            reply = await asyncio.wait_for(commands.dispatch_callback(query, bot, request), CALLBACK_HANDLER_TIMEOUT)
+        except asyncio.TimeoutError:
+            timed_out = True
+            log.warning(f"callback query handler took longer than {CALLBACK_HANDLER_TIMEOUT}s, answering without it")
+        except Exception as e:
+            log.error(f"Error handling callback query: {e}")
+    answer = reply or CallbackReply()
+
+    # answered even when unhandled or throttled, so the client stops its spinner and Telegram does not retry
+    try:
+        await answer_callback_query(query["id"], request, bot=bot, text=answer.text, show_alert=answer.show_alert)
+    except Exception as e:
+        log.error(f"Error answering callback query: {e}")
+        raise HTTPException(status_code=500, detail="Error sending response")
+
+    if answer.edit and (message.get("message_id") or query.get("inline_message_id")):
+        # edits count against the bot's rate limit, so they run after the webhook has returned
+        try:
+            work.spawn(edit_message_text(
+                answer.edit, request, bot=bot, chat_id=chat_id, message_id=message.get("message_id"),
+                inline_message_id=query.get("inline_message_id"), reply_markup=answer.reply_markup,
+            ), "callback")
+        except ShuttingDownError:
+            log.warning("callback edit dropped, shutting down")
+
+    if scope is not None:
+        result = "throttled"
+    elif timed_out:
+        result = "timeout"
+    else:
+        result = "handled" if reply is not None else "unhandled"
+    metrics.inc("anygram_callback_queries_total", result=result)
+    return {"ok": True, "source": "callback", "handled": reply is not None}
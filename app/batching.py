@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+from typing import List, Optional, Set, Tuple
+from app.compression import compress_body
+from app.http_client import get_http_client
+from app.logger import log
+from app.metrics import metrics
+from app.config import LLM_BATCH_URL, LLM_BATCH_MAX_SIZE, LLM_BATCH_MAX_WAIT
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class PromptBatcher:
+    """Collects concurrent prompts and sends them to the LLM batch endpoint in one request.
+
+    The wait is adaptive. The batcher keeps a smoothed gap between arrivals: when prompts
+    arrive further apart than max_wait it sends each one at once, so quiet periods pay no
+    extra latency; under load it waits for roughly the time the batch needs to fill, capped
+    at max_wait, or until max_batch prompts are queued.
+    """
+
+    def __init__(self, url: str, max_batch: int = 16, max_wait: float = 0.005, alpha: float = 0.2):
+        self.url = url
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.alpha = alpha
+        self.gap = max_wait
+        self.batches = 0
+        self.prompts = 0
+        self._last_arrival: Optional[float] = None
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    def window(self) -> float:
+        if self.gap >= self.max_wait:
+            return 0.0
+        return min(self.max_wait, self.gap * (self.max_batch - len(self._pending)))
+
+    async def ask(self, prompt: str, request_id: str) -> str:
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        if self._last_arrival is not None:
+            self.gap += self.alpha * (min(now - self._last_arrival, self.max_wait * 10) - self.gap)
+        self._last_arrival = now
+
+        fut = loop.create_future()
+        self._pending.append((prompt, request_id, fut))
+
+        window = self.window()
+        if len(self._pending) >= self.max_batch or window <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(window, self.flush)
+        return await fut
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[Tuple[str, str, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.prompts += len(batch)
+        metrics.observe("anygram_llm_batch_size", len(batch), BATCH_SIZE_BUCKETS)
+
+        headers = {
+            "X-Request-Id": ",".join(request_id for _, request_id, _ in batch),
+            "Content-Type": "application/json",
+        }
+        body, encoding = compress_body(json.dumps({"prompts": [prompt for prompt, _, _ in batch]}).encode("utf-8"))
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+        try:
+            resp = await get_http_client().post(self.url, content=body, headers=headers)
+            resp.raise_for_status()
+            responses = resp.json()["responses"]
+            if len(responses) != len(batch):
+                raise ValueError(f"batch endpoint returned {len(responses)} responses for {len(batch)} prompts")
+        except Exception as e:
+            log.error(f"llm batch of {len(batch)} failed: {e}")
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for (_, _, fut), response in zip(batch, responses):
+            if not fut.done():
+                fut.set_result(response)
+
+    def memory_sources(self) -> list:
+        return [self._pending]
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "prompts": self.prompts,
+            "window": round(self.window(), 6),
+            "pending": len(self._pending),
+        }
+
+
+batcher = PromptBatcher(LLM_BATCH_URL, LLM_BATCH_MAX_SIZE, LLM_BATCH_MAX_WAIT)
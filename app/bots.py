@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+from app.models import BotConfig
+from app.ratelimit import TokenBucket
+from app.logger import log
+from app.config import (
+    TELEGRAM_TOKEN, WEBHOOK_SECRET_TOKEN, BOTS_FILE, BOTS_RELOAD_INTERVAL, BOT_RATE_LIMIT, BOT_BURST,
+)
+
+DEFAULT_BOT_ID = "default"
+
+
+def _digest(secret: str) -> str:
+    # secrets are indexed by hash so the dict lookup does not compare attacker input against them
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+
+class BotRegistry:
+    """Per-bot configuration and send rate limiters, reloaded from BOTS_FILE when it changes."""
+
+    def __init__(self, path: Optional[str] = None, default_token: Optional[str] = None,
+                 reload_interval: float = 5.0, default_secret: Optional[str] = None):
+        self.path = path
+        self.default_token = default_token
+        self.default_secret = default_secret
+        self.reload_interval = reload_interval
+        self._bots: Dict[str, BotConfig] = {}
+        self._by_secret: Dict[str, BotConfig] = {}
+        self._limiters: Dict[str, TokenBucket] = {}
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self.reload()
+
+    def _load(self) -> Dict[str, BotConfig]:
+        bots = {}
+        if self.default_token:
+            bots[DEFAULT_BOT_ID] = BotConfig(id=DEFAULT_BOT_ID, token=self.default_token, secret_token=self.default_secret)
+
+        if self.path:
+            with open(self.path) as f:
+                data = json.load(f)
+            entries = data["bots"] if isinstance(data, dict) else data
+            for entry in entries:
+                bot = BotConfig(**entry)
+                bots[bot.id] = bot
+        return bots
+
+    def reload(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.path) if self.path else None
+            bots = self._load()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # keep serving the last good registry
+            log.error(f"failed to load bots from {self.path}: {e}")
+            return False
+
+        self._bots = bots
+        self._by_secret = {_digest(bot.secret_token): bot for bot in bots.values() if bot.secret_token}
+        self._mtime = mtime
+        self._limiters = {
+            bot_id: limiter for bot_id, limiter in self._limiters.items()
+            if bot_id in bots and limiter.rate == self._rate(bots[bot_id])
+        }
+        log.info(f"bot registry loaded: {len(bots)} bots")
+        return True
+
+    def maybe_reload(self) -> None:
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def get(self, bot_id: str) -> Optional[BotConfig]:
+        self.maybe_reload()
+        return self._bots.get(bot_id)
+
+    def by_secret(self, secret_token: str) -> Optional[BotConfig]:
+        self.maybe_reload()
+        return self._by_secret.get(_digest(secret_token))
+
+    def default(self) -> Optional[BotConfig]:
+        return self.get(DEFAULT_BOT_ID)
+
+    def memory_sources(self) -> list:
+        return [self._bots, self._by_secret, self._limiters]
+
+    def __len__(self) -> int:
+        return len(self._bots)
+
+    @staticmethod
+    def _rate(bot: BotConfig) -> float:
+        return bot.rate_limit or BOT_RATE_LIMIT
+
+    def limiter(self, bot: BotConfig) -> TokenBucket:
+        limiter = self._limiters.get(bot.id)
+        if limiter is None:
+            limiter = TokenBucket(self._rate(bot), bot.burst or BOT_BURST)
+            self._limiters[bot.id] = limiter
+        return limiter
+
+
+registry = BotRegistry(BOTS_FILE, TELEGRAM_TOKEN, BOTS_RELOAD_INTERVAL, WEBHOOK_SECRET_TOKEN)
@@ -0,0 +1,328 @@
+import asyncio
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional
+from fastapi import Request
+from app.logger import log
+from app.metrics import metrics
+from app.config import (
+    CAPTURE_ENABLED, CAPTURE_DIR, CAPTURE_MAX_BYTES, CAPTURE_MAX_FILES, CAPTURE_MAX_BUFFER, CAPTURE_SALT,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+CAPTURED_HEADERS = ("content-type", "x-priority", "prefer", "x-routing-id")
+ID_FIELDS = {"id", "chat_id", "user_id"}
+TEXT_FIELDS = {"text", "caption"}
+# callback_data: the route name before the first colon is kept, like a command
+DATA_FIELDS = {"data"}
+PERSONAL_FIELDS = {"first_name", "last_name", "username", "title", "phone_number", "email"}
+FILE_PATTERN = "capture-*.ndjson.gz"
+NON_SPACE_RE = re.compile(r"\S")
+
+
+def pseudonymize(value, key: bytes):
+    # keyed hash: the same chat maps to the same id across a capture, but ids cannot be reversed
+    if isinstance(value, bool):
+        return value
+    digest = hashlib.blake2b(str(value).encode("utf-8"), key=key, digest_size=6).digest()
+    number = int.from_bytes(digest, "big") or 1
+    if isinstance(value, int):
+        return -number if value < 0 else number
+    text = str(value)
+    if text.lstrip("-").isdigit():
+        return str(-number if text.startswith("-") else number)
+    return digest.hex()
+
+
+def mask(text: str) -> str:
+    # lengths and word boundaries survive, content does not; a leading bot command is kept
+    if text.startswith("/"):
+        command, sep, rest = text.partition(" ")
+        return command + sep + NON_SPACE_RE.sub("x", rest)
+    return NON_SPACE_RE.sub("x", text)
+
+
+def sanitize(value, key: bytes, field: Optional[str] = None):
+    if isinstance(value, dict):
+        return {name: sanitize(item, key, name) for name, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item, key, field) for item in value]
+    if field in ID_FIELDS and value is not None:
+        return pseudonymize(value, key)
+    if field in TEXT_FIELDS and isinstance(value, str):
+        return mask(value)
+    if field in DATA_FIELDS and isinstance(value, str):
+        name, sep, rest = value.partition(":")
+        return name + sep + NON_SPACE_RE.sub("x", rest) if sep else NON_SPACE_RE.sub("x", value)
+    if field in PERSONAL_FIELDS and isinstance(value, str):
+        return NON_SPACE_RE.sub("x", value)
+    return value
+
+
+def sanitize_routing_id(routing_id: str, key: bytes) -> str:
+    origin, sep, chat_id = routing_id.rpartition(":")
+    return f"{origin}{sep}{pseudonymize(chat_id, key)}" if sep else str(pseudonymize(routing_id, key))
+
+
+def chat_of(entry: dict):
+    body = entry.get("body") or {}
+    message = body.get("message") if isinstance(body.get("message"), dict) else {}
+    chat_id = (message.get("chat") or {}).get("id") if message else body.get("chat_id")
+    if chat_id is None:
+        chat_id = entry.get("headers", {}).get("x-routing-id")
+    return chat_id
+
+
+class TrafficCapture:
+    """Records webhook and send requests to rotating gzip NDJSON files for later replay.
+
+    record() only appends to a buffer; sanitizing, encoding and compression happen in
+    a worker thread on flush(). Ids are replaced with keyed hashes and text with
+    same-length placeholders, so a capture keeps the traffic shape but no content.
+    Each file holds about `max_bytes` of uncompressed lines and only the newest
+    `max_files` files are kept. When the buffer is full, new requests are dropped.
+    """
+
+    def __init__(self, directory: str, enabled: bool = False, max_bytes: int = 64 * 1024 * 1024,
+                 max_files: int = 10, max_buffer: int = 10000, salt: str = ""):
+        self.directory = directory
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_buffer = max_buffer
+        # without a salt, pseudonyms are only stable for the life of the process
+        self.key = hashlib.blake2b(salt.encode("utf-8")).digest() if salt else os.urandom(32)
+        self.captured = 0
+        self.dropped = 0
+        self._buffer: List[tuple] = []
+        # a cancelled flush keeps writing in its thread, so file access is serialized here
+        self._file_lock = threading.Lock()
+        self._writer: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._in_flight: Optional[asyncio.Future] = None
+        self._file = None
+        self._written = 0
+        self._sequence = 0
+
+    def record(self, request: Request, body) -> None:
+        if not self.enabled:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            metrics.inc("anygram_capture_dropped_total")
+            return
+        headers = {name: request.headers[name] for name in CAPTURED_HEADERS if name in request.headers}
+        self._buffer.append((time.time(), request.url.path, headers, body))
+
+    def entry(self, t: float, path: str, headers: dict, body) -> dict:
+        headers = dict(headers)
+        if "x-routing-id" in headers:
+            headers["x-routing-id"] = sanitize_routing_id(headers["x-routing-id"], self.key)
+        entry = {"t": t, "path": path, "headers": headers, "body": sanitize(body, self.key)}
+        entry["chat"] = chat_of(entry)
+        return entry
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        name = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence}.ndjson.gz"
+        self._file = gzip.open(os.path.join(self.directory, name), "wb")
+        self._written = 0
+        self._prune()
+
+    def _prune(self) -> None:
+        files = sorted(glob.glob(os.path.join(self.directory, FILE_PATTERN)), key=os.path.getmtime)
+        for path in files[:-self.max_files] if self.max_files > 0 else []:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _write(self, records: List[tuple]) -> None:
+        with self._file_lock:
+            self._write_locked(records)
+
+    def _write_locked(self, records: List[tuple]) -> None:
+        for record in records:
+            line = (json.dumps(self.entry(*record)) + "\n").encode("utf-8")
+            if self._file is None or self._written >= self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._written += len(line)
+        # a sync flush makes everything written so far readable while the file is still open
+        self._file.flush()
+
+    async def flush(self) -> int:
+        if not self._buffer:
+            return 0
+        records, self._buffer = self._buffer, []
+        # shielded: once taken off the buffer the records are written even if the caller is
+        # cancelled, and close() waits for that write before closing the file
+        self._in_flight = asyncio.ensure_future(self._write_batch(records))
+        return await asyncio.shield(self._in_flight)
+
+    async def _write_batch(self, records: List[tuple]) -> int:
+        try:
+            await asyncio.to_thread(self._write, records)
+        except Exception as e:
+            log.error(f"traffic capture write failed, {len(records)} requests dropped: {e!r}")
+            self.dropped += len(records)
+            metrics.inc("anygram_capture_dropped_total", len(records))
+            return 0
+        self.captured += len(records)
+        metrics.inc("anygram_capture_requests_total", len(records))
+        return len(records)
+
+    async def run_writer(self, interval: float) -> None:
+        self._stopping = self._stopping or asyncio.Event()
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start_writer(self, interval: float) -> None:
+        self._stopping = asyncio.Event()
+        self._writer = asyncio.create_task(self.run_writer(interval))
+
+    def _close_file(self) -> None:
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    async def close(self) -> None:
+        # stop the periodic writer first, so the final flush is the last write to the file;
+        # it is asked to stop rather than cancelled, so a write it has started always finishes
+        if self._writer is not None:
+            self._stopping.set()
+            await self._writer
+            self._writer = None
+        if self._in_flight is not None:
+            await asyncio.wait([self._in_flight])
+            self._in_flight = None
+        await self.flush()
+        await asyncio.to_thread(self._close_file)
+
+    def memory_sources(self) -> list:
+        return [self._buffer]
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "captured": self.captured, "dropped": self.dropped,
+                "buffered": len(self._buffer)}
+
+
+def capture_files(paths: Iterable[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, FILE_PATTERN)), key=os.path.getmtime))
+        else:
+            files.append(path)
+    return files
+
+
+def read_capture(paths: Iterable[str]) -> Iterator[dict]:
+    for path in capture_files(paths):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.endswith("\n"):
+                        yield json.loads(line)
+            except EOFError:
+                # the file being written has no gzip trailer yet; everything flushed is still read
+                pass
+
+
+def summarize(latencies: List[float]) -> dict:
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0}
+
+    def percentile(q: float) -> float:
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+
+    return {"count": len(values), "p50_ms": percentile(0.5), "p90_ms": percentile(0.9),
+            "p99_ms": percentile(0.99), "max_ms": round(values[-1] * 1000, 2)}
+
+
+async def replay(entries: Iterable[dict], client: "httpx.AsyncClient", speed: float = 1.0, concurrency: int = 100,
+                 headers: Optional[dict] = None) -> dict:
+    """Replays captured requests with their original spacing divided by `speed` (0 for as fast as possible).
+
+    Requests for the same chat are sent one at a time and in capture order, so a chat
+    that falls behind delays only itself. `lag` reports how far the replay fell behind
+    the schedule, which tells whether the numbers describe the target or the replayer.
+    """
+    # only the replay tool needs httpx here; importing it at module level would undo the lazy import
+    import httpx
+
+    entries = sorted(entries, key=lambda entry: entry["t"])
+    if not entries:
+        return {"requests": 0}
+
+    chats = defaultdict(list)
+    for index, entry in enumerate(entries):
+        chat = entry.get("chat")
+        chats[chat if chat is not None else f"#{index}"].append(entry)
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = defaultdict(list)
+    statuses: Counter = Counter()
+    max_lag = 0.0
+    start, first = loop.time(), entries[0]["t"]
+
+    async def play(chat_entries: List[dict]) -> None:
+        nonlocal max_lag
+        for entry in chat_entries:
+            if speed > 0:
+                delay = start + (entry["t"] - first) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            async with semaphore:
+                began = time.perf_counter()
+                try:
+                    resp = await client.post(entry["path"], json=entry["body"],
+                                             headers={**entry.get("headers", {}), **(headers or {})})
+                    status = str(resp.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies[entry["path"].rsplit("/", 1)[-1]].append(time.perf_counter() - began)
+                statuses[status] += 1
+
+    await asyncio.gather(*(play(chat_entries) for chat_entries in chats.values()))
+    duration = loop.time() - start
+    return {
+        "requests": len(entries),
+        "chats": len(chats),
+        "duration": round(duration, 3),
+        "rate": round(len(entries) / duration, 1) if duration > 0 else None,
+        "lag": round(max_lag, 3),
+        "statuses": dict(statuses),
+        "latency": {kind: summarize(values) for kind, values in sorted(latencies.items())},
+    }
+
+
+capture = TrafficCapture(
+    CAPTURE_DIR,
+    enabled=CAPTURE_ENABLED,
+    max_bytes=CAPTURE_MAX_BYTES,
+    max_files=CAPTURE_MAX_FILES,
+    max_buffer=CAPTURE_MAX_BUFFER,
+    salt=CAPTURE_SALT,
+)
@@ -0,0 +1,206 @@
+import importlib
+import inspect
+import json
+import string
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Union
+from fastapi import Request
+from app.logger import log
+from app.metrics import metrics
+from app.models import BotConfig, CallbackReply
+from app.config import COMMANDS_FILE
+
+ANY_BOT = "*"
+
+Handler = Callable[["CommandContext"], Union[Optional[str], Awaitable[Optional[str]]]]
+CallbackHandler = Callable[["CommandContext"], Union[Optional[Union[str, CallbackReply]], Awaitable]]
+
+
+def parse_command(text: str) -> Optional[Tuple[str, str]]:
+    # "/start@MyBot promo" -> ("start", "promo"); the @bot suffix is added by Telegram in groups
+    if not text.startswith("/"):
+        return None
+    parts = text[1:].split(None, 1)
+    name = parts[0].split("@", 1)[0].lower() if parts else ""
+    return (name, parts[1].strip() if len(parts) > 1 else "") if name else None
+
+
+def parse_callback_data(data: str) -> Tuple[str, str]:
+    # "vote:yes" -> ("vote", "yes"); the part before the first colon picks the route
+    name, _, args = data.partition(":")
+    return name, args
+
+
+class _Fields(dict):
+    def __missing__(self, key: str) -> str:
+        # unknown placeholders are left as written instead of failing the reply
+        return "{" + key + "}"
+
+
+class Template:
+    """A reply from COMMANDS_FILE. Replies without placeholders are returned as they are."""
+
+    __slots__ = ("text", "static")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.static = all(field is None for _, field, _, _ in string.Formatter().parse(text))
+
+    def render(self, ctx: "CommandContext") -> str:
+        if self.static:
+            return self.text
+        return self.text.format_map(_Fields(ctx.fields()))
+
+
+class CallbackTemplate:
+    """A button press reply from COMMANDS_FILE: a toast text, or {"text", "show_alert", "edit"}."""
+
+    __slots__ = ("text", "show_alert", "edit")
+
+    def __init__(self, spec: Union[str, dict]):
+        if isinstance(spec, str):
+            spec = {"text": spec}
+        self.text = Template(spec["text"]) if spec.get("text") else None
+        self.show_alert = bool(spec.get("show_alert", False))
+        self.edit = Template(spec["edit"]) if spec.get("edit") else None
+
+    def render(self, ctx: "CommandContext") -> CallbackReply:
+        return CallbackReply(
+            text=self.text.render(ctx) if self.text else None,
+            show_alert=self.show_alert,
+            edit=self.edit.render(ctx) if self.edit else None,
+        )
+
+
+class CommandContext:
+    __slots__ = ("command", "args", "message", "bot", "request", "query")
+
+    def __init__(self, command: str, args: str, message: dict, bot: BotConfig, request: Request,
+                 query: Optional[dict] = None):
+        self.command = command
+        self.args = args
+        self.message = message
+        self.bot = bot
+        self.request = request
+        # the callback_query for button presses; its sender is the user, the message's is the bot
+        self.query = query
+
+    def fields(self) -> dict:
+        sender = (self.query if self.query is not None else self.message).get("from") or {}
+        return {
+            "command": self.command,
+            "args": self.args,
+            "bot_id": self.bot.id,
+            "chat_id": self.message.get("chat", {}).get("id", ""),
+            "user_id": sender.get("id", ""),
+            "first_name": sender.get("first_name", ""),
+            "last_name": sender.get("last_name", ""),
+            "username": sender.get("username", ""),
+        }
+
+
+class CommandRouter:
+    """Answers bot commands from configured replies or Python handlers, without the LLM.
+
+    Routes are kept in one dict keyed by (bot id, command), with "*" for routes shared by
+    every bot, so a lookup is at most two dict hits. Replies come from COMMANDS_FILE:
+
+        {"commands": {"start": "Hi {first_name}!"}, "bots": {"support": {"help": "..."}}}
+
+    and handlers are registered with @commands.handler("name"), usually in a module listed
+    in COMMAND_MODULES. A handler returning None passes the message on to the LLM.
+
+    Inline keyboard button presses are routed the same way on the part of callback_data
+    before the first colon, from the "callbacks" section or @commands.callback("name").
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._routes: Dict[Tuple[str, str], Union[Template, Handler]] = {}
+        self._callbacks: Dict[Tuple[str, str], Union[CallbackTemplate, CallbackHandler]] = {}
+        if path:
+            self.load(path)
+
+    def load(self, path: str) -> None:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error(f"failed to load commands from {path}: {e}")
+            return
+        for name, text in data.get("commands", {}).items():
+            self.add(name, text)
+        for name, spec in data.get("callbacks", {}).items():
+            self.add_callback(name, spec)
+        for bot_id, replies in data.get("bots", {}).items():
+            for name, spec in replies.pop("callbacks", {}).items():
+                self.add_callback(name, spec, bot_id)
+            for name, text in replies.items():
+                self.add(name, text, bot_id)
+        log.info(f"commands loaded from {path}: {len(self._routes)} commands, {len(self._callbacks)} callbacks")
+
+    def load_modules(self, modules: str) -> None:
+        for module in filter(None, (name.strip() for name in modules.split(","))):
+            importlib.import_module(module)
+
+    def add(self, name: str, reply: Union[str, Handler], bot_id: str = ANY_BOT) -> None:
+        self._routes[(bot_id, name.lstrip("/").lower())] = Template(reply) if isinstance(reply, str) else reply
+
+    def handler(self, name: str, bot_id: str = ANY_BOT):
+        def register(func: Handler) -> Handler:
+            self.add(name, func, bot_id)
+            return func
+        return register
+
+    def add_callback(self, name: str, reply: Union[str, dict, CallbackHandler], bot_id: str = ANY_BOT) -> None:
+        self._callbacks[(bot_id, name)] = CallbackTemplate(reply) if isinstance(reply, (str, dict)) else reply
+
+    def callback(self, name: str, bot_id: str = ANY_BOT):
+        def register(func: CallbackHandler) -> CallbackHandler:
+            self.add_callback(name, func, bot_id)
+            return func
+        return register
+
+    def lookup(self, name: str, bot_id: str) -> Optional[Union[Template, Handler]]:
+        return self._routes.get((bot_id, name)) or self._routes.get((ANY_BOT, name))
+
+    async def dispatch_callback(self, query: dict, bot: BotConfig, request: Request) -> Optional[CallbackReply]:
+        if not self._callbacks:
+            return None
+        name, args = parse_callback_data(query.get("data") or "")
+        route = self._callbacks.get((bot.id, name)) or self._callbacks.get((ANY_BOT, name))
+        if route is None:
+            return None
+
+        ctx = CommandContext(name, args, query.get("message") or {}, bot, request, query=query)
+        if isinstance(route, CallbackTemplate):
+            return route.render(ctx)
+        reply = route(ctx)
+        if inspect.isawaitable(reply):
+            reply = await reply
+        return CallbackReply(text=reply) if isinstance(reply, str) else reply
+
+    async def dispatch(self, text: str, message: dict, bot: BotConfig, request: Request) -> Optional[str]:
+        parsed = parse_command(text)
+        if parsed is None or not self._routes:
+            return None
+        name, args = parsed
+        route = self.lookup(name, bot.id)
+        if route is None:
+            return None
+
+        ctx = CommandContext(name, args, message, bot, request)
+        if isinstance(route, Template):
+            reply = route.render(ctx)
+        else:
+            reply = route(ctx)
+            if inspect.isawaitable(reply):
+                reply = await reply
+        if reply is not None:
+            metrics.inc("anygram_commands_total", command=name)
+        return reply
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+
+commands = CommandRouter(COMMANDS_FILE)
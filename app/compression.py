@@ -0,0 +1,27 @@
+import gzip
+from typing import Optional, Tuple
+from app.config import UPSTREAM_COMPRESSION, COMPRESSION_MIN_BYTES
+
+
+def zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def compress_body(body: bytes, encoding: Optional[str] = None,
+                  min_bytes: Optional[int] = None) -> Tuple[bytes, Optional[str]]:
+    encoding = encoding or UPSTREAM_COMPRESSION
+    min_bytes = COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+
+    # small bodies cost more CPU to compress than they save on the wire
+    if encoding == "none" or len(body) < min_bytes:
+        return body, None
+
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compress(body), "zstd"
+
+    return gzip.compress(body, compresslevel=5), "gzip"
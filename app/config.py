@@ -1,39 +1,314 @@
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
+# containers get their configuration from the environment; SKIP_DOTENV=true avoids searching the disk for a .env
+if os.getenv("SKIP_DOTENV", "false").lower() != "true":
+    load_dotenv()
 
 # telegram configuration
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
 
+# webhook configuration
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+WEBHOOK_MAX_BODY_BYTES = int(os.getenv("WEBHOOK_MAX_BODY_BYTES", "1048576"))
+WEBHOOK_ALLOWED_UPDATES = [u.strip() for u in os.getenv("WEBHOOK_ALLOWED_UPDATES", "message,callback_query").split(",") if u.strip()]
+
+# media configuration
+FILE_ID_CACHE_SIZE = int(os.getenv("FILE_ID_CACHE_SIZE", "10000"))
+MEDIA_ENABLED = os.getenv("MEDIA_ENABLED", "false").lower() == "true"
+LLM_MEDIA_URL = os.getenv("LLM_MEDIA_URL", "http://localhost:8081/api/v1/chat/ask-media")
+MEDIA_UPLOAD_MODE = os.getenv("MEDIA_UPLOAD_MODE", "stream").lower()
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(20 * 1024 * 1024)))
+MEDIA_SPOOL_MEMORY_BYTES = int(os.getenv("MEDIA_SPOOL_MEMORY_BYTES", str(1024 * 1024)))
+MEDIA_DOWNLOAD_CONCURRENCY = int(os.getenv("MEDIA_DOWNLOAD_CONCURRENCY", "4"))
+
+# inbound rate limiting per user and per chat
+INBOUND_LIMIT_ENABLED = os.getenv("INBOUND_LIMIT_ENABLED", "false").lower() == "true"
+INBOUND_LIMIT_TIERS = os.getenv("INBOUND_LIMIT_TIERS", "default=0.5/10")
+INBOUND_USER_TIERS = os.getenv("INBOUND_USER_TIERS", "")
+INBOUND_CHAT_RATE = float(os.getenv("INBOUND_CHAT_RATE", "2"))
+INBOUND_CHAT_BURST = int(os.getenv("INBOUND_CHAT_BURST", "30"))
+INBOUND_LIMIT_CACHE_SIZE = int(os.getenv("INBOUND_LIMIT_CACHE_SIZE", "100000"))
+INBOUND_THROTTLE_ACTION = os.getenv("INBOUND_THROTTLE_ACTION", "drop").lower()
+INBOUND_THROTTLE_REPLY = os.getenv("INBOUND_THROTTLE_REPLY", "You are sending messages too fast, please slow down.")
+
+# shared state configuration
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_URL = os.getenv("STATE_URL", "redis://localhost:6379/0")
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "anygram:")
+STATE_TIMEOUT = float(os.getenv("STATE_TIMEOUT", "2.0"))
+STATE_NEAR_CACHE_SIZE = int(os.getenv("STATE_NEAR_CACHE_SIZE", "10000"))
+STATE_NEAR_CACHE_TTL = float(os.getenv("STATE_NEAR_CACHE_TTL", "1.0"))
+
+# asynchronous send jobs
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "1000"))
+JOB_CALLBACK_RETRIES = int(os.getenv("JOB_CALLBACK_RETRIES", "3"))
+JOB_CALLBACK_ALLOWED_HOSTS = os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "")
+
+# batch send configuration
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_MAX_BODY_BYTES = int(os.getenv("BATCH_MAX_BODY_BYTES", str(4 * 1024 * 1024)))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "32"))
+
+# multi-bot configuration
+BOTS_FILE = os.getenv("BOTS_FILE")
+BOTS_RELOAD_INTERVAL = float(os.getenv("BOTS_RELOAD_INTERVAL", "5"))
+BOT_RATE_LIMIT = float(os.getenv("BOT_RATE_LIMIT", "30"))
+BOT_BURST = int(os.getenv("BOT_BURST", "30"))
+
+# bot commands answered without the llm
+COMMANDS_FILE = os.getenv("COMMANDS_FILE")
+COMMAND_MODULES = os.getenv("COMMAND_MODULES", "")
+# seconds a button handler may take before the press is answered without its reply
+CALLBACK_HANDLER_TIMEOUT = float(os.getenv("CALLBACK_HANDLER_TIMEOUT", "2"))
+
 # llm configuration
 LLM_URL = os.getenv("LLM_URL", "http://localhost:8081/api/v1/chat/ask")
 
+# llm micro-batching
+LLM_BATCH_ENABLED = os.getenv("LLM_BATCH_ENABLED", "false").lower() == "true"
+LLM_BATCH_URL = os.getenv("LLM_BATCH_URL", "http://localhost:8081/api/v1/chat/ask-batch")
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "16"))
+LLM_BATCH_MAX_WAIT = float(os.getenv("LLM_BATCH_MAX_WAIT", "0.005"))
+
+# graceful degradation under load
+DEGRADATION_ENABLED = os.getenv("DEGRADATION_ENABLED", "false").lower() == "true"
+DEGRADE_IN_FLIGHT = os.getenv("DEGRADE_IN_FLIGHT", "50,80,120")
+DEGRADE_QUEUE_DEPTH = os.getenv("DEGRADE_QUEUE_DEPTH", "")
+DEGRADE_P95_LATENCY = os.getenv("DEGRADE_P95_LATENCY", "5,10,20")
+DEGRADE_RECOVERY_RATIO = float(os.getenv("DEGRADE_RECOVERY_RATIO", "0.7"))
+DEGRADE_RECOVERY_HOLD = float(os.getenv("DEGRADE_RECOVERY_HOLD", "30"))
+DEGRADE_LATENCY_WINDOW = float(os.getenv("DEGRADE_LATENCY_WINDOW", "60"))
+LLM_FALLBACK_URL = os.getenv("LLM_FALLBACK_URL", "")
+DEGRADE_MAX_CHARS = int(os.getenv("DEGRADE_MAX_CHARS", "500"))
+DEGRADE_BUSY_REPLY = os.getenv(
+    "DEGRADE_BUSY_REPLY", "We're getting a lot of messages right now. Please try again in a few minutes."
+)
+
+# near-duplicate prompt cache: off, shadow (measure only) or on
+SIMILARITY_CACHE_MODE = os.getenv("SIMILARITY_CACHE_MODE", "off").lower()
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+SIMILARITY_CACHE_SIZE = int(os.getenv("SIMILARITY_CACHE_SIZE", "10000"))
+SIMILARITY_CACHE_TTL = float(os.getenv("SIMILARITY_CACHE_TTL", "3600"))
+SIMILARITY_MAX_CHARS = int(os.getenv("SIMILARITY_MAX_CHARS", "512"))
+
 # anyway configuration
 GATEWAY_API_URL = os.getenv("GATEWAY_API_URL", "http://localhost:8003/api/v1/send")
 GATEWAY_ENABLED = os.getenv("GATEWAY_ENABLED", "false").lower() == "true"
+GATEWAY_FORMAT = os.getenv("GATEWAY_FORMAT", "json").lower()
+
+# routing between the gateway and the direct llm path
+GATEWAY_PERCENT = float(os.getenv("GATEWAY_PERCENT", "100" if GATEWAY_ENABLED else "0"))
+ROUTING_MAX_IN_FLIGHT = int(os.getenv("ROUTING_MAX_IN_FLIGHT", "100"))
+ROUTING_LATENCY_THRESHOLD = float(os.getenv("ROUTING_LATENCY_THRESHOLD", "10.0"))
+ROUTING_ERROR_THRESHOLD = float(os.getenv("ROUTING_ERROR_THRESHOLD", "0.5"))
+ROUTING_COOLDOWN = float(os.getenv("ROUTING_COOLDOWN", "30"))
+ROUTING_MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", "10"))
+
+# admin configuration
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# compression configuration
+UPSTREAM_COMPRESSION = os.getenv("UPSTREAM_COMPRESSION", "none").lower()
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "true").lower() == "true"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
 
 # server configuration
+ENVIRONMENT = os.getenv("ENVIRONMENT", "production").lower()
 HOST = os.getenv("HOST", "127.0.0.1")
 PORT = int(os.getenv("PORT", "8000"))
-RELOAD = os.getenv("RELOAD", "true").lower() == "true"
+RELOAD = os.getenv("RELOAD", "true" if ENVIRONMENT == "development" else "false").lower() == "true"
+
+def default_workers() -> int:
+    # job status, routing splits and rate limits live in each process unless the state is shared,
+    # so several workers are only the default with redis; affinity is the container's CPU share
+    if STATE_BACKEND != "redis":
+        return 1
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+WORKERS = int(os.getenv("WORKERS", str(default_workers())))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "5"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "25"))
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "3.0"))
+
+# outbound http configuration
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5.0"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
 LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO").upper()
 
+# profiling configuration
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.25"))
+LOOP_SLOW_THRESHOLD = float(os.getenv("LOOP_SLOW_THRESHOLD", "0.1"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+# memory accounting: soft limits in MB that make caches give back entries, 0 to only report
+MEMORY_SOFT_LIMIT_MB = float(os.getenv("MEMORY_SOFT_LIMIT_MB", "0"))
+MEMORY_LIMITS = os.getenv("MEMORY_LIMITS", "")
+MEMORY_EVICT_FRACTION = float(os.getenv("MEMORY_EVICT_FRACTION", "0.25"))
+MEMORY_CHECK_INTERVAL = float(os.getenv("MEMORY_CHECK_INTERVAL", "30"))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+
+# tracing configuration
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_TAIL_SLOW = float(os.getenv("TRACE_TAIL_SLOW", "2.0"))
+TRACE_TAIL_ERRORS = os.getenv("TRACE_TAIL_ERRORS", "true").lower() == "true"
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "file").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.ndjson")
+TRACE_OTLP_URL = os.getenv("TRACE_OTLP_URL", "http://localhost:4318/v1/traces")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_MAX_BUFFER = int(os.getenv("TRACE_MAX_BUFFER", "10000"))
+
+# traffic capture for replay
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(64 * 1024 * 1024)))
+CAPTURE_MAX_FILES = int(os.getenv("CAPTURE_MAX_FILES", "10"))
+CAPTURE_FLUSH_INTERVAL = float(os.getenv("CAPTURE_FLUSH_INTERVAL", "1"))
+CAPTURE_MAX_BUFFER = int(os.getenv("CAPTURE_MAX_BUFFER", "10000"))
+CAPTURE_SALT = os.getenv("CAPTURE_SALT", "")
+
+# admission control configuration
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "100"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+ADMISSION_REJECT_STATUS = int(os.getenv("ADMISSION_REJECT_STATUS", "503"))
+ADMISSION_ADAPTIVE = os.getenv("ADMISSION_ADAPTIVE", "false").lower() == "true"
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "10"))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "500"))
+ADMISSION_LATENCY_TARGET = float(os.getenv("ADMISSION_LATENCY_TARGET", "5.0"))
+
+# priority classes: command, interactive, bulk, background
+PRIORITY_WEIGHTS = os.getenv("PRIORITY_WEIGHTS", "command=8,interactive=4,bulk=2,background=1")
+PRIORITY_CHATS = os.getenv("PRIORITY_CHATS", "")
+
 # validate configurations
 def validate_config():
-    if not TELEGRAM_TOKEN:
+    if not TELEGRAM_TOKEN and not BOTS_FILE:
         raise ValueError("TELEGRAM_TOKEN environment variable is required")
     
     if not LLM_URL:
         raise ValueError("LLM_URL environment variable is required")
 
+    if GATEWAY_FORMAT not in ("json", "raw", "msgpack"):
+        raise ValueError("GATEWAY_FORMAT must be one of: json, raw, msgpack")
+
+    if GATEWAY_FORMAT == "msgpack":
+        try:
+            import msgpack  # noqa: F401
+        except ImportError:
+            raise ValueError("GATEWAY_FORMAT=msgpack requires the msgpack package")
+
+    for name, spec in (("DEGRADE_IN_FLIGHT", DEGRADE_IN_FLIGHT), ("DEGRADE_QUEUE_DEPTH", DEGRADE_QUEUE_DEPTH),
+                       ("DEGRADE_P95_LATENCY", DEGRADE_P95_LATENCY)):
+        try:
+            thresholds = [float(part) for part in spec.split(",") if part.strip()]
+        except ValueError:
+            raise ValueError(f"{name} must be a comma-separated list of numbers")
+        if len(thresholds) > 3 or thresholds != sorted(thresholds):
+            raise ValueError(f"{name} takes up to three ascending thresholds (fallback, short, busy)")
+
+    if not 0 < DEGRADE_RECOVERY_RATIO <= 1:
+        raise ValueError("DEGRADE_RECOVERY_RATIO must be between 0 and 1")
+
+    if SIMILARITY_CACHE_MODE not in ("off", "shadow", "on"):
+        raise ValueError("SIMILARITY_CACHE_MODE must be one of: off, shadow, on")
+
+    if BOT_RATE_LIMIT <= 0 or BOT_BURST < 1:
+        raise ValueError("BOT_RATE_LIMIT and BOT_BURST must be positive")
+
+    try:
+        limits = [float(part.split("=", 1)[1]) for part in MEMORY_LIMITS.split(",") if part.strip()]
+    except (ValueError, IndexError):
+        raise ValueError("MEMORY_LIMITS must be a comma-separated list of component=MB")
+    if MEMORY_SOFT_LIMIT_MB < 0 or any(mb <= 0 for mb in limits):
+        raise ValueError("memory limits must be positive (MEMORY_SOFT_LIMIT_MB=0 turns the process limit off)")
+
+    if not 0 < MEMORY_EVICT_FRACTION <= 1:
+        raise ValueError("MEMORY_EVICT_FRACTION must be between 0 and 1")
+
+    if TRACE_EXPORTER not in ("file", "otlp"):
+        raise ValueError("TRACE_EXPORTER must be one of: file, otlp")
+
+    if STATE_BACKEND not in ("memory", "redis"):
+        raise ValueError("STATE_BACKEND must be one of: memory, redis")
+
+    # parsed leniently at import by app.throttle; bad entries are reported here
+    tiers = {"default"}
+    for pair in filter(None, (part.strip() for part in INBOUND_LIMIT_TIERS.split(","))):
+        name, sep, limit = pair.partition("=")
+        rate, _, burst = limit.partition("/")
+        try:
+            if not sep or not name.strip() or float(rate) < 0 or (burst and float(burst) <= 0):
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"INBOUND_LIMIT_TIERS entry '{pair}' must be tier=rate or tier=rate/burst")
+        tiers.add(name.strip())
+    for pair in filter(None, (part.strip() for part in INBOUND_USER_TIERS.split(","))):
+        user_id, sep, tier = pair.partition("=")
+        if not sep or not user_id.strip().lstrip("-").isdigit():
+            raise ValueError(f"INBOUND_USER_TIERS entry '{pair}' must be user_id=tier")
+        if tier.strip() not in tiers:
+            raise ValueError(f"INBOUND_USER_TIERS entry '{pair}' names a tier missing from INBOUND_LIMIT_TIERS")
+
+    if INBOUND_THROTTLE_ACTION not in ("drop", "reply"):
+        raise ValueError("INBOUND_THROTTLE_ACTION must be one of: drop, reply")
+
+    if UPSTREAM_COMPRESSION not in ("none", "gzip", "zstd"):
+        raise ValueError("UPSTREAM_COMPRESSION must be one of: none, gzip, zstd")
+
+    if UPSTREAM_COMPRESSION == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise ValueError("UPSTREAM_COMPRESSION=zstd requires the zstandard package")
+
     print(f"✅ Configuration loaded successfully:")
     print(f"   - Host: {HOST}")
     print(f"   - Port: {PORT}")
     print(f"   - Telegram API: {TELEGRAM_API_URL}")
+    if BOTS_FILE:
+        print(f"   - Bots file: {BOTS_FILE}")
+    if COMMANDS_FILE or COMMAND_MODULES:
+        print(f"   - Commands: {', '.join(filter(None, (COMMANDS_FILE, COMMAND_MODULES)))}")
     print(f"   - LLM URL: {LLM_URL}")
+    print(f"   - Environment: {ENVIRONMENT}")
     print(f"   - Reload: {RELOAD}")
     print(f"   - Log level: {LOG_LEVEL}")
-    if GATEWAY_ENABLED:
+    if GATEWAY_ENABLED or GATEWAY_PERCENT > 0:
         print(f"   - Gateway URL: {GATEWAY_API_URL}")
+        print(f"   - Gateway format: {GATEWAY_FORMAT}")
+        print(f"   - Gateway share: {GATEWAY_PERCENT}%")
+    if UPSTREAM_COMPRESSION != "none":
+        print(f"   - Upstream compression: {UPSTREAM_COMPRESSION} (>= {COMPRESSION_MIN_BYTES} bytes)")
+    if DEGRADATION_ENABLED:
+        print(f"   - Degradation: in-flight {DEGRADE_IN_FLIGHT or '-'}, queue {DEGRADE_QUEUE_DEPTH or '-'}, p95 {DEGRADE_P95_LATENCY or '-'}")
+    if MEMORY_SOFT_LIMIT_MB or MEMORY_LIMITS:
+        print(f"   - Memory limits: {MEMORY_SOFT_LIMIT_MB:g}MB process, {MEMORY_LIMITS or 'no'} per component")
+    if SIMILARITY_CACHE_MODE != "off":
+        print(f"   - Similarity cache: {SIMILARITY_CACHE_MODE} (threshold {SIMILARITY_THRESHOLD})")
+    if LLM_BATCH_ENABLED:
+        print(f"   - LLM batching: {LLM_BATCH_URL} (up to {LLM_BATCH_MAX_SIZE} prompts, {LLM_BATCH_MAX_WAIT * 1000:g}ms)")
+    if TRACING_ENABLED:
+        print(f"   - Tracing: {TRACE_SAMPLE_RATE:.0%} head-sampled, exported to {TRACE_OTLP_URL if TRACE_EXPORTER == 'otlp' else TRACE_FILE}")
+    if CAPTURE_ENABLED:
+        print(f"   - Traffic capture: {CAPTURE_DIR} ({CAPTURE_MAX_FILES} files of {CAPTURE_MAX_BYTES} bytes)")
+    if STATE_BACKEND != "memory":
+        print(f"   - State backend: {STATE_BACKEND} ({STATE_URL.split('@')[-1]})")
+    elif WORKERS > 1 and not RELOAD:
+        print(f"   ⚠️  {WORKERS} workers with STATE_BACKEND=memory: job status, routing and rate limits are per worker")
+    if INBOUND_LIMIT_ENABLED:
+        print(f"   - Inbound limits: {INBOUND_LIMIT_TIERS} per user, {INBOUND_CHAT_RATE}/{INBOUND_CHAT_BURST} per chat")
+    if MAX_IN_FLIGHT > 0:
+        mode = "adaptive" if ADMISSION_ADAPTIVE else "fixed"
+        print(f"   - Max in flight: {MAX_IN_FLIGHT} ({mode}, queue {ADMISSION_QUEUE_SIZE})")
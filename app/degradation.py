@@ -0,0 +1,129 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+from app.logger import log
+from app.metrics import metrics
+from app.config import (
+    DEGRADATION_ENABLED, DEGRADE_IN_FLIGHT, DEGRADE_QUEUE_DEPTH, DEGRADE_P95_LATENCY, DEGRADE_RECOVERY_RATIO,
+    DEGRADE_RECOVERY_HOLD, DEGRADE_LATENCY_WINDOW,
+)
+
+NORMAL = 0
+FALLBACK = 1
+SHORT = 2
+BUSY = 3
+TIER_NAMES = ("normal", "fallback", "short", "busy")
+
+
+def parse_thresholds(spec: str) -> Tuple[float, ...]:
+    # "50,80,120": the values at which the fallback, short and busy tiers start
+    return tuple(float(part) for part in spec.split(",") if part.strip())
+
+
+def shorten(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    # end on a sentence if one finishes in the second half, otherwise on a word
+    end = max(cut.rfind(mark) for mark in (". ", "! ", "? ", "\n"))
+    if end >= limit // 2:
+        return cut[:end + 1].rstrip()
+    return cut.rsplit(" ", 1)[0].rstrip() + "…"
+
+
+class DegradationController:
+    """Picks a degradation tier for LLM calls from in-flight calls, admission queue depth and p95 latency.
+
+    Each signal has up to three ascending thresholds, one per tier above normal, and the
+    tier is the highest one any signal reaches. Tiers go up as soon as a threshold is
+    crossed but come down one step at a time, and only after every signal has stayed below
+    `recovery_ratio` of the current tier's thresholds for `recovery_hold` seconds.
+    """
+
+    def __init__(self, enabled: bool = False, in_flight: Tuple[float, ...] = (), queue_depth: Tuple[float, ...] = (),
+                 p95_latency: Tuple[float, ...] = (), recovery_ratio: float = 0.7, recovery_hold: float = 30.0,
+                 window: float = 60.0, max_samples: int = 1000):
+        self.enabled = enabled
+        self.thresholds = {"in_flight": in_flight, "queue_depth": queue_depth, "p95_latency": p95_latency}
+        self.recovery_ratio = recovery_ratio
+        self.recovery_hold = recovery_hold
+        self.window = window
+        self.tier = NORMAL
+        self.in_flight = 0
+        # set by main to the admission controller's queue length
+        self.queue_depth: Callable[[], int] = lambda: 0
+        self._latencies: deque = deque(maxlen=max_samples)
+        self._calm_since: Optional[float] = None
+
+    @property
+    def tier_name(self) -> str:
+        return TIER_NAMES[self.tier]
+
+    @contextmanager
+    def track(self):
+        self.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            end = time.monotonic()
+            self._latencies.append((end, end - start))
+
+    def p95(self, now: Optional[float] = None) -> float:
+        # only recent calls count, so a tier that stops calls (busy) can still recover
+        now = time.monotonic() if now is None else now
+        while self._latencies and self._latencies[0][0] < now - self.window:
+            self._latencies.popleft()
+        values = sorted(latency for _, latency in self._latencies)
+        return values[int(0.95 * (len(values) - 1))] if values else 0.0
+
+    def signals(self, now: Optional[float] = None) -> dict:
+        return {"in_flight": self.in_flight, "queue_depth": self.queue_depth(), "p95_latency": self.p95(now)}
+
+    def level(self, signals: dict, ratio: float = 1.0) -> int:
+        return max(
+            sum(value >= threshold * ratio for threshold in self.thresholds[name])
+            for name, value in signals.items()
+        )
+
+    def evaluate(self, now: Optional[float] = None) -> int:
+        if not self.enabled:
+            return NORMAL
+        now = time.monotonic() if now is None else now
+        signals = self.signals(now)
+
+        target = self.level(signals)
+        if target > self.tier:
+            self._move(target, signals)
+            self._calm_since = None
+        elif self.level(signals, self.recovery_ratio) < self.tier:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.recovery_hold:
+                self._move(self.tier - 1, signals)
+                # the next step down needs its own quiet period
+                self._calm_since = now
+        else:
+            self._calm_since = None
+        return self.tier
+
+    def _move(self, tier: int, signals: dict) -> None:
+        log.warning(f"degradation tier {TIER_NAMES[self.tier]} -> {TIER_NAMES[tier]}: {signals}")
+        metrics.inc("anygram_degradation_transitions_total", source=TIER_NAMES[self.tier], target=TIER_NAMES[tier])
+        self.tier = tier
+
+    def stats(self) -> dict:
+        return {"tier": self.tier_name, **{name: round(value, 3) for name, value in self.signals().items()}}
+
+
+degradation = DegradationController(
+    enabled=DEGRADATION_ENABLED,
+    in_flight=parse_thresholds(DEGRADE_IN_FLIGHT),
+    queue_depth=parse_thresholds(DEGRADE_QUEUE_DEPTH),
+    p95_latency=parse_thresholds(DEGRADE_P95_LATENCY),
+    recovery_ratio=DEGRADE_RECOVERY_RATIO,
+    recovery_hold=DEGRADE_RECOVERY_HOLD,
+    window=DEGRADE_LATENCY_WINDOW,
+)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import TYPE_CHECKING, Dict, List, Optional
+from urllib.parse import urlsplit
+from app.compression import zstd_available
+from app.config import HTTP_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE
+
+if TYPE_CHECKING:
+    import httpx
+
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    # one pooled client for Telegram, LLM and gateway calls instead of a new connection per request
+    global _client
+    if _client is None or _client.is_closed:
+        # httpx is imported on first use to keep it off the import path of a cold start
+        import httpx
+
+        # advertise every encoding httpx can decode so upstreams can compress large answers
+        accept_encoding = "zstd, gzip, deflate" if zstd_available() else "gzip, deflate"
+        _client = httpx.AsyncClient(
+            headers={"Accept-Encoding": accept_encoding},
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+        )
+    return _client
+
+
+def origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+async def warm_http_client(urls: List[str], timeout: float) -> Dict[str, str]:
+    # a HEAD to each upstream origin opens a keep-alive connection (and TLS session) in the pool
+    client = get_http_client()
+    origins = sorted({origin(url) for url in urls if url})
+
+    async def warm(target: str) -> str:
+        try:
+            await client.head(target, timeout=timeout)
+            return "ok"
+        except Exception as e:
+            return f"failed: {type(e).__name__}"
+
+    results = await asyncio.gather(*(warm(target) for target in origins))
+    return dict(zip(origins, results))
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def pool_connections() -> list:
+    # httpx keeps its pool private, so another version just reports no connections
+    if _client is None or _client.is_closed:
+        return []
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", []))
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlparse
+from uuid import uuid4
+from app.http_client import get_http_client
+from app.logger import log
+from app.metrics import metrics
+from app.state import StateStore, store
+from app.config import JOB_TTL, JOB_MAX_PENDING, JOB_CALLBACK_RETRIES, JOB_CALLBACK_ALLOWED_HOSTS
+
+QUEUED = "queued"
+SENT = "sent"
+FAILED = "failed"
+
+
+class JobTracker:
+    """Status of sends accepted with 202, kept in the state store so any replica can answer for it."""
+
+    def __init__(self, state: StateStore, ttl: float = 3600, max_pending: int = 1000, callback_retries: int = 3,
+                 allowed_callback_hosts: Optional[set] = None):
+        self.state = state
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.callback_retries = callback_retries
+        self.allowed_callback_hosts = allowed_callback_hosts or set()
+        self.pending = 0
+
+    @property
+    def full(self) -> bool:
+        return self.pending >= self.max_pending
+
+    def callback_allowed(self, url: str) -> bool:
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            return False
+        # /telegram/send is unauthenticated, so an open list would let anyone make this server
+        # post to internal addresses; callbacks stay off until hosts are listed
+        return parsed.hostname in self.allowed_callback_hosts
+
+    async def _save(self, job: dict) -> None:
+        await self.state.set(f"job:{job['job_id']}", json.dumps(job), ttl=self.ttl)
+
+    async def create(self, chat_id, bot_id: str, callback_url: Optional[str] = None) -> dict:
+        job = {
+            "job_id": uuid4().hex,
+            "status": QUEUED,
+            "chat_id": chat_id,
+            "bot_id": bot_id,
+            "created_at": time.time(),
+        }
+        if callback_url:
+            job["callback_url"] = callback_url
+        await self._save(job)
+        self.pending += 1
+        return job
+
+    async def abandon(self, job: dict, reason: str) -> None:
+        self.pending -= 1
+        job.update(status=FAILED, error=reason, finished_at=time.time())
+        await self._save(job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        data = await self.state.get(f"job:{job_id}")
+        return json.loads(data) if data else None
+
+    async def run(self, job: dict, send: Callable[[], Awaitable]) -> dict:
+        try:
+            result = await send()
+            if isinstance(result, dict) and result.get("ok") is False:
+                job.update(status=FAILED, error=result.get("description", "Telegram rejected the message"))
+            else:
+                job.update(status=SENT, result=result)
+        except asyncio.CancelledError:
+            # cancelled by the shutdown drain: record the outcome so the job does not stay queued
+            job.update(status=FAILED, error="Server is shutting down")
+            await self._finish(job)
+            raise
+        except Exception as e:
+            log.error(f"async send {job['job_id']} failed: {e}")
+            job.update(status=FAILED, error="Internal server error")
+        finally:
+            self.pending -= 1
+
+        await self._finish(job)
+        return job
+
+    async def _finish(self, job: dict) -> None:
+        job["finished_at"] = time.time()
+        metrics.inc("anygram_send_jobs_total", status=job["status"])
+        await self._save(job)
+        if job.get("callback_url"):
+            await self.notify(job)
+
+    async def notify(self, job: dict) -> bool:
+        client = get_http_client()
+        for attempt in range(self.callback_retries):
+            try:
+                resp = await client.post(job["callback_url"], json=job)
+                if resp.status_code < 500:
+                    return resp.status_code < 300
+            except Exception as e:
+                log.warning(f"callback for job {job['job_id']} failed: {e}")
+            if attempt + 1 < self.callback_retries:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        metrics.inc("anygram_send_job_callbacks_failed_total")
+        return False
+
+
+jobs = JobTracker(
+    store,
+    ttl=JOB_TTL,
+    max_pending=JOB_MAX_PENDING,
+    callback_retries=JOB_CALLBACK_RETRIES,
+    allowed_callback_hosts={host.strip() for host in JOB_CALLBACK_ALLOWED_HOSTS.split(",") if host.strip()},
+)
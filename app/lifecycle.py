@@ -0,0 +1,93 @@
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Optional
+from app.logger import log
+
+
+class ShuttingDownError(RuntimeError):
+    pass
+
+
+class WorkTracker:
+    """Keeps count of in-flight requests and background tasks so shutdown can wait for them."""
+
+    def __init__(self):
+        self.accepting = True
+        self._active: Counter = Counter()
+        self._tasks: dict = {}
+
+    def in_flight(self) -> dict:
+        counts = Counter(self._active)
+        counts.update(self._tasks.values())
+        return {kind: n for kind, n in counts.items() if n > 0}
+
+    @asynccontextmanager
+    async def track(self, kind: str):
+        self._active[kind] += 1
+        try:
+            yield
+        finally:
+            self._active[kind] -= 1
+
+    def spawn(self, coro, kind: str) -> asyncio.Task:
+        if not self.accepting:
+            coro.close()
+            raise ShuttingDownError(f"not accepting new {kind} work, shutting down")
+
+        task = asyncio.create_task(coro)
+        self._tasks[task] = kind
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        kind = self._tasks.pop(task, "task")
+        if not task.cancelled() and task.exception() is not None:
+            log.error(f"background {kind} task failed: {task.exception()}")
+
+    def memory_sources(self) -> list:
+        return [self._tasks]
+
+    async def drain(self, timeout: float, poll_interval: float = 0.05) -> dict:
+        self.accepting = False
+        before = Counter(self.in_flight())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while self.in_flight() and loop.time() < deadline:
+            await asyncio.sleep(poll_interval)
+
+        remaining = Counter(self.in_flight())
+        pending = list(self._tasks)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        drained = before - remaining
+        return {"drained": dict(drained), "abandoned": dict(remaining)}
+
+
+class Readiness:
+    """Flips to ready once startup work (connection pool warmup) has finished."""
+
+    def __init__(self):
+        self.ready = False
+        self.started_at = time.monotonic()
+        self.ready_at: Optional[float] = None
+        self.details: dict = {}
+
+    def mark_ready(self, details: Optional[dict] = None) -> None:
+        self.details = details or {}
+        self.ready_at = time.monotonic()
+        self.ready = True
+
+    def status(self) -> dict:
+        status = {"ready": self.ready, "warmup": self.details}
+        if self.ready_at is not None:
+            status["startup_seconds"] = round(self.ready_at - self.started_at, 3)
+        return status
+
+
+work = WorkTracker()
+readiness = Readiness()
@@ -1,19 +1,117 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from app.api import router
+from app.admin import router as admin_router, is_admin
+from app.profiling import SamplingProfiler, monitor, profiles, PROFILE_HEADER
 from app.logger import logger, RequestLoggerAdapter
-from app.config import validate_config, HOST, PORT, RELOAD
+from app.admission import AdmissionController
+from app.priority import classify_request
+from app.throttle import throttle
+from app.state import store as state_store, NearCachedStore, MemoryStore
+from app.tracing import tracer
+from app.capture import capture
+from app.degradation import degradation
+from app.commands import commands
+from app.memory import accountant, rss
+from app.services import file_id_cache
+from app.similarity import similarity_cache
+from app.batching import batcher
+from app.bots import registry
+from app.lifecycle import work, readiness
+from app.metrics import metrics
+from app.http_client import close_http_client, warm_http_client, pool_connections
+from app.traffic import traffic
+from app.config import (
+    validate_config, HOST, PORT, DRAIN_TIMEOUT, WARMUP_ENABLED, WARMUP_TIMEOUT,
+    TELEGRAM_API_URL, LLM_URL, GATEWAY_API_URL, RESPONSE_COMPRESSION, COMPRESSION_MIN_BYTES,
+    MAX_IN_FLIGHT, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER,
+    ADMISSION_REJECT_STATUS, ADMISSION_ADAPTIVE, ADMISSION_MIN_LIMIT, ADMISSION_MAX_LIMIT,
+    ADMISSION_LATENCY_TARGET, LOOP_MONITOR_ENABLED, PROFILE_SAMPLE_INTERVAL,
+    TRACE_EXPORT_INTERVAL, CAPTURE_FLUSH_INTERVAL, COMMAND_MODULES, MEMORY_CHECK_INTERVAL,
+)
+from contextlib import asynccontextmanager
+from typing import Optional
 from uuid import uuid4
-import uvicorn
+import asyncio
+import threading
+import time
+
+async def warmup():
+    results = {}
+    if WARMUP_ENABLED:
+        urls = [TELEGRAM_API_URL, LLM_URL]
+        if traffic.gateway_percent > 0:
+            urls.append(GATEWAY_API_URL)
+        results = await warm_http_client(urls, WARMUP_TIMEOUT)
+        logger.info(f"connection pool warmed: {results}", extra={"request_id": "startup"})
+    readiness.mark_ready(results)
 
-validate_config()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # validation runs at startup rather than import so importing the app stays side-effect free
+    validate_config()
+    # handler modules import app.commands themselves, so they are loaded here rather than at import
+    commands.load_modules(COMMAND_MODULES)
+    # warm up in the background: the server starts listening at once and /ready flips when pools are warm
+    work.spawn(warmup(), "warmup")
+    if LOOP_MONITOR_ENABLED:
+        monitor.start()
+    if tracer.enabled:
+        tracer.start_exporter(TRACE_EXPORT_INTERVAL)
+    if capture.enabled:
+        capture.start_writer(CAPTURE_FLUSH_INTERVAL)
+    limits = accountant.soft_limit or accountant.limits
+    memory_checker = asyncio.create_task(accountant.run(MEMORY_CHECK_INTERVAL)) if limits else None
+    yield
+    if LOOP_MONITOR_ENABLED:
+        await monitor.stop()
+    # stop taking new work, let in-flight replies and background tasks finish, then close the pools
+    logger.info(f"shutting down, draining in-flight work: {work.in_flight()}", extra={"request_id": "shutdown"})
+    report = await work.drain(DRAIN_TIMEOUT)
+    if memory_checker is not None:
+        memory_checker.cancel()
+    if tracer.enabled:
+        await tracer.close()
+    if capture.enabled:
+        await capture.close()
+    await close_http_client()
+    await state_store.close()
+    logger.info(
+        f"shutdown complete: drained={report['drained']} abandoned={report['abandoned']}",
+        extra={"request_id": "shutdown"},
+    )
 
 app = FastAPI(
     title="anygram API",
     description="FastAPI Telegram Integration with LLM",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
+# added before the other middlewares so it is the innermost one and sees complete, unstreamed responses
+if RESPONSE_COMPRESSION:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
+# registered before add_request_id so it runs inside it and has the request logger
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    # per-request profiles sample the loop thread, so they include whatever else ran meanwhile
+    if PROFILE_HEADER not in request.headers or not is_admin(request):
+        return await call_next(request)
+
+    profiler = SamplingProfiler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+    profiler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.stop()
+
+    request_id = request.state.logger.extra["request_id"]
+    profiles.put(request_id, profiler.collapsed())
+    response.headers["X-Profile-Id"] = request_id
+    return response
+
 @app.middleware("http")
 async def add_request_id(request: Request, call_next):
     request_id = request.headers.get("X-Request-ID") or str(uuid4())
@@ -21,17 +119,146 @@ async def add_request_id(request: Request, call_next):
     response = await call_next(request)
     return response
 
+def work_kind(path: str) -> Optional[str]:
+    if not path.startswith("/telegram/"):
+        return None
+    segments = path.split("/")
+    if "webhook" in segments:
+        return "webhook"
+    if "send" in segments:
+        return "send"
+    return None
+
+@app.middleware("http")
+async def track_work(request: Request, call_next):
+    kind = work_kind(request.url.path)
+    if kind is None:
+        return await call_next(request)
+
+    if not work.accepting:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is shutting down"},
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+        )
+
+    async with work.track(kind):
+        return await call_next(request)
+
+admission = AdmissionController(
+    limit=MAX_IN_FLIGHT,
+    max_queue=ADMISSION_QUEUE_SIZE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+    adaptive=ADMISSION_ADAPTIVE,
+    min_limit=ADMISSION_MIN_LIMIT,
+    max_limit=ADMISSION_MAX_LIMIT,
+    latency_target=ADMISSION_LATENCY_TARGET,
+)
+ADMISSION_EXEMPT_PATHS = {"/health", "/ready", "/metrics"}
+
+metrics.register_collector(lambda: {
+    "anygram_admission_limit": admission.limit,
+    "anygram_admission_in_flight": admission.in_flight,
+    "anygram_admission_queued": admission.queued,
+})
+metrics.register_collector(lambda: {
+    "anygram_degradation_tier": degradation.evaluate(),
+    "anygram_llm_in_flight": degradation.in_flight,
+})
+degradation.queue_depth = lambda: admission.queued
+metrics.register_collector(lambda: {
+    f"anygram_inbound_{name}": value for name, value in throttle.stats().items()
+})
+
+# what /admin/memory reports and MEMORY_LIMITS can name; each component lists its own containers
+accountant.register("file_id_cache", file_id_cache.memory_sources, file_id_cache.shrink)
+accountant.register("similarity_cache", similarity_cache.memory_sources, similarity_cache.shrink)
+accountant.register("request_profiles", profiles.memory_sources, profiles.shrink)
+accountant.register("inbound_throttle", throttle.memory_sources, throttle.shrink)
+if isinstance(state_store, NearCachedStore):
+    accountant.register("state_near_cache", state_store.memory_sources, state_store.shrink)
+elif isinstance(state_store, MemoryStore):
+    # the store of record for single replica deployments: reported, never evicted
+    accountant.register("state_store", state_store.memory_sources)
+accountant.register("admission_queue", admission.memory_sources)
+accountant.register("llm_batch_queue", batcher.memory_sources)
+accountant.register("trace_buffer", tracer.memory_sources)
+accountant.register("capture_buffer", capture.memory_sources)
+accountant.register("background_tasks", work.memory_sources)
+accountant.register("bots", registry.memory_sources)
+accountant.register("metrics", metrics.memory_sources)
+accountant.register("http_pool", pool_connections)
+metrics.register_collector(lambda: {"anygram_memory_rss_bytes": rss()})
+
+# Registered after add_request_id so it runs first and sheds load before any per-request work
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    # health, metrics and admin stay reachable while the pod is overloaded
+    path = request.url.path
+    request.state.priority = classify_request(path, request.headers, trusted=is_admin(request))
+    if MAX_IN_FLIGHT <= 0 or path in ADMISSION_EXEMPT_PATHS or path.startswith("/admin/"):
+        return await call_next(request)
+
+    if not await admission.acquire(request.state.priority):
+        metrics.inc("anygram_admission_rejected_total")
+        logger.warning(
+            f"request rejected by admission control: path={request.url.path} stats={admission.stats()}",
+            extra={"request_id": request.headers.get("X-Request-ID", "unknown")},
+        )
+        return JSONResponse(
+            status_code=ADMISSION_REJECT_STATUS,
+            content={"detail": "Server is overloaded, retry later"},
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+        )
+
+    start = time.monotonic()
+    dropped = True
+    try:
+        response = await call_next(request)
+        dropped = response.status_code >= 500
+        return response
+    finally:
+        admission.release(time.monotonic() - start, dropped=dropped)
+
+# Registered last so it is the outermost middleware and its span covers admission queueing too
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    path = request.url.path
+    with tracer.start_trace(f"{request.method} {path}", request.headers.get("traceparent"),
+                            **{"http.method": request.method, "http.target": path}) as span:
+        response = await call_next(request)
+        span.set_status_code(response.status_code)
+        return response
+
 app.include_router(router, prefix="/telegram", tags=["telegram"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
 @app.get("/health")
 def healthcheck():
+    if not work.accepting:
+        return JSONResponse(status_code=503, content={"status": "draining", "in_flight": work.in_flight()})
+
+    # evaluated here too, so the tier can step down while no LLM calls are coming in
+    degradation.evaluate()
     return {
         "message": "anygram API is working!",
         "status": "ok",
         "host": HOST,
-        "port": PORT
+        "port": PORT,
+        "degradation": degradation.tier_name,
     }
 
+@app.get("/ready")
+def readiness_check():
+    status = readiness.status()
+    if not readiness.ready or not work.accepting:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return metrics.render()
+
 # Global error handler
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
@@ -42,9 +269,5 @@ async def generic_exception_handler(request: Request, exc: Exception):
 
 if __name__ == "__main__":
     # Run the application
-    uvicorn.run(
-        "app.main:app",
-        host=HOST,
-        port=PORT,
-        reload=RELOAD
-    )
\ No newline at end of file
+    from app.server import run
+    run()
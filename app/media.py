@@ -0,0 +1,119 @@
+import asyncio
+import tempfile
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+from fastapi import Request
+from app.http_client import get_http_client
+from app.logger import RequestLoggerAdapter
+from app.models import BotConfig
+from app.tracing import tracer
+from app.config import (
+    TELEGRAM_API_URL, TELEGRAM_TOKEN, LLM_MEDIA_URL, MEDIA_UPLOAD_MODE, MEDIA_MAX_BYTES,
+    MEDIA_SPOOL_MEMORY_BYTES, MEDIA_DOWNLOAD_CONCURRENCY,
+)
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MIME_TYPES = {"photo": "image/jpeg", "document": "application/octet-stream", "voice": "audio/ogg"}
+
+# media downloads get their own concurrency budget so large files cannot starve text traffic
+downloads = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+
+
+class MediaTooLargeError(ValueError):
+    pass
+
+
+def extract_media(message: dict) -> Optional[dict]:
+    if message.get("photo"):
+        # sizes come smallest first; pick the largest one that fits the cap
+        sizes = [p for p in message["photo"] if p.get("file_size", 0) <= MEDIA_MAX_BYTES] or message["photo"][:1]
+        photo = sizes[-1]
+        return {"type": "photo", "file_id": photo["file_id"], "file_size": photo.get("file_size"),
+                "mime_type": DEFAULT_MIME_TYPES["photo"], "file_name": "photo.jpg"}
+
+    for kind in ("document", "voice"):
+        item = message.get(kind)
+        if item and item.get("file_id"):
+            return {"type": kind, "file_id": item["file_id"], "file_size": item.get("file_size"),
+                    "mime_type": item.get("mime_type", DEFAULT_MIME_TYPES[kind]),
+                    "file_name": item.get("file_name", kind)}
+    return None
+
+
+async def get_file_path(file_id: str, token: str) -> str:
+    client = get_http_client()
+    with tracer.span("telegram.getFile") as span:
+        resp = await client.get(f"{TELEGRAM_API_URL}/bot{token}/getFile", params={"file_id": file_id})
+        span.set_status_code(resp.status_code)
+    resp.raise_for_status()
+    data = resp.json()
+    if not data.get("ok"):
+        raise ValueError(f"getFile failed: {data.get('description')}")
+
+    size = data["result"].get("file_size")
+    if size and size > MEDIA_MAX_BYTES:
+        raise MediaTooLargeError(f"file is {size} bytes, limit is {MEDIA_MAX_BYTES}")
+    return data["result"]["file_path"]
+
+
+async def _capped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > MEDIA_MAX_BYTES:
+            raise MediaTooLargeError(f"download exceeded {MEDIA_MAX_BYTES} bytes")
+        yield chunk
+
+
+async def ask_llm_with_media(media: dict, caption: str, request: Request, bot: Optional[BotConfig] = None) -> str:
+    log: RequestLoggerAdapter = request.state.logger
+    request_id = log.extra['request_id']
+    token = bot.token if bot else TELEGRAM_TOKEN
+
+    headers = {
+        "X-Request-Id": request_id,
+        "X-Media-Type": media["type"],
+        "X-Filename": quote(media["file_name"]),
+        "X-Prompt": quote(caption or ""),
+        "Content-Type": media["mime_type"],
+    }
+
+    async with downloads:
+        file_path = await get_file_path(media["file_id"], token)
+        log.debug(f"downloading {media['type']} from telegram: file_path: {file_path}")
+
+        client = get_http_client()
+        # one span for the relay: the download and the upload overlap in stream mode
+        with tracer.span("llm.ask_media", **{"http.url": LLM_MEDIA_URL, "media.type": media["type"]}) as span:
+            tracer.inject(headers)
+            async with client.stream("GET", f"{TELEGRAM_API_URL}/file/bot{token}/{file_path}") as download:
+                download.raise_for_status()
+                chunks = _capped(download.aiter_bytes(CHUNK_SIZE))
+
+                if MEDIA_UPLOAD_MODE == "spool":
+                    resp = await _post_spooled(client, chunks, headers)
+                else:
+                    resp = await client.post(LLM_MEDIA_URL, content=chunks, headers=headers)
+            span.set_status_code(resp.status_code)
+
+    log.debug(f"status code from llm: response status: {resp.status_code}")
+    resp.raise_for_status()
+    data = resp.json()
+    log.debug(f"response receive from llm: {data}")
+
+    return data["response"]
+
+
+async def _post_spooled(client, chunks: AsyncIterator[bytes], headers: dict):
+    # for LLM servers that need a Content-Length: small files stay in memory, large ones go to disk
+    with tempfile.SpooledTemporaryFile(max_size=MEDIA_SPOOL_MEMORY_BYTES) as spool:
+        async for chunk in chunks:
+            spool.write(chunk)
+        size = spool.tell()
+        spool.seek(0)
+
+        async def read() -> AsyncIterator[bytes]:
+            while chunk := spool.read(CHUNK_SIZE):
+                yield chunk
+
+        return await client.post(LLM_MEDIA_URL, content=read(), headers={**headers, "Content-Length": str(size)})
@@ -0,0 +1,227 @@
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+from itertools import chain, islice
+from types import FunctionType, ModuleType
+from typing import Callable, Dict, Optional
+from app.logger import log
+from app.metrics import metrics
+from app.config import (
+    MEMORY_SOFT_LIMIT_MB, MEMORY_LIMITS, MEMORY_EVICT_FRACTION, MEMORY_TRACE_FRAMES,
+)
+
+MB = 1024 * 1024
+# leaves that are never walked into: their getsizeof is their whole size, or they are shared by everything
+_ATOMS = (str, bytes, bytearray, int, float, complex, bool, type(None), type, ModuleType, FunctionType)
+# allocations made by the accounting itself are not worth reporting
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    # "similarity_cache=64,file_id_cache=16" -> bytes per component; runs at import, so
+    # malformed entries are skipped here and reported by validate_config()
+    limits = {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, mb = part.partition("=")
+        try:
+            limits[name.strip()] = int(float(mb) * MB)
+        except ValueError:
+            continue
+    return limits
+
+
+def rss() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # no procfs (macOS): the peak is the best there is, and it is in bytes there rather than KB
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_size(obj, depth: int = 4, seen: Optional[set] = None) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if depth <= 0 or isinstance(obj, _ATOMS):
+        return size
+
+    if isinstance(obj, dict):
+        children = chain.from_iterable(obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        children = iter(obj)
+    else:
+        slots = (name for cls in type(obj).__mro__ for name in getattr(cls, "__slots__", ()))
+        children = chain(getattr(obj, "__dict__", {}).values(), (getattr(obj, name, None) for name in slots))
+    return size + sum(deep_size(child, depth - 1, seen) for child in children)
+
+
+def estimate_size(container, sample: int = 100) -> int:
+    """Estimated bytes held by a container: its own size plus the mean size of up to
+    `sample` of its entries times their number. Anything with items() counts as a mapping."""
+    count = len(container)
+    size = sys.getsizeof(container, 0)
+    if not count:
+        return size
+    entries = container.items() if hasattr(container, "items") else container
+    # one seen-set for the whole sample, so objects every entry points at are not counted per entry
+    seen: set = set()
+    sampled = list(islice(entries, sample))
+    measured = sum(deep_size(entry, seen=seen) for entry in sampled)
+    return size + measured * count // len(sampled)
+
+
+class MemoryAccountant:
+    """Reports the memory held by caches, queues and per-chat maps, and evicts under pressure.
+
+    Components are registered with their memory_sources() method, which returns the
+    containers they hold, and, if they can give memory back, a shrink(fraction) callable
+    that drops that share of their least recently used entries. Sizes are estimated by sampling, so they are cheap enough
+    to take on every check but only good to a few percent.
+
+    Two kinds of soft limit trigger eviction: a byte limit per component, and a limit on the
+    process RSS, past which the largest evictable components are shrunk until the estimated
+    savings cover the excess. Python rarely hands freed memory back to the OS, so RSS does
+    not drop after an eviction; the limits stop further growth rather than shrink the pod.
+    """
+
+    def __init__(self, soft_limit: int = 0, limits: Optional[Dict[str, int]] = None, evict_fraction: float = 0.25,
+                 sample: int = 100, trace_frames: int = 1):
+        self.soft_limit = soft_limit
+        self.limits = limits or {}
+        self.evict_fraction = evict_fraction
+        self.sample = sample
+        self.trace_frames = trace_frames
+        self.evictions: Counter = Counter()
+        self._components: Dict[str, tuple] = {}
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._snapshot_at: Optional[float] = None
+
+    def register(self, name: str, source: Callable, shrink: Optional[Callable[[float], int]] = None) -> None:
+        self._components[name] = (source, shrink)
+
+    def measure(self, name: str) -> dict:
+        source, shrink = self._components[name]
+        containers = source()
+        if not isinstance(containers, (list, tuple)):
+            containers = [containers]
+        usage = {
+            "items": sum(len(container) for container in containers),
+            "bytes": sum(estimate_size(container, self.sample) for container in containers),
+            "evictable": shrink is not None,
+        }
+        if name in self.limits:
+            usage["limit_bytes"] = self.limits[name]
+        return usage
+
+    def report(self) -> dict:
+        components = {name: self.measure(name) for name in self._components}
+        tracing = tracemalloc.is_tracing()
+        return {
+            "rss_bytes": rss(),
+            "soft_limit_bytes": self.soft_limit,
+            "accounted_bytes": sum(usage["bytes"] for usage in components.values()),
+            "components": dict(sorted(components.items(), key=lambda item: -item[1]["bytes"])),
+            "evictions": dict(self.evictions),
+            "gc": {"counts": gc.get_count(), "uncollectable": len(gc.garbage)},
+            "tracemalloc": {
+                "tracing": tracing,
+                "traced_bytes": tracemalloc.get_traced_memory()[0] if tracing else 0,
+                "last_snapshot_age": round(time.monotonic() - self._snapshot_at, 1) if self._snapshot_at else None,
+            },
+        }
+
+    def _shrink(self, name: str, fraction: float, reason: str) -> int:
+        evicted = self._components[name][1](fraction)
+        if evicted:
+            self.evictions[name] += evicted
+            metrics.inc("anygram_memory_evicted_total", evicted, component=name, reason=reason)
+            log.warning(f"memory {reason} limit: evicted {evicted} entries ({fraction:.0%}) from {name}")
+        return evicted
+
+    def enforce(self) -> Dict[str, int]:
+        evicted: Dict[str, int] = Counter()
+        for name, limit in self.limits.items():
+            if name not in self._components or self._components[name][1] is None:
+                continue
+            size = self.measure(name)["bytes"]
+            if size > limit:
+                # enough to get back under the limit in one step, and at least the usual share
+                evicted[name] += self._shrink(name, max(self.evict_fraction, 1 - limit / size), "component")
+
+        current = rss() if self.soft_limit else 0
+        if current > self.soft_limit > 0:
+            sizes = {name: self.measure(name)["bytes"] for name, (_, shrink) in self._components.items() if shrink}
+            excess = current - self.soft_limit
+            for name in sorted(sizes, key=sizes.get, reverse=True):
+                if excess <= 0:
+                    break
+                evicted[name] += self._shrink(name, self.evict_fraction, "process")
+                excess -= sizes[name] * self.evict_fraction
+            gc.collect()
+        return dict(evicted)
+
+    async def run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.enforce()
+            except Exception as e:
+                log.error(f"memory limit check failed: {type(e).__name__}: {e}")
+
+    def snapshot(self, limit: int = 20) -> dict:
+        """Takes a tracemalloc snapshot and returns the top allocation sites, compared with
+        the previous snapshot if there is one. The first call starts tracing, which slows
+        allocations down until stop_tracing() is called."""
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(self.trace_frames)
+            log.info(f"tracemalloc started with {self.trace_frames} frames")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        previous, previous_at = self._snapshot, self._snapshot_at
+        self._snapshot, self._snapshot_at = snapshot, time.monotonic()
+
+        if previous is None:
+            top = [{"location": str(stat.traceback), "size": stat.size, "count": stat.count}
+                   for stat in snapshot.statistics("lineno")[:limit]]
+        else:
+            top = [{"location": str(stat.traceback), "size": stat.size, "size_diff": stat.size_diff,
+                    "count": stat.count, "count_diff": stat.count_diff}
+                   for stat in snapshot.compare_to(previous, "lineno")[:limit]]
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing_started": started,
+            "compared_to_seconds_ago": round(self._snapshot_at - previous_at, 1) if previous_at else None,
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "top": top,
+        }
+
+    def stop_tracing(self) -> bool:
+        tracing = tracemalloc.is_tracing()
+        tracemalloc.stop()
+        self._snapshot = self._snapshot_at = None
+        return tracing
+
+
+accountant = MemoryAccountant(
+    soft_limit=int(MEMORY_SOFT_LIMIT_MB * MB),
+    limits=parse_limits(MEMORY_LIMITS),
+    evict_fraction=MEMORY_EVICT_FRACTION,
+    trace_frames=MEMORY_TRACE_FRAMES,
+)
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from typing import Callable, Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    # label values are quoted in the text format, so backslashes, quotes and newlines are escaped
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """In-process counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+        self._gauges: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]) -> None:
+        # collectors are called at scrape time and return {metric_name: value} gauges
+        self._collectors.append(collector)
+
+    def get(self, name: str, **labels) -> float:
+        key = (name, tuple(sorted(labels.items())))
+        return self._counters.get(key, self._gauges.get(key, 0))
+
+    def memory_sources(self) -> list:
+        return [self._counters, self._gauges, self._histograms]
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self._gauges.clear()
+        self._histograms.clear()
+
+    @staticmethod
+    def _format(name: str, labels: Tuple, value: float) -> str:
+        if labels:
+            rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            return f"{name}{{{rendered}}} {value}"
+        return f"{name} {value}"
+
+    def render(self) -> str:
+        lines = [self._format(name, labels, value) for (name, labels), value in sorted(self._counters.items())]
+        lines += [self._format(name, labels, value) for (name, labels), value in sorted(self._gauges.items())]
+        for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(self._format(f"{name}_bucket", labels + (("le", bound),), cumulative))
+            lines.append(self._format(f"{name}_bucket", labels + (("le", "+Inf"),), histogram.count))
+            lines.append(self._format(f"{name}_sum", labels, histogram.sum))
+            lines.append(self._format(f"{name}_count", labels, histogram.count))
+        for collector in self._collectors:
+            for name, value in collector().items():
+                lines.append(self._format(name, (), value))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -1,6 +1,56 @@
-from typing import Union, Optional
-from pydantic import BaseModel
+from typing import List, Union, Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+class InlineKeyboardButton(BaseModel):
+    text: str
+    callback_data: Optional[str] = None
+    url: Optional[str] = None
+
+    @field_validator("callback_data")
+    @classmethod
+    def check_callback_data(cls, value):
+        # telegram's limit is in bytes, not characters
+        if value is not None and not 1 <= len(value.encode("utf-8")) <= 64:
+            raise ValueError("callback_data must be 1-64 bytes")
+        return value
+
+    @model_validator(mode="after")
+    def check_action(self):
+        if (self.callback_data is None) == (self.url is None):
+            raise ValueError("a button needs exactly one of callback_data or url")
+        return self
+
+class InlineKeyboardMarkup(BaseModel):
+    inline_keyboard: List[List[InlineKeyboardButton]]
 
 class Message(BaseModel):
     chat_id: Optional[Union[str, int]] = None
     text: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+class BatchItem(BaseModel):
+    routing_id: Optional[str] = None
+    chat_id: Optional[Union[str, int]] = None
+    text: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+class CallbackReply(BaseModel):
+    # answer to a button press: a toast (or alert) and optionally a new text for the message
+    text: Optional[str] = None
+    show_alert: bool = False
+    edit: Optional[str] = None
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+class BotConfig(BaseModel):
+    id: str
+    token: str
+    secret_token: Optional[str] = None
+    llm_url: Optional[str] = None
+    gateway_enabled: Optional[bool] = None
+    # a zero rate would never refill the bot's send bucket
+    rate_limit: Optional[float] = Field(default=None, gt=0)
+    burst: Optional[int] = Field(default=None, ge=1)
+
+class RoutingUpdate(BaseModel):
+    gateway_percent: float = Field(ge=0, le=100)
+    reset: bool = False
@@ -0,0 +1,116 @@
+from collections import deque
+from typing import Any, Dict, Optional
+from app.config import PRIORITY_WEIGHTS, PRIORITY_CHATS
+
+COMMAND = "command"
+INTERACTIVE = "interactive"
+BULK = "bulk"
+BACKGROUND = "background"
+PRIORITIES = (COMMAND, INTERACTIVE, BULK, BACKGROUND)
+DEFAULT_WEIGHTS = {COMMAND: 8.0, INTERACTIVE: 4.0, BULK: 2.0, BACKGROUND: 1.0}
+
+PRIORITY_HEADER = "X-Priority"
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    weights = dict(DEFAULT_WEIGHTS)
+    for pair in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = pair.partition("=")
+        if name.strip() in weights:
+            weights[name.strip()] = max(float(value), 0.001)
+    return weights
+
+
+def parse_chat_rules(spec: str) -> Dict[str, str]:
+    rules = {}
+    for pair in filter(None, (part.strip() for part in spec.split(","))):
+        chat_id, _, priority = pair.rpartition("=")
+        if priority.strip() in PRIORITIES:
+            rules[chat_id.strip()] = priority.strip()
+    return rules
+
+
+WEIGHTS = parse_weights(PRIORITY_WEIGHTS)
+CHAT_RULES = parse_chat_rules(PRIORITY_CHATS)
+
+
+def classify_request(path: str, headers, trusted: bool = False) -> str:
+    # the endpoint decides; chat and command rules are applied once the update is parsed
+    default = BULK if path.endswith("/send/batch") else INTERACTIVE
+    if "webhook" in path.split("/"):
+        # webhook priority is derived from the update itself, never from what the sender claims
+        return default
+    # X-Priority is sent before any authentication, so an anonymous caller may only lower its own
+    # priority; raising it (and evicting queued waiters) needs the admin token
+    requested = (headers.get(PRIORITY_HEADER) or "").lower()
+    if requested in PRIORITIES and (trusted or PRIORITIES.index(requested) >= PRIORITIES.index(default)):
+        return requested
+    return default
+
+
+def classify_chat(chat_id, default: str) -> str:
+    return CHAT_RULES.get(str(chat_id), default)
+
+
+def classify_text(text: Optional[str], default: str) -> str:
+    return COMMAND if text and text.startswith("/") else default
+
+
+class WeightedFairQueue:
+    """One FIFO per priority class, served in weighted fair order.
+
+    Each item gets a virtual finish time of max(now, last finish of its class) + 1/weight,
+    and pop() returns the smallest. A class with weight 8 is served eight times as often
+    as one with weight 1 while both are backlogged, but no class is starved.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = weights or WEIGHTS
+        self._queues: Dict[str, deque] = {priority: deque() for priority in self.weights}
+        self._finish: Dict[str, float] = {priority: 0.0 for priority in self.weights}
+        self._virtual_time = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def __bool__(self) -> bool:
+        return any(self._queues.values())
+
+    def __iter__(self):
+        for queue in self._queues.values():
+            yield from queue
+
+    def push(self, priority: str, item: Any) -> None:
+        if priority not in self._queues:
+            priority = INTERACTIVE
+        finish = max(self._virtual_time, self._finish[priority]) + 1.0 / self.weights[priority]
+        self._finish[priority] = finish
+        self._queues[priority].append((finish, item))
+
+    def pop(self) -> Any:
+        heads = [(queue[0][0], priority) for priority, queue in self._queues.items() if queue]
+        if not heads:
+            raise IndexError("pop from an empty queue")
+        finish, priority = min(heads)
+        self._virtual_time = finish
+        return self._queues[priority].popleft()[1]
+
+    def evict_below(self, priority: str) -> Any:
+        # the newest waiter of the lowest class ranked below `priority`, or None
+        rank = PRIORITIES.index(priority) if priority in PRIORITIES else len(PRIORITIES)
+        for lower in reversed(PRIORITIES[rank + 1:]):
+            queue = self._queues.get(lower)
+            if queue:
+                return queue.pop()[1]
+        return None
+
+    def remove(self, item: Any) -> bool:
+        for queue in self._queues.values():
+            for entry in queue:
+                if entry[1] is item:
+                    queue.remove(entry)
+                    return True
+        return False
+
+    def depth(self) -> Dict[str, int]:
+        return {priority: len(queue) for priority, queue in self._queues.items()}
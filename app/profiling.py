@@ -0,0 +1,158 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from app.cache import LRUCache
+from app.logger import log
+from app.metrics import metrics
+from app.config import LOOP_MONITOR_INTERVAL, LOOP_SLOW_THRESHOLD, PROFILE_KEEP
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PROFILE_HEADER = "X-Profile"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def fold_stack(frame) -> str:
+    # root first, frames joined by ';', the collapsed format read by flamegraph.pl and speedscope
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def format_stack(frame, limit: int = 12) -> str:
+    lines = []
+    while frame is not None and len(lines) < limit:
+        lines.append(f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return " <- ".join(lines)
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread from a background thread at a fixed interval.
+
+    Nothing is instrumented, so the profiled code runs at full speed; the cost is one
+    stack walk per sample. Output is in collapsed-stack format, one `stack count` per line.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[fold_stack(frame)] += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._sample, name="anygram-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self, seconds: float) -> "SamplingProfiler":
+        self.start()
+        time.sleep(seconds)
+        self.stop()
+        return self
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up and reports what blocked it.
+
+    A task sleeps for `interval` and records how much longer than that it took into the
+    anygram_event_loop_lag_seconds histogram. A watchdog thread notices when that task
+    stops checking in and logs the stack the loop thread is stuck in, which points at the
+    blocking call while it is still running.
+    """
+
+    def __init__(self, interval: float = 0.25, slow_threshold: float = 0.1):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocked = 0
+        self._heartbeat = time.monotonic()
+        self._reported: Optional[float] = None
+        self._thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def _run(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._heartbeat = time.monotonic()
+            self.record(self._heartbeat - start - self.interval)
+
+    def record(self, lag: float) -> None:
+        lag = max(0.0, lag)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        metrics.observe("anygram_event_loop_lag_seconds", lag, LAG_BUCKETS)
+        if lag > self.slow_threshold:
+            log.warning(f"event loop lag: {lag * 1000:.1f}ms")
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.slow_threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled <= self.slow_threshold or self._reported == heartbeat:
+                continue
+            # report each stall once, with the stack the loop thread is in right now
+            self._reported = heartbeat
+            self.blocked += 1
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                log.warning(f"event loop blocked for {stalled * 1000:.0f}ms in: {format_stack(frame)}")
+
+    def start(self) -> None:
+        self._thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="anygram-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join()
+
+    def stats(self) -> dict:
+        return {
+            "last_lag": round(self.last_lag, 6),
+            "max_lag": round(self.max_lag, 6),
+            "blocked": self.blocked,
+        }
+
+
+monitor = LoopLagMonitor(LOOP_MONITOR_INTERVAL, LOOP_SLOW_THRESHOLD)
+
+# collapsed stacks of requests sent with the X-Profile header, by request id
+profiles = LRUCache(PROFILE_KEEP)
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Hashable, Optional
+from app.cache import LRUCache
+from app.priority import WeightedFairQueue, INTERACTIVE
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # callers that find the bucket empty wait here and are served in weighted fair order;
+        # created on first use so idle buckets stay small
+        self._waiters: Optional[WeightedFairQueue] = None
+        self._pump: Optional[asyncio.Task] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, tokens: float = 1) -> bool:
+        self._refill()
+        return self.tokens >= tokens
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters) if self._waiters else 0
+
+    async def acquire(self, tokens: float = 1, priority: str = INTERACTIVE) -> None:
+        if not self._waiters and self.try_acquire(tokens):
+            return
+
+        if self._waiters is None:
+            self._waiters = WeightedFairQueue()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.push(priority, (fut, tokens))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._serve())
+        await fut
+
+    async def _serve(self) -> None:
+        while self._waiters:
+            fut, tokens = self._waiters.pop()
+            if fut.done():
+                continue
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+            if fut.done():
+                # the caller gave up while we waited; keep the token for the next one
+                self.tokens += tokens
+            else:
+                fut.set_result(None)
+
+
+class KeyedRateLimiter:
+    """A token bucket per key, with the least recently seen keys forgotten past maxsize.
+
+    A forgotten key starts again with a full bucket, which only ever errs on the side of
+    letting a message through.
+    """
+
+    def __init__(self, rate: float, burst: float, maxsize: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = LRUCache(maxsize)
+
+    def bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets.put(key, bucket)
+        return bucket
+
+    def try_acquire(self, key: Hashable) -> bool:
+        return self.bucket(key).try_acquire()
+
+    def items(self):
+        return self._buckets.items()
+
+    def shrink(self, fraction: float) -> int:
+        return self._buckets.shrink(fraction)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
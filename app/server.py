@@ -0,0 +1,35 @@
+import importlib.util
+import uvicorn
+from app.config import (
+    HOST, PORT, RELOAD, LOG_LEVEL, WORKERS, BACKLOG, KEEP_ALIVE_TIMEOUT, GRACEFUL_SHUTDOWN_TIMEOUT,
+)
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def server_options() -> dict:
+    # uvicorn cannot combine the reloader with multiple workers
+    workers = 1 if RELOAD else max(1, WORKERS)
+
+    return {
+        "host": HOST,
+        "port": PORT,
+        "reload": RELOAD,
+        "workers": workers,
+        "loop": "uvloop" if _available("uvloop") else "asyncio",
+        "http": "httptools" if _available("httptools") else "h11",
+        "backlog": BACKLOG,
+        "timeout_keep_alive": KEEP_ALIVE_TIMEOUT,
+        "timeout_graceful_shutdown": GRACEFUL_SHUTDOWN_TIMEOUT,
+        "log_level": LOG_LEVEL.lower(),
+    }
+
+
+def run():
+    uvicorn.run("app.main:app", **server_options())
+
+
+if __name__ == "__main__":
+    run()
@@ -1,70 +1,320 @@
-import httpx
-from .config import TELEGRAM_API_URL, TELEGRAM_TOKEN, LLM_URL, GATEWAY_API_URL
+from app.http_client import get_http_client
+from .config import (
+    TELEGRAM_API_URL, TELEGRAM_TOKEN, LLM_URL, GATEWAY_API_URL, GATEWAY_FORMAT, FILE_ID_CACHE_SIZE, LLM_BATCH_ENABLED,
+    SIMILARITY_CACHE_MODE, LLM_FALLBACK_URL, DEGRADE_MAX_CHARS, DEGRADE_BUSY_REPLY,
+)
 from fastapi import Request
 from app.logger import logger, RequestLoggerAdapter
+from app.models import BotConfig, InlineKeyboardMarkup
+from app.bots import registry, DEFAULT_BOT_ID
+from app.cache import LRUCache
+from app.metrics import metrics
+from app.compression import compress_body
+from app.priority import classify_chat, INTERACTIVE
+from app.tracing import tracer
+from app.batching import batcher
+from app.similarity import similarity_cache, response_similarity
+from app.degradation import degradation, shorten, NORMAL, FALLBACK, SHORT, BUSY, TIER_NAMES
+from typing import AsyncIterator, Optional
 from uuid import uuid4
+import hashlib
 import json
 import base64
 
-async def send_telegram_message(msg, request: Request):
+MEDIA_METHODS = {"photo": "sendPhoto", "document": "sendDocument", "voice": "sendVoice"}
+
+# (bot id, media type, sha256 of the content) -> telegram file_id; file_ids are only valid for the bot that uploaded them
+file_id_cache = LRUCache(FILE_ID_CACHE_SIZE)
+
+async def send_telegram_message(msg, request: Request, bot: Optional[BotConfig] = None):
     log: RequestLoggerAdapter = request.state.logger
-    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_TOKEN}/sendMessage"
+    token = bot.token if bot else TELEGRAM_TOKEN
+    url = f"{TELEGRAM_API_URL}/bot{token}/sendMessage"
     payload = {"chat_id": msg.chat_id, "text": msg.text}
+    if msg.reply_markup is not None:
+        payload["reply_markup"] = msg.reply_markup.model_dump(exclude_none=True)
 
     log.debug(f"payload to send to telegram: payload: {payload}")
 
-    async with httpx.AsyncClient() as client:
+    if bot:
+        priority = classify_chat(msg.chat_id, getattr(request.state, "priority", INTERACTIVE))
+        await registry.limiter(bot).acquire(priority=priority)
+
+    client = get_http_client()
+    with tracer.span("telegram.sendMessage") as span:
         r = await client.post(url, json=payload)
+        span.set_status_code(r.status_code)
+
+    log.debug(f"status code from telegram: response status: {r.status_code}")
+    log.debug(f"response receive from telegram: {r.json()}")
+
+    return r.json()
+
+async def answer_callback_query(callback_query_id: str, request: Request, bot: Optional[BotConfig] = None,
+                                text: Optional[str] = None, show_alert: bool = False):
+    log: RequestLoggerAdapter = request.state.logger
+    token = bot.token if bot else TELEGRAM_TOKEN
+    url = f"{TELEGRAM_API_URL}/bot{token}/answerCallbackQuery"
+    payload = {"callback_query_id": callback_query_id}
+    if text:
+        payload["text"] = text
+    if show_alert:
+        payload["show_alert"] = True
+
+    # not rate limited: the client shows a spinner until this arrives, and it sends nothing to the chat
+    client = get_http_client()
+    with tracer.span("telegram.answerCallbackQuery") as span:
+        r = await client.post(url, json=payload)
+        span.set_status_code(r.status_code)
+
+    log.debug(f"status code from telegram: response status: {r.status_code}")
+    return r.json()
+
+async def edit_message_text(text: str, request: Request, bot: Optional[BotConfig] = None, chat_id=None,
+                            message_id: Optional[int] = None, inline_message_id: Optional[str] = None,
+                            reply_markup: Optional[InlineKeyboardMarkup] = None):
+    log: RequestLoggerAdapter = request.state.logger
+    token = bot.token if bot else TELEGRAM_TOKEN
+    url = f"{TELEGRAM_API_URL}/bot{token}/editMessageText"
+    if inline_message_id:
+        payload = {"inline_message_id": inline_message_id, "text": text}
+    else:
+        payload = {"chat_id": chat_id, "message_id": message_id, "text": text}
+    if reply_markup is not None:
+        payload["reply_markup"] = reply_markup.model_dump(exclude_none=True)
+
+    if bot:
+        priority = classify_chat(chat_id, getattr(request.state, "priority", INTERACTIVE))
+        await registry.limiter(bot).acquire(priority=priority)
 
+    client = get_http_client()
+    with tracer.span("telegram.editMessageText") as span:
+        r = await client.post(url, json=payload)
+        span.set_status_code(r.status_code)
+
+    data = r.json()
+    if not data.get("ok"):
+        log.warning(f"editMessageText failed: {data.get('description')}")
+    return data
+
+def _multipart_field(boundary: str, name: str, value: str) -> bytes:
+    return (
+        f"--{boundary}\r\n"
+        f"Content-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+        f"{value}\r\n"
+    ).encode("utf-8")
+
+def _file_id_from_result(media: str, result: dict) -> Optional[str]:
+    item = result.get(media)
+    if media == "photo" and item:
+        # telegram returns every generated size, the last one is the original
+        item = item[-1]
+    return item.get("file_id") if item else None
+
+async def send_telegram_media(
+    media: str,
+    chat_id,
+    request: Request,
+    body: Optional[AsyncIterator[bytes]] = None,
+    filename: str = "file",
+    content_type: str = "application/octet-stream",
+    caption: Optional[str] = None,
+    file_id: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    bot: Optional[BotConfig] = None,
+):
+    log: RequestLoggerAdapter = request.state.logger
+    token = bot.token if bot else TELEGRAM_TOKEN
+    bot_id = bot.id if bot else DEFAULT_BOT_ID
+    url = f"{TELEGRAM_API_URL}/bot{token}/{MEDIA_METHODS[media]}"
+
+    fields = {"chat_id": str(chat_id)}
+    if caption:
+        fields["caption"] = caption
+
+    if not file_id and content_hash:
+        file_id = file_id_cache.get((bot_id, media, content_hash.lower()))
+        if file_id:
+            metrics.inc("anygram_file_id_cache_hits_total", media=media)
+
+    if bot:
+        priority = classify_chat(chat_id, getattr(request.state, "priority", INTERACTIVE))
+        await registry.limiter(bot).acquire(priority=priority)
+
+    client = get_http_client()
+
+    if file_id:
+        log.debug(f"sending {media} to telegram by file_id: {file_id}")
+        with tracer.span(f"telegram.{MEDIA_METHODS[media]}", file_id=True) as span:
+            r = await client.post(url, json={**fields, media: file_id})
+            span.set_status_code(r.status_code)
         log.debug(f"status code from telegram: response status: {r.status_code}")
-        log.debug(f"response receive from telegram: {r.json()}")
-        
         return r.json()
 
-async def ask_llm(prompt: str, request: Request) -> str:
+    if body is None:
+        raise ValueError(f"{media} upload requires a body or a file_id")
+
+    boundary = uuid4().hex
+    digest = hashlib.sha256()
+    safe_filename = filename.replace('"', "")
+
+    async def multipart() -> AsyncIterator[bytes]:
+        # stream the incoming body through as the file part, never holding the whole file in memory
+        for name, value in fields.items():
+            yield _multipart_field(boundary, name, value)
+        yield (
+            f"--{boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"{media}\"; filename=\"{safe_filename}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        async for chunk in body:
+            digest.update(chunk)
+            yield chunk
+        yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+    log.debug(f"streaming {media} upload to telegram: filename: {safe_filename}")
+    with tracer.span(f"telegram.{MEDIA_METHODS[media]}", file_id=False) as span:
+        r = await client.post(
+            url,
+            content=multipart(),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        span.set_status_code(r.status_code)
+    log.debug(f"status code from telegram: response status: {r.status_code}")
+
+    data = r.json()
+    if data.get("ok"):
+        uploaded_id = _file_id_from_result(media, data.get("result", {}))
+        if uploaded_id:
+            file_id_cache.put((bot_id, media, digest.hexdigest()), uploaded_id)
+    return data
+
+async def ask_llm(prompt: str, request: Request, bot: Optional[BotConfig] = None) -> str:
+    tier = degradation.evaluate()
+    if SIMILARITY_CACHE_MODE == "off":
+        return await _ask_llm(prompt, request, bot, tier)
+
+    log: RequestLoggerAdapter = request.state.logger
+    scope = bot.id if bot else DEFAULT_BOT_ID
+    signature = similarity_cache.signature(prompt)
+    cached = similarity_cache.lookup(prompt, scope, signature)
+
+    if cached is not None and SIMILARITY_CACHE_MODE == "on":
+        response, score = cached
+        log.debug(f"similarity cache hit: score: {score:.2f}")
+        metrics.inc("anygram_similarity_cache_hits_total")
+        return response
+
+    response = await _ask_llm(prompt, request, bot, tier)
+    if tier != NORMAL:
+        # degraded answers are not what the prompt would normally get, so they are neither cached nor compared
+        return response
+    if cached is not None:
+        # shadow mode: how close would the cached answer have been to the real one
+        metrics.observe("anygram_similarity_shadow_agreement", response_similarity(cached[0], response))
+        metrics.inc("anygram_similarity_cache_shadow_hits_total")
+    else:
+        similarity_cache.put(prompt, response, scope, signature)
+    return response
+
+async def _ask_llm(prompt: str, request: Request, bot: Optional[BotConfig] = None, tier: int = NORMAL) -> str:
     log: RequestLoggerAdapter = request.state.logger
     request_id = log.extra['request_id']
 
+    if tier != NORMAL:
+        metrics.inc("anygram_degraded_replies_total", tier=TIER_NAMES[tier])
+    if tier >= BUSY:
+        log.warning("llm skipped: degradation tier busy")
+        return DEGRADE_BUSY_REPLY
+
     payload = {"prompt": prompt}
+    if tier >= SHORT:
+        # a hint for LLMs that support it; the answer is cut to length here either way
+        payload["max_length"] = DEGRADE_MAX_CHARS
     headers = {
         "X-Request-Id": request_id,
         "Content-Type": "application/json",
     }
     log.debug(f"payload to send to llm: payload: {payload}")
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(LLM_URL, json=payload, headers=headers)
-        log.debug(f"status code from llm: response status: {resp.status_code}")
+    fallback = tier >= FALLBACK and bool(LLM_FALLBACK_URL)
+
+    # bots with their own LLM keep single requests; the batch endpoint belongs to the default one
+    if LLM_BATCH_ENABLED and not (bot and bot.llm_url) and not fallback:
+        with tracer.span("llm.ask", batched=True), degradation.track():
+            response = await batcher.ask(prompt, request_id)
+        log.debug(f"response receive from llm batch: {response}")
+        return shorten(response, DEGRADE_MAX_CHARS) if tier >= SHORT else response
+
+    if fallback:
+        url = LLM_FALLBACK_URL
+    else:
+        url = bot.llm_url if bot and bot.llm_url else LLM_URL
 
-        resp.raise_for_status()
-        data = resp.json()        
-        log.debug(f"response receive from llm: {data}")
+    body, encoding = compress_body(json.dumps(payload).encode("utf-8"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
 
-        return data["response"]
+    client = get_http_client()
+    with tracer.span("llm.ask", **{"http.url": url}) as span, degradation.track():
+        tracer.inject(headers)
+        resp = await client.post(url, content=body, headers=headers)
+        span.set_status_code(resp.status_code)
+    log.debug(f"status code from llm: response status: {resp.status_code}")
 
-async def send_message_to_gateway(prompt: str, chat_id: str, request: Request) -> None:
+    resp.raise_for_status()
+    data = resp.json()
+    log.debug(f"response receive from llm: {data}")
+
+    response = data["response"]
+    return shorten(response, DEGRADE_MAX_CHARS) if tier >= SHORT else response
+
+GATEWAY_CONTENT_TYPES = {
+    "json": "application/json",
+    "raw": "text/plain; charset=utf-8",
+    "msgpack": "application/msgpack",
+}
+
+def encode_gateway_content(prompt: str, fmt: str = "json"):
+    if fmt == "raw":
+        # routing is already in the headers, so the body can be the prompt itself
+        return GATEWAY_CONTENT_TYPES["raw"], prompt.encode("utf-8")
+
+    if fmt == "msgpack":
+        import msgpack
+        return GATEWAY_CONTENT_TYPES["msgpack"], msgpack.packb({"prompt": prompt})
+
+    content_json = json.dumps({"prompt": prompt})
+    content_base64 = base64.b64encode(content_json.encode("utf-8")).decode("utf-8")
+    return GATEWAY_CONTENT_TYPES["json"], json.dumps({"content": content_base64}).encode("utf-8")
+
+async def send_message_to_gateway(prompt: str, chat_id: str, request: Request, bot: Optional[BotConfig] = None) -> None:
     log: RequestLoggerAdapter = request.state.logger
     request_id = log.extra['request_id']
     
     correlation_id = str(uuid4())
-    key = f"telegram:{chat_id}"
-    content_json = json.dumps({"prompt": prompt})
-    content_base64 = base64.b64encode(content_json.encode("utf-8")).decode("utf-8")
-
-    payload = {"content": content_base64}
+    # the default bot keeps the original routing id so existing consumers are unaffected
+    key = f"telegram:{chat_id}" if not bot or bot.id == DEFAULT_BOT_ID else f"telegram:{bot.id}:{chat_id}"
+    content_type, body = encode_gateway_content(prompt, GATEWAY_FORMAT)
+    body, encoding = compress_body(body)
 
     headers = {
         "X-Correlation-Id": correlation_id,
         "X-Routing-Id": key,
         "X-Request-Id": request_id,
-        "Content-Type": "application/json",
+        "Content-Type": content_type,
     }
-    log.debug(f"payload to send to anyway: {payload}")
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    log.debug(f"payload to send to anyway: format: {GATEWAY_FORMAT} size: {len(body)}")
     log.info(f"key to send to anyway: {key}")
     log.info(f"header to send to anyway: correlation-id: {correlation_id}")
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(GATEWAY_API_URL, json=payload, headers=headers)
-        log.debug(f"status code from anyway: response status: {resp.status_code}")
+    client = get_http_client()
+    with tracer.span("gateway.send", **{"http.url": GATEWAY_API_URL, "gateway.format": GATEWAY_FORMAT}) as span:
+        tracer.inject(headers)
+        resp = await client.post(GATEWAY_API_URL, content=body, headers=headers)
+        span.set_status_code(resp.status_code)
+    log.debug(f"status code from anyway: response status: {resp.status_code}")
 
-        resp.raise_for_status()
\ No newline at end of file
+    resp.raise_for_status()
@@ -0,0 +1,187 @@
+import random
+import re
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+from app.metrics import metrics
+from app.config import (
+    SIMILARITY_CACHE_MODE, SIMILARITY_THRESHOLD, SIMILARITY_CACHE_SIZE, SIMILARITY_CACHE_TTL, SIMILARITY_MAX_CHARS,
+)
+
+SCORE_BUCKETS = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 1.0)
+MERSENNE_PRIME = (1 << 61) - 1
+
+# chat shorthand expanded before hashing, so "what r ur hours" and "what are your hours" match exactly
+SHORTHAND = {
+    "r": "are", "u": "you", "ur": "your", "y": "why", "pls": "please", "plz": "please", "thx": "thanks",
+    "ty": "thanks", "whats": "what is", "im": "i am", "dont": "do not", "cant": "can not", "wanna": "want to",
+}
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    words = PUNCTUATION_RE.sub(" ", text.replace("'", "")).split()
+    return " ".join(SHORTHAND.get(word, word) for word in words)
+
+
+class MinHasher:
+    """MinHash signatures over character n-grams of normalized text."""
+
+    def __init__(self, num_perm: int = 64, ngram: int = 3, seed: int = 1):
+        self.ngram = ngram
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(num_perm)
+        ]
+
+    def shingles(self, normalized: str) -> Set[int]:
+        padded = f" {normalized} "
+        n = self.ngram
+        return {zlib.crc32(padded[i:i + n].encode("utf-8")) for i in range(max(1, len(padded) - n + 1))}
+
+    def signature(self, normalized: str) -> Tuple[int, ...]:
+        shingles = self.shingles(normalized)
+        return tuple(min((a * s + b) % MERSENNE_PRIME for s in shingles) for a, b in self.permutations)
+
+
+def estimate(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    # the fraction of agreeing MinHash values estimates the Jaccard similarity of the n-gram sets
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class SimilarityCache:
+    """LLM answers for near-identical prompts, found through a MinHash LSH index.
+
+    Signatures are split into `bands`; prompts that agree on every row of any band become
+    candidates, and a candidate is a hit when its estimated similarity reaches `threshold`.
+    At most `maxsize` entries are indexed, least recently used evicted first, and entries
+    expire after `ttl` seconds. Entries are scoped (per bot) so bots never share answers.
+    """
+
+    def __init__(self, threshold: float = 0.8, maxsize: int = 10000, ttl: float = 3600,
+                 num_perm: int = 64, bands: int = 16, ngram: int = 3, max_chars: int = 512):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.maxsize = maxsize
+        # hashing cost grows with prompt length; long prompts are rarely near-duplicates anyway
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, ngram)
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._buckets: Dict[tuple, Set[int]] = {}
+        self._next_id = 0
+
+    def _band_keys(self, scope: str, signature: Tuple[int, ...]):
+        for band in range(self.bands):
+            yield (scope, band, signature[band * self.rows:(band + 1) * self.rows])
+
+    def _evict(self, entry_id: int) -> None:
+        scope, signature, _, _ = self._entries.pop(entry_id)
+        for key in self._band_keys(scope, signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def cacheable(self, prompt: str) -> bool:
+        return self.maxsize > 0 and len(prompt) <= self.max_chars
+
+    def signature(self, prompt: str) -> Optional[Tuple[int, ...]]:
+        # None for prompts that are never cached; callers pass it to both lookup() and put()
+        # so a miss followed by a store hashes the prompt once
+        normalized = normalize(prompt) if self.cacheable(prompt) else ""
+        return self.hasher.signature(normalized) if normalized else None
+
+    def lookup(self, prompt: str, scope: str = "",
+               signature: Optional[Tuple[int, ...]] = None) -> Optional[Tuple[str, float]]:
+        signature = signature or self.signature(prompt)
+        if signature is None:
+            return None
+        now = time.monotonic()
+
+        candidates: Set[int] = set()
+        for key in self._band_keys(scope, signature):
+            candidates |= self._buckets.get(key, set())
+
+        best_id, best_score = None, 0.0
+        for entry_id in candidates:
+            _, other, _, expires = self._entries[entry_id]
+            if expires <= now:
+                self._evict(entry_id)
+                continue
+            score = estimate(signature, other)
+            if score > best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is not None:
+            metrics.observe("anygram_similarity_cache_score", best_score, SCORE_BUCKETS)
+        if best_id is None or best_score < self.threshold:
+            self.misses += 1
+            if best_id is not None:
+                self.near_misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id][2], best_score
+
+    def put(self, prompt: str, response: str, scope: str = "", signature: Optional[Tuple[int, ...]] = None) -> None:
+        signature = signature or self.signature(prompt)
+        if signature is None:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (scope, signature, response, time.monotonic() + self.ttl)
+        for key in self._band_keys(scope, signature):
+            self._buckets.setdefault(key, set()).add(entry_id)
+        while len(self._entries) > self.maxsize:
+            self._evict(next(iter(self._entries)))
+
+    def shrink(self, fraction: float) -> int:
+        count = int(len(self._entries) * fraction + 0.5) if self._entries else 0
+        for _ in range(count):
+            self._evict(next(iter(self._entries)))
+        return count
+
+    def memory_sources(self) -> list:
+        return [self._entries, self._buckets]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "buckets": len(self._buckets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "near_misses": self.near_misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+def response_similarity(a: str, b: str) -> float:
+    # used in shadow mode to check how often a cached answer would have matched a fresh one
+    x, y = set(normalize(a).split()), set(normalize(b).split())
+    return len(x & y) / len(x | y) if x | y else 1.0
+
+
+similarity_cache = SimilarityCache(
+    threshold=SIMILARITY_THRESHOLD,
+    maxsize=SIMILARITY_CACHE_SIZE if SIMILARITY_CACHE_MODE != "off" else 0,
+    ttl=SIMILARITY_CACHE_TTL,
+    max_chars=SIMILARITY_MAX_CHARS,
+)
@@ -0,0 +1,116 @@
+from typing import Dict, Optional, Tuple
+from app.cache import LRUCache
+from app.metrics import metrics
+from app.ratelimit import KeyedRateLimiter
+from app.config import (
+    INBOUND_LIMIT_ENABLED, INBOUND_LIMIT_TIERS, INBOUND_USER_TIERS, INBOUND_CHAT_RATE, INBOUND_CHAT_BURST,
+    INBOUND_LIMIT_CACHE_SIZE,
+)
+
+DEFAULT_TIER = "default"
+USER = "user"
+CHAT = "chat"
+
+
+def parse_tiers(spec: str) -> Dict[str, Tuple[float, float]]:
+    # "default=0.5/10,trusted=2/40,staff=0" -> {tier: (rate, burst)}; a rate of 0 means unlimited.
+    # runs at import, so malformed entries are skipped here and reported by validate_config()
+    tiers = {}
+    for pair in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, limit = pair.partition("=")
+        rate, _, burst = limit.partition("/")
+        try:
+            tiers[name.strip()] = (float(rate), float(burst or max(1.0, float(rate))))
+        except ValueError:
+            continue
+    tiers.setdefault(DEFAULT_TIER, (0.0, 0.0))
+    return tiers
+
+
+def parse_user_tiers(spec: str) -> Dict[str, str]:
+    users = {}
+    for pair in filter(None, (part.strip() for part in spec.split(","))):
+        user_id, _, tier = pair.partition("=")
+        users[user_id.strip()] = tier.strip()
+    return users
+
+
+class InboundThrottle:
+    """Per-user and per-chat token buckets for webhook messages.
+
+    Users get the limits of their tier, chats share one limit so a group cannot be used
+    to get around it. Limiter state lives in LRU caches, so memory stays bounded however
+    many users write to the bot.
+    """
+
+    def __init__(self, tiers: Dict[str, Tuple[float, float]], user_tiers: Dict[str, str],
+                 chat_rate: float, chat_burst: float, maxsize: int = 100000, enabled: bool = True):
+        self.enabled = enabled
+        self.user_tiers = user_tiers
+        self.tier_names = set(tiers)
+        self.users = {
+            tier: KeyedRateLimiter(rate, burst, maxsize) for tier, (rate, burst) in tiers.items() if rate > 0
+        }
+        self.chats = KeyedRateLimiter(chat_rate, chat_burst, maxsize) if chat_rate > 0 else None
+        # keys that were already told to slow down, so a flood gets one canned reply and not one per message
+        self._notified = LRUCache(maxsize)
+
+    def tier(self, user_id) -> str:
+        tier = self.user_tiers.get(str(user_id), DEFAULT_TIER)
+        return tier if tier in self.tier_names else DEFAULT_TIER
+
+    def check(self, bot_id: str, user_id, chat_id) -> Optional[str]:
+        """Returns the scope that is over its limit ("user" or "chat"), or None."""
+        if not self.enabled:
+            return None
+
+        tier = self.tier(user_id)
+        limiter = self.users.get(tier)
+        user = limiter.bucket((bot_id, user_id)) if user_id is not None and limiter is not None else None
+        # presses on inline-mode messages have no chat; sharing one None bucket would throttle everyone
+        chat = self.chats.bucket((bot_id, chat_id)) if self.chats is not None and chat_id is not None else None
+
+        # both are checked before either is charged, so a message refused by one limit costs nothing
+        if user is not None and not user.available():
+            metrics.inc("anygram_inbound_throttled_total", scope=USER, tier=tier)
+            return USER
+        if chat is not None and not chat.available():
+            metrics.inc("anygram_inbound_throttled_total", scope=CHAT, tier=tier)
+            return CHAT
+
+        for bucket in (user, chat):
+            if bucket is not None:
+                bucket.try_acquire()
+        self._notified.pop((bot_id, chat_id))
+        return None
+
+    def should_notify(self, bot_id: str, chat_id) -> bool:
+        if (bot_id, chat_id) in self._notified:
+            return False
+        self._notified.put((bot_id, chat_id), True)
+        return True
+
+    def _limiters(self) -> list:
+        return [*self.users.values()] + ([self.chats] if self.chats is not None else [])
+
+    def shrink(self, fraction: float) -> int:
+        return sum(limiter.shrink(fraction) for limiter in self._limiters()) + self._notified.shrink(fraction)
+
+    def memory_sources(self) -> list:
+        return [*self._limiters(), self._notified]
+
+    def stats(self) -> dict:
+        return {
+            "users_tracked": sum(len(limiter) for limiter in self.users.values()),
+            "chats_tracked": len(self.chats) if self.chats is not None else 0,
+        }
+
+
+throttle = InboundThrottle(
+    parse_tiers(INBOUND_LIMIT_TIERS),
+    parse_user_tiers(INBOUND_USER_TIERS),
+    INBOUND_CHAT_RATE,
+    INBOUND_CHAT_BURST,
+    maxsize=INBOUND_LIMIT_CACHE_SIZE,
+    enabled=INBOUND_LIMIT_ENABLED,
+)
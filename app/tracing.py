@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from app.logger import log
+from app.metrics import metrics
+from app.config import (
+    TRACING_ENABLED, TRACE_SAMPLE_RATE, TRACE_TAIL_SLOW, TRACE_TAIL_ERRORS, TRACE_EXPORTER, TRACE_FILE,
+    TRACE_OTLP_URL, TRACE_MAX_BUFFER,
+)
+
+SERVICE_NAME = "anygram"
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    match = TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+class Trace:
+    __slots__ = ("trace_id", "sampled", "recording", "spans", "error")
+
+    def __init__(self, trace_id: str, sampled: bool, recording: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.recording = recording
+        self.spans: List["Span"] = []
+        self.error = False
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start", "end", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, kind: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start = time.time_ns()
+        self.end = 0
+        if trace.recording:
+            trace.spans.append(self)
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def set_status_code(self, status_code: int) -> None:
+        self.attributes["http.status_code"] = status_code
+        threshold = 500 if self.kind == "server" else 400
+        if status_code >= threshold:
+            self.fail(f"HTTP {status_code}")
+
+    def fail(self, reason: str) -> None:
+        self.error = reason
+        self.trace.error = True
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+    @property
+    def duration(self) -> float:
+        return ((self.end or time.time_ns()) - self.start) / 1e9
+
+
+class NoopSpan:
+    """Returned whenever tracing is off, so instrumented code pays for an attribute lookup only."""
+
+    def set(self, key: str, value) -> None:
+        pass
+
+    def set_status_code(self, status_code: int) -> None:
+        pass
+
+    def fail(self, reason: str) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar("anygram_span", default=None)
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def span_to_otlp(span: Span) -> dict:
+    data = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": SPAN_KINDS[span.kind],
+        "startTimeUnixNano": str(span.start),
+        "endTimeUnixNano": str(span.end),
+        "attributes": [_attribute(key, value) for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    return data
+
+
+class FileExporter:
+    """Appends spans to a file as NDJSON, one OTLP-shaped span per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, lines: str) -> None:
+        with open(self.path, "a") as f:
+            f.write(lines)
+
+    async def export(self, spans: List[Span]) -> None:
+        lines = "".join(json.dumps(span_to_otlp(span)) + "\n" for span in spans)
+        await asyncio.to_thread(self._write, lines)
+
+
+class OTLPExporter:
+    """Posts spans to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def export(self, spans: List[Span]) -> None:
+        from app.http_client import get_http_client
+
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": [span_to_otlp(span) for span in spans]}],
+            }]
+        }
+        resp = await get_http_client().post(self.url, json=body)
+        resp.raise_for_status()
+
+
+class Tracer:
+    """Spans for inbound requests and upstream calls, with head and tail sampling.
+
+    Head sampling decides when a trace starts: an incoming sampled traceparent is honoured,
+    otherwise `sample_rate` of traces are kept. Traces that were not head-sampled are still
+    recorded when tail sampling is on, and kept at the end if they were slower than
+    `tail_slow` seconds or failed. Finished spans are buffered and exported by flush().
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 0.01, tail_slow: float = 0.0,
+                 tail_errors: bool = False, exporter=None, max_buffer: int = 10000):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.tail_slow = tail_slow
+        self.tail_errors = tail_errors
+        self.exporter = exporter
+        self.max_buffer = max_buffer
+        self._buffer: List[Span] = []
+        self._exporter_task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    @property
+    def tail_sampling(self) -> bool:
+        return self.tail_slow > 0 or self.tail_errors
+
+    @contextmanager
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes):
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        parent = parse_traceparent(traceparent)
+        if parent:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = os.urandom(16).hex(), None, random.random() < self.sample_rate
+
+        trace = Trace(trace_id, sampled, recording=sampled or self.tail_sampling)
+        span = Span(trace, name, "server", parent_id, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(type(e).__name__)
+            raise
+        finally:
+            span.end = time.time_ns()
+            _current.reset(token)
+            self._finish(trace, span)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "client", **attributes):
+        parent = _current.get()
+        if parent is None:
+            yield NOOP_SPAN
+            return
+
+        span = Span(parent.trace, name, kind, parent.span_id, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(type(e).__name__)
+            raise
+        finally:
+            span.end = time.time_ns()
+            _current.reset(token)
+
+    def inject(self, headers: dict) -> dict:
+        span = _current.get()
+        if span is not None:
+            headers["traceparent"] = span.traceparent()
+        return headers
+
+    def _finish(self, trace: Trace, root: Span) -> None:
+        if not trace.recording:
+            return
+        if trace.sampled:
+            reason = "head"
+        elif self.tail_errors and trace.error:
+            reason = "error"
+        elif self.tail_slow > 0 and root.duration >= self.tail_slow:
+            reason = "slow"
+        else:
+            return
+
+        if len(self._buffer) + len(trace.spans) > self.max_buffer:
+            metrics.inc("anygram_trace_spans_dropped_total", len(trace.spans))
+            return
+        self._buffer.extend(trace.spans)
+        metrics.inc("anygram_traces_sampled_total", reason=reason)
+
+    def memory_sources(self) -> list:
+        return [self._buffer]
+
+    async def flush(self) -> int:
+        if not self._buffer or self.exporter is None:
+            return 0
+        spans, self._buffer = self._buffer, []
+        try:
+            await self.exporter.export(spans)
+        except asyncio.CancelledError:
+            # back in front of the buffer for the next flush; a collector may see some of them twice
+            self._buffer[:0] = spans
+            raise
+        except Exception as e:
+            log.error(f"trace export failed, {len(spans)} spans dropped: {e!r}")
+            metrics.inc("anygram_trace_spans_dropped_total", len(spans))
+            return 0
+        return len(spans)
+
+    async def run_exporter(self, interval: float) -> None:
+        self._stopping = self._stopping or asyncio.Event()
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start_exporter(self, interval: float) -> None:
+        self._stopping = asyncio.Event()
+        self._exporter_task = asyncio.create_task(self.run_exporter(interval))
+
+    async def close(self) -> None:
+        # the exporter is asked to stop rather than cancelled, so an export it has started finishes;
+        # it flushes once more on its way out, and this flush picks up anything finished since
+        if self._exporter_task is not None:
+            self._stopping.set()
+            await self._exporter_task
+            self._exporter_task = None
+        await self.flush()
+
+
+def create_exporter(kind: str = TRACE_EXPORTER):
+    if kind == "otlp":
+        return OTLPExporter(TRACE_OTLP_URL)
+    return FileExporter(TRACE_FILE)
+
+
+tracer = Tracer(
+    enabled=TRACING_ENABLED,
+    sample_rate=TRACE_SAMPLE_RATE,
+    tail_slow=TRACE_TAIL_SLOW,
+    tail_errors=TRACE_TAIL_ERRORS,
+    exporter=create_exporter() if TRACING_ENABLED else None,
+    max_buffer=TRACE_MAX_BUFFER,
+)
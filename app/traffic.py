@@ -0,0 +1,142 @@
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from app.metrics import metrics
+from app.config import (
+    GATEWAY_PERCENT, GATEWAY_ENABLED, ROUTING_MAX_IN_FLIGHT, ROUTING_LATENCY_THRESHOLD, ROUTING_ERROR_THRESHOLD,
+    ROUTING_COOLDOWN, ROUTING_MIN_SAMPLES,
+)
+
+GATEWAY = "gateway"
+LLM = "llm"
+PATHS = (GATEWAY, LLM)
+
+
+class PathStats:
+    def __init__(self):
+        self.in_flight = 0
+        self.samples = 0
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.tripped_until = 0.0
+
+    def reset(self) -> None:
+        self.samples = 0
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.tripped_until = 0.0
+
+
+class TrafficSplitter:
+    """Splits webhook traffic between the gateway and the direct LLM path.
+
+    A path whose in-flight count reaches max_in_flight overflows to the other one.
+    A path whose smoothed latency or error rate crosses its threshold is taken out
+    for `cooldown` seconds and then probed again with fresh stats. The gateway only
+    takes overflow and failover traffic when it is in use: a share above 0% or
+    GATEWAY_ENABLED.
+    """
+
+    def __init__(self, gateway_percent: float, max_in_flight: int = 100, latency_threshold: float = 10.0,
+                 error_threshold: float = 0.5, cooldown: float = 30.0, min_samples: int = 10, alpha: float = 0.2,
+                 gateway_enabled: bool = False):
+        self.gateway_percent = gateway_percent
+        self.gateway_enabled = gateway_enabled
+        self.max_in_flight = max_in_flight
+        self.latency_threshold = latency_threshold
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self.paths = {path: PathStats() for path in PATHS}
+
+    @staticmethod
+    def other(path: str) -> str:
+        return LLM if path == GATEWAY else GATEWAY
+
+    def set_split(self, gateway_percent: float) -> None:
+        self.gateway_percent = max(0.0, min(100.0, gateway_percent))
+
+    def reset(self) -> None:
+        for stats in self.paths.values():
+            stats.reset()
+
+    def enabled(self, path: str) -> bool:
+        # the direct LLM path is always configured; an unused gateway may not even exist
+        return path == LLM or self.gateway_enabled or self.gateway_percent > 0
+
+    def available(self, path: str) -> bool:
+        if not self.enabled(path):
+            return False
+        stats = self.paths[path]
+        return stats.in_flight < self.max_in_flight and time.monotonic() >= stats.tripped_until
+
+    def choose(self) -> str:
+        primary = GATEWAY if random.random() * 100 < self.gateway_percent else LLM
+        if self.available(primary):
+            return primary
+
+        secondary = self.other(primary)
+        if self.available(secondary):
+            metrics.inc("anygram_routing_overflow_total", source=primary, target=secondary)
+            return secondary
+        return primary
+
+    def fallback(self, path: str) -> Optional[str]:
+        secondary = self.other(path)
+        return secondary if self.available(secondary) else None
+
+    @asynccontextmanager
+    async def track(self, path: str):
+        stats = self.paths[path]
+        stats.in_flight += 1
+        start = time.monotonic()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            stats.in_flight -= 1
+            self._record(path, time.monotonic() - start, failed)
+
+    def _record(self, path: str, latency: float, failed: bool) -> None:
+        stats = self.paths[path]
+        stats.samples += 1
+        stats.latency += self.alpha * (latency - stats.latency)
+        stats.error_rate += self.alpha * ((1.0 if failed else 0.0) - stats.error_rate)
+        metrics.inc("anygram_routing_requests_total", path=path, outcome="error" if failed else "ok")
+
+        if stats.samples < self.min_samples:
+            return
+        if stats.error_rate > self.error_threshold or stats.latency > self.latency_threshold:
+            stats.reset()
+            stats.tripped_until = time.monotonic() + self.cooldown
+            metrics.inc("anygram_routing_tripped_total", path=path)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "gateway_percent": self.gateway_percent,
+            "paths": {
+                path: {
+                    "in_flight": stats.in_flight,
+                    "latency": round(stats.latency, 4),
+                    "error_rate": round(stats.error_rate, 4),
+                    "available": self.available(path),
+                    "tripped_for": max(0.0, round(stats.tripped_until - now, 2)),
+                }
+                for path, stats in self.paths.items()
+            },
+        }
+
+
+traffic = TrafficSplitter(
+    gateway_percent=GATEWAY_PERCENT,
+    gateway_enabled=GATEWAY_ENABLED,
+    max_in_flight=ROUTING_MAX_IN_FLIGHT,
+    latency_threshold=ROUTING_LATENCY_THRESHOLD,
+    error_threshold=ROUTING_ERROR_THRESHOLD,
+    cooldown=ROUTING_COOLDOWN,
+    min_samples=ROUTING_MIN_SAMPLES,
+)
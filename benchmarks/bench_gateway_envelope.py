@@ -0,0 +1,48 @@
+"""Compare bytes on the wire and encode CPU time per message for each gateway format.
+
+Usage:
+    python benchmarks/bench_gateway_envelope.py [--iterations 100000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TELEGRAM_TOKEN", "bench")
+
+from app.services import encode_gateway_content  # noqa: E402
+
+PROMPTS = {
+    "short": "what are your opening hours?",
+    "medium": "Can you summarise the following conversation for me? " * 10,
+    "long (unicode)": "¿Podés resumir esta conversación? 🤖 " * 200,
+}
+
+
+def formats():
+    available = ["json", "raw"]
+    try:
+        import msgpack  # noqa: F401
+        available.append("msgpack")
+    except ImportError:
+        pass
+    return available
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'prompt':<16} {'format':<8} {'bytes':>8} {'vs json':>8} {'us/msg':>8}")
+    for name, prompt in PROMPTS.items():
+        baseline = len(encode_gateway_content(prompt, "json")[1])
+        for fmt in formats():
+            size = len(encode_gateway_content(prompt, fmt)[1])
+            seconds = timeit.timeit(lambda: encode_gateway_content(prompt, fmt), number=args.iterations)
+            print(f"{name:<16} {fmt:<8} {size:>8} {size / baseline:>7.0%} {seconds / args.iterations * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
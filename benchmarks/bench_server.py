@@ -0,0 +1,98 @@
+"""Compare throughput of the single-process uvicorn CMD against app.server.
+
+Usage:
+    python benchmarks/bench_server.py [--duration 10] [--concurrency 64] [--workers 4]
+
+Both servers are started as subprocesses with a dummy TELEGRAM_TOKEN and
+hammered on /health, so the numbers measure server overhead only.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start(cmd, port, extra_env):
+    env = {**os.environ, "TELEGRAM_TOKEN": "bench", "PORT": str(port), "HOST": "127.0.0.1",
+           "LOG_LEVEL": "WARNING", "RELOAD": "false", "MAX_IN_FLIGHT": "0", **extra_env}
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(url, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(trust_env=False) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not become ready")
+
+
+async def load(url, duration, concurrency):
+    done = 0
+    errors = 0
+    stop = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, trust_env=False) as client:
+        async def worker():
+            nonlocal done, errors
+            while time.monotonic() < stop:
+                try:
+                    r = await client.get(url)
+                    if r.status_code == 200:
+                        done += 1
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done / duration, errors
+
+
+def bench(name, cmd, port, extra_env, args):
+    proc = start(cmd, port, extra_env)
+    url = f"http://127.0.0.1:{port}/health"
+    try:
+        asyncio.run(wait_ready(url))
+        rps, errors = asyncio.run(load(url, args.duration, args.concurrency))
+    finally:
+        proc.terminate()
+        proc.wait()
+    print(f"{name:<28} {rps:>10.0f} req/s   errors={errors}")
+    return rps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    baseline = bench(
+        "single process (Dockerfile)",
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", "8101",
+         "--loop", "asyncio", "--http", "h11"],
+        8101, {}, args,
+    )
+    tuned = bench(
+        f"app.server ({args.workers} workers)",
+        [sys.executable, "-m", "app.server"],
+        8102, {"WORKERS": str(args.workers)}, args,
+    )
+    print(f"speedup: {tuned / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Track cold-start cost: import time of app.main and time to first request / readiness.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--import-budget 1.0] [--first-request-budget 3.0]
+
+Exits with status 1 when the median of any measurement exceeds its budget, so it
+can run in CI as a regression check.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENV = {**os.environ, "TELEGRAM_TOKEN": "bench", "LOG_LEVEL": "WARNING", "SKIP_DOTENV": "true",
+       "WARMUP_ENABLED": "false"}
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def measure_import() -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=ENV,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url: str, deadline: float) -> float:
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    while time.monotonic() < deadline:
+        try:
+            with opener.open(url, timeout=0.5) as resp:
+                if resp.status == 200:
+                    return time.monotonic()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} did not answer 200 in time")
+
+
+def measure_first_request(port: int):
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=ENV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        first = wait_for(f"http://127.0.0.1:{port}/health", start + 30)
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", start + 30)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return first - start, ready - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8111)
+    parser.add_argument("--import-budget", type=float, default=1.0)
+    parser.add_argument("--first-request-budget", type=float, default=3.0)
+    parser.add_argument("--ready-budget", type=float, default=3.5)
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    starts = [measure_first_request(args.port) for _ in range(args.runs)]
+
+    results = {
+        "import app.main": (statistics.median(imports), args.import_budget),
+        "time to first request": (statistics.median(s[0] for s in starts), args.first_request_budget),
+        "time to ready": (statistics.median(s[1] for s in starts), args.ready_budget),
+    }
+
+    failed = False
+    for name, (value, budget) in results.items():
+        status = "ok" if value <= budget else "OVER BUDGET"
+        failed = failed or value > budget
+        print(f"{name:<24} {value:>7.3f}s  budget {budget:.3f}s  {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Replay a traffic capture (CAPTURE_ENABLED=true) against a running instance and report latencies.
+
+Usage:
+    python benchmarks/replay_traffic.py captures/ [--target http://localhost:8000] [--speed 1|10|max]
+                                                  [--concurrency 100] [--secret-token TOKEN] [--json]
+
+Requests keep their recorded spacing divided by --speed; `max` sends them as fast as
+the target answers. Requests for the same chat always go one at a time, in order.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TELEGRAM_TOKEN", "bench")
+
+from app.capture import read_capture, replay  # noqa: E402
+
+
+def parse_speed(value: str) -> float:
+    if value == "max":
+        return 0.0
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+async def run(args) -> dict:
+    entries = list(read_capture(args.capture))
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret_token} if args.secret_token else {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=args.timeout, trust_env=False) as client:
+        return await replay(entries, client, speed=args.speed, concurrency=args.concurrency, headers=headers)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("capture", nargs="+", help="capture files or directories")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, 10, ... or max")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--secret-token", help="webhook secret token of the target")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json or not report.get("latency"):
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['requests']} requests from {report['chats']} chats in {report['duration']}s "
+          f"({report['rate']}/s), fell behind schedule by up to {report['lag']}s")
+    print(f"statuses: {report['statuses']}")
+    print(f"{'endpoint':<10} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for kind, stats in report["latency"].items():
+        print(f"{kind:<10} {stats['count']:>7} {stats['p50_ms']:>9} {stats['p90_ms']:>9} "
+              f"{stats['p99_ms']:>9} {stats['max_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import pytest
+from unittest.mock import patch
+
+from app.bots import BotRegistry
+
+
+@pytest.fixture
+def default_bot():
+    """A registry with a default bot, which the app otherwise only has when TELEGRAM_TOKEN is set"""
+    registry = BotRegistry(default_token="test-token")
+    with patch('app.api.registry', registry), patch('app.config.TELEGRAM_TOKEN', "test-token"):
+        yield registry
@@ -0,0 +1,136 @@
+import pytest
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.admission import AdmissionController
+from app.main import app
+
+
+class TestAdmissionController:
+    """Test suite for the AdmissionController"""
+
+    @pytest.mark.asyncio
+    async def test_admits_up_to_limit(self):
+        """Requests under the limit are admitted immediately"""
+        controller = AdmissionController(limit=2, max_queue=0)
+
+        assert await controller.acquire() is True
+        assert await controller.acquire() is True
+        assert controller.in_flight == 2
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_is_full(self):
+        """Requests over the limit are rejected when there is no queue room"""
+        controller = AdmissionController(limit=1, max_queue=0)
+
+        assert await controller.acquire() is True
+        assert await controller.acquire() is False
+        assert controller.rejected == 1
+
+    @pytest.mark.asyncio
+    async def test_queued_request_is_admitted_on_release(self):
+        """A waiting request takes the slot freed by release"""
+        controller = AdmissionController(limit=1, max_queue=1, queue_timeout=1.0)
+        await controller.acquire()
+
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+
+        controller.release(0.01)
+
+        assert await waiter is True
+        assert controller.in_flight == 1
+        assert controller.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_queued_request_times_out(self):
+        """A waiting request gives up after queue_timeout"""
+        controller = AdmissionController(limit=1, max_queue=1, queue_timeout=0.01)
+        await controller.acquire()
+
+        assert await controller.acquire() is False
+        assert controller.timed_out == 1
+        assert controller.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_adaptive_limit_backs_off_on_slow_requests(self):
+        """The adaptive limit shrinks when latency exceeds the target"""
+        controller = AdmissionController(limit=10, adaptive=True, min_limit=2, latency_target=0.5)
+        await controller.acquire()
+
+        controller.release(1.0)
+
+        assert controller.limit == 9
+
+    @pytest.mark.asyncio
+    async def test_burst_of_slow_requests_backs_off_once(self):
+        """Slow requests that were all in flight before the cut only shrink the limit once"""
+        controller = AdmissionController(limit=10, adaptive=True, min_limit=1, latency_target=0.5)
+        for _ in range(5):
+            await controller.acquire()
+
+        for _ in range(5):
+            controller.release(1.0)
+
+        assert controller.limit == 9
+
+    @pytest.mark.asyncio
+    async def test_slow_request_after_the_cut_backs_off_again(self):
+        """A request started after the last decrease can shrink the limit again"""
+        controller = AdmissionController(limit=10, adaptive=True, min_limit=1, latency_target=0.5)
+        await controller.acquire()
+        await controller.acquire()
+        controller.release(1.0)
+
+        with patch('app.admission.time.monotonic', return_value=time.monotonic() + 2.0):
+            controller.release(1.0)
+
+        assert controller.limit == 8
+
+    @pytest.mark.asyncio
+    async def test_adaptive_limit_grows_when_saturated(self):
+        """The adaptive limit grows while it is being used and latency is healthy"""
+        controller = AdmissionController(limit=2, adaptive=True, max_limit=3, latency_target=0.5)
+        await controller.acquire()
+        await controller.acquire()
+
+        controller.release(0.01)
+        controller.release(0.01)
+
+        assert controller.limit == 3
+
+    @pytest.mark.asyncio
+    async def test_adaptive_limit_respects_min_limit(self):
+        """The adaptive limit never drops below min_limit"""
+        controller = AdmissionController(limit=2, adaptive=True, min_limit=2)
+        await controller.acquire()
+
+        controller.release(0.0, dropped=True)
+
+        assert controller.limit == 2
+
+
+class TestAdmissionMiddleware:
+    """Test suite for the admission_control middleware"""
+
+    def test_rejects_with_retry_after(self):
+        """Requests are shed with Retry-After when the controller is saturated"""
+        client = TestClient(app)
+
+        with patch('app.main.admission.acquire', return_value=False):
+            response = client.post("/telegram/webhook", json={})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+    def test_health_is_exempt(self):
+        """The health check bypasses admission control"""
+        client = TestClient(app)
+
+        with patch('app.main.admission.acquire', return_value=False):
+            response = client.get("/health")
+
+        assert response.status_code == 200
@@ -0,0 +1,162 @@
+import pytest
+import asyncio
+import json
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+from app.bots import BotRegistry, DEFAULT_BOT_ID
+from app.main import app
+
+client = TestClient(app)
+
+
+class TestBatchSend:
+    """Test suite for the /telegram/send/batch endpoint"""
+
+    @pytest.fixture
+    def bots(self, tmp_path):
+        path = tmp_path / "bots.json"
+        with open(path, "w") as f:
+            json.dump({"bots": [{"id": "support", "token": "t1"}]}, f)
+        registry = BotRegistry(str(path), default_token="default-token")
+        with patch('app.api.registry', registry):
+            yield registry
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_json_array_returns_per_item_results(self, mock_send_telegram, bots):
+        """Each item is routed by its routing_id and gets a result in request order"""
+        mock_send_telegram.return_value = {"ok": True}
+        items = [
+            {"routing_id": "telegram:42", "text": "one"},
+            {"routing_id": "telegram:support:7", "text": "two"},
+            {"chat_id": 9, "text": "three"},
+        ]
+
+        response = client.post("/telegram/send/batch", json=items)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ok"] is True
+        assert data["sent"] == 3
+        assert [result["index"] for result in data["results"]] == [0, 1, 2]
+
+        sent = {call.args[0].text: call for call in mock_send_telegram.call_args_list}
+        assert sent["one"].args[0].chat_id == "42"
+        assert sent["one"].kwargs["bot"].id == DEFAULT_BOT_ID
+        assert sent["two"].kwargs["bot"].id == "support"
+        assert sent["three"].args[0].chat_id == 9
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_ndjson_body_is_accepted(self, mock_send_telegram, bots):
+        """Items can be streamed as newline-delimited JSON"""
+        mock_send_telegram.return_value = {"ok": True}
+        body = "\n".join(json.dumps({"routing_id": f"telegram:{i}", "text": f"m{i}"}) for i in range(5)) + "\n"
+
+        response = client.post("/telegram/send/batch", content=body,
+                               headers={"Content-Type": "application/x-ndjson"})
+
+        assert response.status_code == 200
+        assert response.json()["sent"] == 5
+        assert mock_send_telegram.await_count == 5
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_bad_items_fail_without_failing_the_batch(self, mock_send_telegram, bots):
+        """Invalid or failing items are reported individually"""
+        mock_send_telegram.side_effect = [{"ok": True}, Exception("telegram down")]
+        items = [
+            {"routing_id": "telegram:1", "text": "ok"},
+            {"routing_id": "bad", "text": "x"},
+            {"routing_id": "telegram:missing:1", "text": "x"},
+            {"text": "no chat"},
+            {"routing_id": "telegram:2", "text": "boom"},
+        ]
+
+        response = client.post("/telegram/send/batch", json=items)
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["ok"] is False
+        assert (data["sent"], data["failed"]) == (1, 4)
+        assert [result["status"] for result in data["results"]] == [200, 400, 404, 400, 500]
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_items_without_a_bot_fail_individually(self, mock_send_telegram, tmp_path):
+        """Without a default bot, items that do not name one get a 404 result instead of a 500"""
+        mock_send_telegram.return_value = {"ok": True}
+        path = tmp_path / "bots.json"
+        path.write_text(json.dumps({"bots": [{"id": "support", "token": "t1"}]}))
+        items = [{"chat_id": 1, "text": "a"}, {"routing_id": "telegram:support:7", "text": "b"}]
+
+        with patch('app.api.registry', BotRegistry(str(path))):
+            response = client.post("/telegram/send/batch", json=items)
+
+        assert response.status_code == 200
+        assert [result["status"] for result in response.json()["results"]] == [404, 200]
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_telegram_rejections_count_as_failed(self, mock_send_telegram, bots):
+        """An ok:false answer from Telegram is a failed item with Telegram's error"""
+        mock_send_telegram.side_effect = [
+            {"ok": True},
+            {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"},
+        ]
+        items = [{"chat_id": 1, "text": "a"}, {"chat_id": 2, "text": "b"}]
+
+        data = client.post("/telegram/send/batch", json=items).json()
+
+        assert (data["sent"], data["failed"]) == (1, 1)
+        assert data["results"][1]["status"] == 403
+        assert data["results"][1]["error"] == "Forbidden: bot was blocked by the user"
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_same_chat_is_sent_in_order(self, mock_send_telegram, bots):
+        """Replies to one chat keep their order while other chats are sent concurrently"""
+        order = []
+
+        async def send(msg, request, bot=None):
+            await asyncio.sleep(0.01 if msg.text == "first" else 0)
+            order.append(msg.text)
+            return {"ok": True}
+
+        mock_send_telegram.side_effect = send
+        items = [
+            {"routing_id": "telegram:1", "text": "first"},
+            {"routing_id": "telegram:1", "text": "second"},
+        ]
+
+        client.post("/telegram/send/batch", json=items)
+
+        assert order == ["first", "second"]
+
+    def test_invalid_payload_is_rejected(self, bots):
+        """A body that is neither an array nor NDJSON returns 400"""
+        response = client.post("/telegram/send/batch", content="not json")
+
+        assert response.status_code == 400
+
+    @patch('app.api.BATCH_MAX_BODY_BYTES', 100)
+    def test_oversized_body_is_rejected(self, bots):
+        """Bodies over BATCH_MAX_BODY_BYTES are rejected while streaming"""
+        body = "\n".join(json.dumps({"chat_id": i, "text": "x" * 20}) for i in range(10))
+
+        response = client.post("/telegram/send/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+        assert response.status_code == 413
+
+    @patch('app.api.BATCH_MAX_ITEMS', 2)
+    def test_too_many_ndjson_lines_are_rejected(self, bots):
+        """NDJSON batches are cut off at BATCH_MAX_ITEMS"""
+        body = "\n".join(json.dumps({"chat_id": i, "text": "x"}) for i in range(3))
+
+        response = client.post("/telegram/send/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+        assert response.status_code == 413
+
+    @patch('app.api.BATCH_MAX_ITEMS', 2)
+    def test_oversized_batch_is_rejected(self, bots):
+        """Batches over BATCH_MAX_ITEMS are rejected before anything is sent"""
+        items = [{"chat_id": i, "text": "x"} for i in range(3)]
+
+        response = client.post("/telegram/send/batch", json=items)
+
+        assert response.status_code == 413
@@ -0,0 +1,99 @@
+import pytest
+import asyncio
+import httpx
+import json
+from unittest.mock import MagicMock, patch
+
+from app.batching import PromptBatcher
+from app.services import ask_llm
+
+
+def batch_server(requests):
+    def handler(request):
+        prompts = json.loads(request.content)["prompts"]
+        requests.append(prompts)
+        return httpx.Response(200, json={"responses": [f"re: {prompt}" for prompt in prompts]})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestPromptBatcher:
+    """Test suite for the adaptive prompt batcher"""
+
+    @pytest.mark.asyncio
+    async def test_idle_traffic_is_sent_without_waiting(self):
+        """A lone prompt goes out at once as a batch of one"""
+        requests = []
+        batcher = PromptBatcher("http://llm/batch", max_batch=8, max_wait=0.05)
+
+        with patch('app.batching.get_http_client', return_value=batch_server(requests)):
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            assert await batcher.ask("hello", "r1") == "re: hello"
+
+        assert loop.time() - start < 0.05
+        assert requests == [["hello"]]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_prompts_share_a_request(self):
+        """Under load, prompts arriving together are answered from one batch, each with its own result"""
+        requests = []
+        batcher = PromptBatcher("http://llm/batch", max_batch=8, max_wait=0.05)
+        batcher.gap = 0.001
+
+        with patch('app.batching.get_http_client', return_value=batch_server(requests)):
+            answers = await asyncio.gather(*(batcher.ask(f"p{i}", f"r{i}") for i in range(5)))
+
+        assert answers == [f"re: p{i}" for i in range(5)]
+        assert requests == [[f"p{i}" for i in range(5)]]
+
+    @pytest.mark.asyncio
+    async def test_full_batches_are_sent_immediately(self):
+        """A batch is sent as soon as max_batch prompts are queued"""
+        requests = []
+        batcher = PromptBatcher("http://llm/batch", max_batch=2, max_wait=1.0)
+        batcher.gap = 0.001
+
+        with patch('app.batching.get_http_client', return_value=batch_server(requests)):
+            await asyncio.wait_for(asyncio.gather(*(batcher.ask(f"p{i}", "r") for i in range(4))), 0.5)
+
+        assert requests == [["p0", "p1"], ["p2", "p3"]]
+
+    @pytest.mark.asyncio
+    async def test_window_follows_arrival_rate(self):
+        """The wait shrinks to zero when arrivals are sparse and grows when they are dense"""
+        batcher = PromptBatcher("http://llm/batch", max_batch=10, max_wait=0.01)
+
+        batcher.gap = 0.02
+        assert batcher.window() == 0.0
+        batcher.gap = 0.0005
+        assert batcher.window() == pytest.approx(0.005)
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_fails_every_waiter(self):
+        """An upstream error is raised to each prompt in the batch"""
+        batcher = PromptBatcher("http://llm/batch", max_batch=4, max_wait=0.05)
+        batcher.gap = 0.001
+        http = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+
+        with patch('app.batching.get_http_client', return_value=http):
+            results = await asyncio.gather(*(batcher.ask("p", "r") for _ in range(2)), return_exceptions=True)
+
+        assert all(isinstance(result, httpx.HTTPStatusError) for result in results)
+
+
+class TestBatchedAskLlm:
+    """Test suite for ask_llm with batching enabled"""
+
+    @pytest.mark.asyncio
+    async def test_ask_llm_goes_through_the_batcher(self):
+        """With LLM_BATCH_ENABLED the default LLM is asked through the batch endpoint"""
+        requests = []
+        request = MagicMock()
+        request.state.logger.extra = {"request_id": "req-1"}
+        batcher = PromptBatcher("http://llm/batch")
+
+        with patch('app.services.LLM_BATCH_ENABLED', True), patch('app.services.batcher', batcher), \
+             patch('app.batching.get_http_client', return_value=batch_server(requests)):
+            assert await ask_llm("hi", request) == "re: hi"
+
+        assert requests == [["hi"]]
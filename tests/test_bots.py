@@ -0,0 +1,152 @@
+import pytest
+import json
+import os
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+from app.bots import BotRegistry, DEFAULT_BOT_ID
+from app.main import app
+from app import config
+
+client = TestClient(app)
+
+
+def write_bots(path, bots):
+    with open(path, "w") as f:
+        json.dump({"bots": bots}, f)
+
+
+class TestBotRegistry:
+    """Test suite for the BotRegistry"""
+
+    def test_default_bot_from_token(self):
+        """TELEGRAM_TOKEN becomes the default bot"""
+        registry = BotRegistry(default_token="default-token")
+
+        assert registry.default().token == "default-token"
+        assert registry.default().id == DEFAULT_BOT_ID
+
+    def test_loads_bots_from_file(self, tmp_path):
+        """Bots are loaded from the registry file alongside the default bot"""
+        path = tmp_path / "bots.json"
+        write_bots(path, [{"id": "support", "token": "t1", "secret_token": "s1"}])
+
+        registry = BotRegistry(str(path), default_token="default-token")
+
+        assert len(registry) == 2
+        assert registry.get("support").token == "t1"
+        assert registry.by_secret("s1").id == "support"
+
+    def test_hot_reload_on_file_change(self, tmp_path):
+        """Changes to the registry file are picked up without a restart"""
+        path = tmp_path / "bots.json"
+        write_bots(path, [{"id": "support", "token": "t1"}])
+        registry = BotRegistry(str(path), reload_interval=0)
+
+        write_bots(path, [{"id": "support", "token": "t2"}, {"id": "sales", "token": "t3"}])
+        os.utime(path, (0, os.path.getmtime(path) + 10))
+
+        assert registry.get("support").token == "t2"
+        assert registry.get("sales").token == "t3"
+
+    def test_invalid_file_keeps_last_good_registry(self, tmp_path):
+        """A broken registry file does not drop the bots already loaded"""
+        path = tmp_path / "bots.json"
+        write_bots(path, [{"id": "support", "token": "t1"}])
+        registry = BotRegistry(str(path), reload_interval=0)
+
+        path.write_text("{not json")
+        os.utime(path, (0, os.path.getmtime(path) + 10))
+
+        assert registry.get("support").token == "t1"
+
+    def test_zero_rate_limit_is_rejected(self, tmp_path):
+        """A bot with a rate of 0 is refused on load rather than failing its sends later"""
+        path = tmp_path / "bots.json"
+        write_bots(path, [{"id": "support", "token": "t1", "rate_limit": 0}])
+
+        registry = BotRegistry(str(path))
+
+        assert registry.get("support") is None
+
+    def test_zero_default_rate_fails_validation(self):
+        """BOT_RATE_LIMIT=0 is reported at startup"""
+        with patch('app.config.TELEGRAM_TOKEN', "token"), patch('app.config.BOT_RATE_LIMIT', 0.0):
+            with pytest.raises(ValueError, match="BOT_RATE_LIMIT"):
+                config.validate_config()
+
+    def test_limiter_is_per_bot_and_survives_reload(self, tmp_path):
+        """Each bot gets its own limiter, kept across reloads"""
+        path = tmp_path / "bots.json"
+        write_bots(path, [{"id": "a", "token": "t1"}, {"id": "b", "token": "t2", "rate_limit": 5}])
+        registry = BotRegistry(str(path))
+
+        limiter_a = registry.limiter(registry.get("a"))
+        limiter_b = registry.limiter(registry.get("b"))
+        registry.reload()
+
+        assert limiter_a is not limiter_b
+        assert limiter_b.rate == 5
+        assert registry.limiter(registry.get("a")) is limiter_a
+
+
+class TestMultiBotEndpoints:
+    """Test suite for the per-bot webhook and send endpoints"""
+
+    @pytest.fixture
+    def bots(self, tmp_path):
+        path = tmp_path / "bots.json"
+        write_bots(path, [{"id": "support", "token": "t1", "llm_url": "http://support-llm"}])
+        registry = BotRegistry(str(path), default_token="default-token")
+        with patch('app.api.registry', registry):
+            yield registry
+
+    @patch('app.api.traffic.gateway_percent', 0)
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    def test_bot_webhook_uses_bot_config(self, mock_ask_llm, mock_send_telegram, bots):
+        """The per-bot webhook passes the resolved bot to the services"""
+        mock_ask_llm.return_value = "hi"
+        payload = {"message": {"text": "hello", "chat": {"id": 42}}}
+
+        response = client.post("/telegram/support/webhook", json=payload)
+
+        assert response.status_code == 200
+        assert mock_ask_llm.call_args.kwargs["bot"].id == "support"
+        assert mock_send_telegram.call_args.kwargs["bot"].token == "t1"
+
+    def test_unknown_bot_returns_404(self, bots):
+        """Webhooks for unknown bots are rejected"""
+        response = client.post("/telegram/missing/webhook", json={})
+
+        assert response.status_code == 404
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_send_routes_to_bot_from_routing_id(self, mock_send_telegram, bots):
+        """A three-part X-Routing-ID selects the bot to reply with"""
+        mock_send_telegram.return_value = {"ok": True}
+
+        response = client.post(
+            "/telegram/send",
+            json={"text": "reply"},
+            headers={"X-Routing-ID": "telegram:support:42"},
+        )
+
+        assert response.status_code == 200
+        called_msg = mock_send_telegram.call_args[0][0]
+        assert called_msg.chat_id == "42"
+        assert mock_send_telegram.call_args.kwargs["bot"].id == "support"
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_send_keeps_two_part_routing_id_on_default_bot(self, mock_send_telegram, bots):
+        """The original telegram:<chat_id> format still targets the default bot"""
+        mock_send_telegram.return_value = {"ok": True}
+
+        response = client.post(
+            "/telegram/send",
+            json={"text": "reply"},
+            headers={"X-Routing-ID": "telegram:42"},
+        )
+
+        assert response.status_code == 200
+        assert mock_send_telegram.call_args.kwargs["bot"].id == DEFAULT_BOT_ID
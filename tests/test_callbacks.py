@@ -0,0 +1,190 @@
+import pytest
+import asyncio
+import httpx
+import json
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.main import app
+from app.commands import CommandRouter
+from app.lifecycle import WorkTracker
+from app.models import CallbackReply, Message
+from app.services import send_telegram_message
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("default_bot")
+
+KEYBOARD = {"inline_keyboard": [[{"text": "Yes", "callback_data": "vote:yes"}, {"text": "Docs", "url": "https://x.y"}]]}
+
+
+def callback_update(data="vote:yes", **extra):
+    query = {
+        "id": "cb-1",
+        "from": {"id": 7, "first_name": "Ada"},
+        "message": {"message_id": 99, "from": {"id": 1, "first_name": "Bot"}, "chat": {"id": 42, "type": "private"},
+                    "text": "Do you agree?"},
+        "data": data,
+        **extra,
+    }
+    return {"update_id": 1, "callback_query": query}
+
+
+class TestCallbackRouting:
+    """Test suite for routing button presses"""
+
+    @pytest.mark.asyncio
+    async def test_configured_reply(self):
+        """A callback from the config answers with a toast and an edit, filled from the press"""
+        router = CommandRouter()
+        router.add_callback("vote", {"text": "Thanks, {first_name}!", "edit": "You voted {args}"})
+
+        query = callback_update()["callback_query"]
+        reply = await router.dispatch_callback(query, MagicMock(id="default"), MagicMock())
+
+        assert reply.text == "Thanks, Ada!"
+        assert reply.edit == "You voted yes"
+
+    @pytest.mark.asyncio
+    async def test_handler_returning_text(self):
+        """A handler may return plain text, used as the toast"""
+        router = CommandRouter()
+
+        @router.callback("vote")
+        async def vote(ctx):
+            return f"got {ctx.args}"
+
+        query = callback_update()["callback_query"]
+        reply = await router.dispatch_callback(query, MagicMock(id="default"), MagicMock())
+
+        assert reply == CallbackReply(text="got yes")
+
+    @pytest.mark.asyncio
+    async def test_unknown_data(self):
+        """Callback data without a route returns None"""
+        router = CommandRouter()
+        router.add_callback("vote", "ok")
+
+        query = callback_update("other")["callback_query"]
+        assert await router.dispatch_callback(query, MagicMock(id="default"), MagicMock()) is None
+
+
+class TestCallbackWebhook:
+    """Test suite for callback_query updates in the webhook"""
+
+    @patch('app.api.edit_message_text', new_callable=AsyncMock)
+    @patch('app.api.answer_callback_query', new_callable=AsyncMock)
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    def test_press_is_answered_and_edit_scheduled(self, mock_ask_llm, mock_answer, mock_edit):
+        """The query is answered within the request and the edit runs in the background"""
+        router = CommandRouter()
+        router.add_callback("vote", {"text": "Thanks!", "edit": "You voted {args}"})
+
+        with patch('app.api.commands', router), patch('app.api.work', WorkTracker()):
+            response = client.post("/telegram/webhook", json=callback_update())
+
+        assert response.status_code == 200
+        assert response.json() == {"ok": True, "source": "callback", "handled": True}
+        assert mock_answer.call_args.args[0] == "cb-1"
+        assert mock_answer.call_args.kwargs["text"] == "Thanks!"
+        assert mock_edit.call_args.args[0] == "You voted yes"
+        assert mock_edit.call_args.kwargs["chat_id"] == 42
+        assert mock_edit.call_args.kwargs["message_id"] == 99
+        mock_ask_llm.assert_not_called()
+
+    @patch('app.api.edit_message_text', new_callable=AsyncMock)
+    @patch('app.api.answer_callback_query', new_callable=AsyncMock)
+    def test_unhandled_press_is_still_answered(self, mock_answer, mock_edit):
+        """Unknown callback data still stops the spinner, with no edit"""
+        with patch('app.api.commands', CommandRouter()):
+            response = client.post("/telegram/webhook", json=callback_update("unknown"))
+
+        assert response.status_code == 200
+        assert response.json()["handled"] is False
+        mock_answer.assert_awaited_once()
+        mock_edit.assert_not_called()
+
+    @patch('app.api.answer_callback_query', new_callable=AsyncMock)
+    def test_failing_handler_is_still_answered(self, mock_answer):
+        """A handler error is logged and the press answered without a text"""
+        router = CommandRouter()
+
+        @router.callback("vote")
+        def vote(ctx):
+            raise RuntimeError("boom")
+
+        with patch('app.api.commands', router):
+            response = client.post("/telegram/webhook", json=callback_update())
+
+        assert response.status_code == 200
+        assert mock_answer.call_args.kwargs["text"] is None
+
+    @patch('app.api.CALLBACK_HANDLER_TIMEOUT', 0.01)
+    @patch('app.api.answer_callback_query', new_callable=AsyncMock)
+    def test_slow_handler_is_answered_at_the_deadline(self, mock_answer):
+        """A handler that overruns its deadline is abandoned and the press answered empty"""
+        router = CommandRouter()
+
+        @router.callback("vote")
+        async def vote(ctx):
+            await asyncio.sleep(10)
+            return "too late"
+
+        with patch('app.api.commands', router):
+            response = client.post("/telegram/webhook", json=callback_update())
+
+        assert response.status_code == 200
+        assert response.json()["handled"] is False
+        assert mock_answer.call_args.kwargs["text"] is None
+
+    def test_query_without_id_is_rejected(self):
+        """A callback_query without an id is a bad payload"""
+        update = callback_update()
+        del update["callback_query"]["id"]
+
+        response = client.post("/telegram/webhook", json=update)
+
+        assert response.status_code == 400
+
+
+class TestInlineKeyboards:
+    """Test suite for sending inline keyboards"""
+
+    @pytest.mark.asyncio
+    async def test_reply_markup_is_sent_to_telegram(self):
+        """reply_markup is passed to sendMessage without empty fields"""
+        payloads = []
+
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            return httpx.Response(200, json={"ok": True})
+
+        request = MagicMock()
+        msg = Message(chat_id=42, text="Do you agree?", reply_markup=KEYBOARD)
+        with patch('app.services.get_http_client',
+                   return_value=httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+            await send_telegram_message(msg, request)
+
+        assert payloads[0]["reply_markup"] == KEYBOARD
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_send_endpoint_accepts_keyboards(self, mock_send_telegram):
+        """/telegram/send takes a reply_markup with an inline keyboard"""
+        mock_send_telegram.return_value = {"ok": True}
+
+        response = client.post("/telegram/send", json={"chat_id": 42, "text": "Agree?", "reply_markup": KEYBOARD})
+
+        assert response.status_code == 200
+        assert mock_send_telegram.call_args.args[0].reply_markup.inline_keyboard[0][0].callback_data == "vote:yes"
+
+    @pytest.mark.parametrize("button", [
+        {"text": "Too long", "callback_data": "x" * 65},
+        {"text": "Nothing"},
+        {"text": "Both", "callback_data": "a", "url": "https://x.y"},
+    ])
+    def test_invalid_buttons_are_rejected(self, button):
+        """Buttons need one action and callback_data of at most 64 bytes"""
+        response = client.post("/telegram/send", json={"chat_id": 42, "text": "?",
+                                                       "reply_markup": {"inline_keyboard": [[button]]}})
+
+        assert response.status_code == 422
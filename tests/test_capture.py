@@ -0,0 +1,225 @@
+import pytest
+import asyncio
+import httpx
+import json
+import os
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.main import app
+from app.capture import TrafficCapture, read_capture, replay, sanitize, mask, pseudonymize
+
+
+def fake_request(path="/telegram/send", headers=None):
+    request = MagicMock()
+    request.url.path = path
+    request.headers = headers or {}
+    return request
+
+
+def webhook_update(chat_id=123456, text="what are your hours?"):
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": 5,
+            "from": {"id": 777, "first_name": "Ada", "username": "ada"},
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text,
+        },
+    }
+
+
+class TestSanitize:
+    """Test suite for capture sanitization"""
+
+    def test_ids_are_stable_pseudonyms(self):
+        """The same id maps to the same pseudonym, keeping its type and sign"""
+        key = b"k" * 32
+        assert pseudonymize(123, key) == pseudonymize(123, key) != 123
+        assert pseudonymize(-100123, key) < 0
+        assert pseudonymize("42", key).isdigit()
+
+    def test_text_keeps_shape_and_commands(self):
+        """Text is masked with its length and word boundaries; a leading command survives"""
+        assert mask("hello there") == "xxxxx xxxxx"
+        assert mask("/start promo code") == "/start xxxxx xxxx"
+
+    def test_update_has_no_personal_data(self):
+        """Names, ids and message text are removed from a webhook update"""
+        clean = sanitize(webhook_update(), b"k" * 32)
+        message = clean["message"]
+
+        assert message["chat"]["id"] != 123456
+        assert message["from"]["id"] != 777
+        assert message["from"]["first_name"] == "xxx"
+        assert message["text"] == "xxxx xxx xxxx xxxxxx"
+        assert message["message_id"] == 5
+        assert "Ada" not in json.dumps(clean)
+
+    def test_callback_data_is_masked(self):
+        """Button data keeps its route name, the rest is masked"""
+        key = b"k" * 32
+        query = {"id": "cb-1", "from": {"id": 7}, "data": "order:4111 1111"}
+
+        assert sanitize(query, key)["data"] == "order:xxxx xxxx"
+        assert sanitize({"data": "secret"}, key)["data"] == "xxxxxx"
+
+
+class TestTrafficCapture:
+    """Test suite for writing captures"""
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_gzip_ndjson(self, tmp_path):
+        """Recorded requests are written as sanitized, timestamped lines keyed by chat"""
+        capture = TrafficCapture(str(tmp_path), enabled=True)
+        capture.record(fake_request("/telegram/webhook"), webhook_update())
+        capture.record(fake_request(headers={"x-priority": "bulk"}), {"chat_id": "42", "text": "hi"})
+
+        assert await capture.flush() == 2
+        entries = list(read_capture([str(tmp_path)]))
+
+        assert [entry["path"] for entry in entries] == ["/telegram/webhook", "/telegram/send"]
+        assert entries[0]["chat"] == entries[0]["body"]["message"]["chat"]["id"]
+        assert entries[1]["headers"] == {"x-priority": "bulk"}
+        assert entries[1]["body"]["text"] == "xx"
+        assert all(entry["t"] > 0 for entry in entries)
+        await capture.close()
+
+    @pytest.mark.asyncio
+    async def test_disabled_capture_records_nothing(self, tmp_path):
+        """With capture off, record() is a no-op"""
+        capture = TrafficCapture(str(tmp_path), enabled=False)
+        capture.record(fake_request(), {"chat_id": "42", "text": "hi"})
+
+        assert await capture.flush() == 0
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.asyncio
+    async def test_full_buffer_drops_requests(self, tmp_path):
+        """Past max_buffer unflushed requests, new ones are dropped and counted"""
+        capture = TrafficCapture(str(tmp_path), enabled=True, max_buffer=2)
+        for _ in range(3):
+            capture.record(fake_request(), {"chat_id": "42", "text": "hi"})
+
+        assert capture.stats()["buffered"] == 2
+        assert capture.dropped == 1
+
+    @pytest.mark.asyncio
+    async def test_files_rotate_and_old_ones_are_pruned(self, tmp_path):
+        """A new file starts past max_bytes and only max_files are kept"""
+        capture = TrafficCapture(str(tmp_path), enabled=True, max_bytes=1, max_files=2)
+        for i in range(4):
+            capture.record(fake_request(), {"chat_id": str(i), "text": "hi"})
+            await capture.flush()
+        await capture.close()
+
+        files = os.listdir(tmp_path)
+        assert len(files) == 2
+        assert len(list(read_capture([str(tmp_path)]))) == 2
+
+    @pytest.mark.asyncio
+    async def test_close_stops_the_writer_before_the_last_flush(self, tmp_path):
+        """close() stops the periodic writer and still writes everything buffered"""
+        capture = TrafficCapture(str(tmp_path), enabled=True)
+        capture.start_writer(0.001)
+        for i in range(50):
+            capture.record(fake_request(), {"chat_id": str(i), "text": "hi"})
+            await asyncio.sleep(0)
+
+        await capture.close()
+
+        assert capture._writer is None
+        assert len(list(read_capture([str(tmp_path)]))) == 50
+
+    @pytest.mark.asyncio
+    async def test_cancelled_flush_still_writes(self, tmp_path):
+        """Cancelling a flush mid-write neither loses nor duplicates its records"""
+        capture = TrafficCapture(str(tmp_path), enabled=True)
+        for i in range(20):
+            capture.record(fake_request(), {"chat_id": str(i), "text": "hi"})
+
+        flush = asyncio.create_task(capture.flush())
+        await asyncio.sleep(0)
+        flush.cancel()
+        await capture.close()
+
+        assert len(list(read_capture([str(tmp_path)]))) == 20
+        assert capture.captured == 20
+
+    @pytest.mark.asyncio
+    async def test_open_file_is_readable(self, tmp_path):
+        """A file that is still being written can be replayed up to the last flush"""
+        capture = TrafficCapture(str(tmp_path), enabled=True)
+        capture.record(fake_request(), {"chat_id": "42", "text": "hi"})
+        await capture.flush()
+
+        assert len(list(read_capture([str(tmp_path)]))) == 1
+        await capture.close()
+
+    def test_endpoints_record_when_enabled(self, tmp_path, default_bot):
+        """/telegram/webhook and /telegram/send hand their payloads to the capture"""
+        capture = TrafficCapture(str(tmp_path), enabled=True)
+        with patch('app.api.capture', capture), \
+             patch('app.api.send_telegram_message', new_callable=AsyncMock) as mock_send, \
+             patch('app.api.ask_llm', new_callable=AsyncMock) as mock_ask:
+            mock_send.return_value = {"ok": True}
+            mock_ask.return_value = "answer"
+            client = TestClient(app)
+            client.post("/telegram/webhook", json=webhook_update())
+            client.post("/telegram/send", json={"chat_id": "42", "text": "hi"})
+
+        assert [record[1] for record in capture._buffer] == ["/telegram/webhook", "/telegram/send"]
+
+
+class TestReplay:
+    """Test suite for replaying captures"""
+
+    def entries(self):
+        return [
+            {"t": 100.0, "path": "/telegram/send", "headers": {}, "body": {"chat_id": "1", "text": "a"}, "chat": "1"},
+            {"t": 100.1, "path": "/telegram/send", "headers": {}, "body": {"chat_id": "1", "text": "b"}, "chat": "1"},
+            {"t": 100.2, "path": "/telegram/webhook", "headers": {}, "body": webhook_update(2), "chat": 2},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_replay_keeps_per_chat_order(self):
+        """Requests of one chat go one at a time, in capture order"""
+        seen = []
+
+        async def handler(request):
+            body = json.loads(request.content)
+            if body.get("text") == "a":
+                # a slow first reply must not let the second message of the chat overtake it
+                await asyncio.sleep(0.05)
+            seen.append(body.get("text"))
+            return httpx.Response(200, json={"ok": True})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://target")
+        report = await replay(self.entries(), client, speed=0)
+
+        assert seen.index("a") < seen.index("b")
+        assert report["requests"] == 3
+        assert report["chats"] == 2
+        assert report["statuses"] == {"200": 3}
+        assert report["latency"]["send"]["count"] == 2
+        assert report["latency"]["webhook"]["count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_speed_scales_the_schedule(self):
+        """At 10x, 0.2s of captured traffic takes about 0.02s"""
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)),
+                                   base_url="http://target")
+        report = await replay(self.entries(), client, speed=10)
+
+        assert 0.015 <= report["duration"] < 0.2
+
+    @pytest.mark.asyncio
+    async def test_errors_are_counted_by_type(self):
+        """Connection errors are reported instead of aborting the replay"""
+        def handler(request):
+            raise httpx.ConnectError("refused")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://target")
+        report = await replay(self.entries(), client, speed=0)
+
+        assert report["statuses"] == {"ConnectError": 3}
@@ -0,0 +1,146 @@
+import pytest
+import json
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.main import app
+from app.commands import CommandRouter, parse_command
+from app.models import BotConfig
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("default_bot")
+
+BOT = BotConfig(id="default", token="x")
+
+
+def message(text, first_name="Ada"):
+    return {
+        "message_id": 1,
+        "from": {"id": 7, "first_name": first_name, "username": "ada"},
+        "chat": {"id": 42, "type": "private"},
+        "text": text,
+    }
+
+
+class TestParseCommand:
+    """Test suite for command parsing"""
+
+    def test_command_and_args(self):
+        """The command is lowercased and split from its arguments"""
+        assert parse_command("/Start promo42") == ("start", "promo42")
+
+    def test_bot_suffix_is_dropped(self):
+        """Group chat commands carry an @bot suffix"""
+        assert parse_command("/help@MyBot") == ("help", "")
+
+    def test_plain_text_is_not_a_command(self):
+        """Only text starting with a slash is a command"""
+        assert parse_command("hello /start") is None
+        assert parse_command("/") is None
+
+
+class TestCommandRouter:
+    """Test suite for the command router"""
+
+    @pytest.mark.asyncio
+    async def test_static_reply(self):
+        """A reply without placeholders is returned as configured"""
+        router = CommandRouter()
+        router.add("help", "Ask me anything.")
+
+        assert await router.dispatch("/help", message("/help"), BOT, MagicMock()) == "Ask me anything."
+        assert router.lookup("help", BOT.id).static
+
+    @pytest.mark.asyncio
+    async def test_templated_reply(self):
+        """Placeholders are filled from the message; unknown ones stay as written"""
+        router = CommandRouter()
+        router.add("start", "Hi {first_name}, code {args} {unknown}")
+
+        reply = await router.dispatch("/start XYZ", message("/start XYZ"), BOT, MagicMock())
+
+        assert reply == "Hi Ada, code XYZ {unknown}"
+
+    @pytest.mark.asyncio
+    async def test_bot_specific_reply_wins(self):
+        """A reply for the bot overrides the shared one"""
+        router = CommandRouter()
+        router.add("start", "shared")
+        router.add("start", "support only", bot_id="support")
+
+        assert await router.dispatch("/start", message("/start"), BOT, MagicMock()) == "shared"
+        support = BotConfig(id="support", token="y")
+        assert await router.dispatch("/start", message("/start"), support, MagicMock()) == "support only"
+
+    @pytest.mark.asyncio
+    async def test_python_handlers(self):
+        """Sync and async handlers are called with the command context; None falls through"""
+        router = CommandRouter()
+
+        @router.handler("echo")
+        async def echo(ctx):
+            return ctx.args.upper()
+
+        @router.handler("maybe")
+        def maybe(ctx):
+            return None
+
+        assert await router.dispatch("/echo hi", message("/echo hi"), BOT, MagicMock()) == "HI"
+        assert await router.dispatch("/maybe", message("/maybe"), BOT, MagicMock()) is None
+
+    @pytest.mark.asyncio
+    async def test_unknown_command(self):
+        """Commands without a route return None"""
+        router = CommandRouter()
+        router.add("help", "Ask me anything.")
+
+        assert await router.dispatch("/nope", message("/nope"), BOT, MagicMock()) is None
+
+    def test_load_from_file(self, tmp_path):
+        """COMMANDS_FILE holds shared replies and per-bot overrides"""
+        path = tmp_path / "commands.json"
+        path.write_text(json.dumps({"commands": {"start": "Hi!"}, "bots": {"support": {"start": "Support"}}}))
+
+        router = CommandRouter(str(path))
+
+        assert len(router) == 2
+        assert router.lookup("start", "support").text == "Support"
+
+    def test_broken_file_is_logged(self, tmp_path):
+        """An unreadable file leaves the router empty instead of failing startup"""
+        path = tmp_path / "commands.json"
+        path.write_text("{not json")
+
+        assert len(CommandRouter(str(path))) == 0
+
+
+class TestWebhookCommands:
+    """Test suite for commands in the webhook"""
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    def test_command_skips_the_llm(self, mock_ask_llm, mock_send_telegram):
+        """A configured command is answered without calling the LLM"""
+        router = CommandRouter()
+        router.add("start", "Welcome, {first_name}!")
+
+        with patch('app.api.commands', router):
+            response = client.post("/telegram/webhook", json={"update_id": 1, "message": message("/start")})
+
+        assert response.json() == {"ok": True, "source": "command"}
+        mock_ask_llm.assert_not_called()
+        assert mock_send_telegram.call_args[0][0].text == "Welcome, Ada!"
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    @patch('app.api.traffic.choose', return_value="llm")
+    def test_unknown_command_goes_to_the_llm(self, mock_choose, mock_ask_llm, mock_send_telegram):
+        """Commands without a route are handled like any other text"""
+        mock_ask_llm.return_value = "llm answer"
+
+        with patch('app.api.commands', CommandRouter()):
+            response = client.post("/telegram/webhook", json={"update_id": 1, "message": message("/weather")})
+
+        assert response.json() == {"ok": True, "source": "llm"}
+        mock_ask_llm.assert_called_once()
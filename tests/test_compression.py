@@ -0,0 +1,95 @@
+import pytest
+import gzip
+import httpx
+import json
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, patch
+
+from app.compression import compress_body
+from app.services import ask_llm
+from app.main import app
+
+
+class TestCompressBody:
+    """Test suite for compress_body"""
+
+    def test_small_bodies_are_not_compressed(self):
+        """Bodies under the threshold are sent as-is"""
+        body, encoding = compress_body(b"x" * 10, "gzip", min_bytes=100)
+
+        assert body == b"x" * 10
+        assert encoding is None
+
+    def test_disabled_compression(self):
+        """encoding none leaves large bodies untouched"""
+        body, encoding = compress_body(b"x" * 1000, "none", min_bytes=100)
+
+        assert encoding is None
+
+    def test_gzip_compression(self):
+        """Large bodies are gzip-compressed"""
+        body, encoding = compress_body(b"x" * 1000, "gzip", min_bytes=100)
+
+        assert encoding == "gzip"
+        assert gzip.decompress(body) == b"x" * 1000
+
+    def test_zstd_compression(self):
+        """Large bodies are zstd-compressed when zstandard is installed"""
+        zstandard = pytest.importorskip("zstandard")
+
+        body, encoding = compress_body(b"x" * 1000, "zstd", min_bytes=100)
+
+        assert encoding == "zstd"
+        assert zstandard.ZstdDecompressor().decompress(body) == b"x" * 1000
+
+
+class TestUpstreamCompression:
+    """Test suite for compressed LLM requests"""
+
+    @pytest.mark.asyncio
+    @patch('app.services.LLM_URL', 'http://llm/ask')
+    async def test_ask_llm_compresses_large_prompts(self):
+        """Large prompts are sent gzip-encoded with Content-Encoding"""
+        captured = []
+
+        def handler(request):
+            captured.append(request)
+            return httpx.Response(200, json={"response": "ok"})
+
+        request = MagicMock()
+        request.state.logger.extra = {"request_id": "req-1"}
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        prompt = "context " * 500
+
+        with patch('app.services.get_http_client', return_value=http), \
+             patch('app.compression.UPSTREAM_COMPRESSION', 'gzip'):
+            assert await ask_llm(prompt, request) == "ok"
+
+        assert captured[0].headers["content-encoding"] == "gzip"
+        assert json.loads(gzip.decompress(captured[0].content)) == {"prompt": prompt}
+
+
+class TestResponseCompression:
+    """Test suite for compression of our own responses"""
+
+    def test_large_responses_are_gzipped(self):
+        """Responses above the threshold are compressed for clients that accept gzip"""
+        client = TestClient(app)
+
+        @app.get("/large-test")
+        def large():
+            return {"data": "x" * 5000}
+
+        response = client.get("/large-test", headers={"Accept-Encoding": "gzip"})
+        app.routes.pop()
+
+        assert response.headers.get("content-encoding") == "gzip"
+        assert response.json() == {"data": "x" * 5000}
+
+    def test_small_responses_are_not_compressed(self):
+        """Small responses are sent uncompressed"""
+        client = TestClient(app)
+
+        response = client.get("/health", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
@@ -61,6 +61,23 @@ class TestConfigVariables:
         assert app.config.LLM_URL == "http://localhost:8081/api/v1/chat/ask"
         assert app.config.HOST == "127.0.0.1"
         assert app.config.PORT == 8000
+        assert app.config.RELOAD == False
+    
+    @patch('os.getenv')
+    @patch('app.config.load_dotenv')
+    def test_reload_defaults_to_true_in_development(self, mock_load_dotenv, mock_getenv):
+        """Test that RELOAD defaults to true only when ENVIRONMENT is development"""
+        def getenv_side_effect(key, default=None):
+            if key == 'ENVIRONMENT':
+                return 'development'
+            return default
+        
+        mock_getenv.side_effect = getenv_side_effect
+        
+        import importlib
+        import app.config
+        importlib.reload(app.config)
+        
         assert app.config.RELOAD == True
     
     @patch('os.getenv')
@@ -0,0 +1,168 @@
+import pytest
+import httpx
+import json
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, patch
+
+from app.main import app
+from app.degradation import DegradationController, parse_thresholds, shorten, NORMAL, FALLBACK, SHORT, BUSY
+from app.services import ask_llm
+
+
+def controller(**kwargs):
+    kwargs.setdefault("in_flight", (10, 20, 30))
+    return DegradationController(enabled=True, recovery_hold=5, **kwargs)
+
+
+class TestDegradationController:
+    """Test suite for degradation tier selection"""
+
+    def test_tier_follows_the_highest_signal(self):
+        """The tier is the highest one any signal reaches"""
+        degradation = controller(queue_depth=(5, 50, 100))
+        degradation.queue_depth = lambda: 60
+
+        assert degradation.evaluate(now=0) == SHORT
+
+    def test_steps_up_immediately(self):
+        """Crossing a threshold moves straight to that tier"""
+        degradation = controller()
+        degradation.in_flight = 35
+
+        assert degradation.evaluate(now=0) == BUSY
+
+    def test_recovery_needs_a_quiet_period_per_step(self):
+        """Tiers come down one at a time, each after recovery_hold seconds below the recovery ratio"""
+        degradation = controller()
+        degradation.in_flight = 35
+        degradation.evaluate(now=0)
+
+        degradation.in_flight = 0
+        assert degradation.evaluate(now=1) == BUSY
+        assert degradation.evaluate(now=5) == BUSY
+        assert degradation.evaluate(now=6) == SHORT
+        assert degradation.evaluate(now=11) == FALLBACK
+        assert degradation.evaluate(now=16) == NORMAL
+
+    def test_hysteresis_holds_the_tier_near_the_threshold(self):
+        """Just under a threshold is not calm enough to step down"""
+        degradation = controller()
+        degradation.in_flight = 12
+        degradation.evaluate(now=0)
+
+        degradation.in_flight = 9
+        assert degradation.evaluate(now=10) == FALLBACK
+        assert degradation.evaluate(now=100) == FALLBACK
+
+    def test_spike_resets_the_quiet_period(self):
+        """A new spike during recovery restarts the hold"""
+        degradation = controller()
+        degradation.in_flight = 12
+        degradation.evaluate(now=0)
+
+        degradation.in_flight = 0
+        degradation.evaluate(now=1)
+        degradation.in_flight = 9
+        degradation.evaluate(now=3)
+        degradation.in_flight = 0
+        assert degradation.evaluate(now=7) == FALLBACK
+        assert degradation.evaluate(now=12) == NORMAL
+
+    def test_p95_latency_uses_recent_calls_only(self):
+        """Slow calls raise the tier and stop counting once they leave the window"""
+        degradation = DegradationController(enabled=True, p95_latency=(1, 2, 3), window=60, recovery_hold=0)
+        degradation._latencies.extend((0, 2.5) for _ in range(20))
+
+        assert degradation.evaluate(now=1) == SHORT
+        assert degradation.p95(now=100) == 0.0
+
+    def test_disabled_controller_is_always_normal(self):
+        """With degradation off, nothing is degraded"""
+        degradation = DegradationController(enabled=False, in_flight=(1,))
+        degradation.in_flight = 100
+
+        assert degradation.evaluate() == NORMAL
+
+    def test_parse_thresholds(self):
+        """Threshold lists are comma-separated numbers, empty for an unused signal"""
+        assert parse_thresholds("50, 80,120") == (50.0, 80.0, 120.0)
+        assert parse_thresholds("") == ()
+
+    def test_shorten_prefers_sentence_ends(self):
+        """Answers are cut at a sentence end, or at a word with an ellipsis"""
+        assert shorten("One two. Three four five.", 12) == "One two."
+        assert shorten("alpha beta gamma delta", 13) == "alpha beta…"
+        assert shorten("short", 100) == "short"
+
+
+class TestDegradedAskLlm:
+    """Test suite for ask_llm under degradation"""
+
+    @pytest.fixture
+    def request_mock(self):
+        request = MagicMock()
+        request.state.logger.extra = {"request_id": "req-1"}
+        return request
+
+    def llm(self, urls, answer="A long answer. With a second sentence that goes on and on."):
+        def handler(request):
+            urls.append((str(request.url), json.loads(request.content)))
+            return httpx.Response(200, json={"response": answer})
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    @pytest.mark.asyncio
+    async def test_fallback_tier_uses_the_fallback_llm(self, request_mock):
+        """In the fallback tier prompts go to LLM_FALLBACK_URL"""
+        calls = []
+        degradation = controller()
+        degradation.in_flight = 15
+
+        with patch('app.services.degradation', degradation), \
+             patch('app.services.LLM_FALLBACK_URL', "http://fast-llm/ask"), \
+             patch('app.services.get_http_client', return_value=self.llm(calls)):
+            await ask_llm("hi", request_mock)
+
+        assert calls[0][0] == "http://fast-llm/ask"
+
+    @pytest.mark.asyncio
+    async def test_short_tier_caps_the_answer(self, request_mock):
+        """In the short tier the answer is cut to DEGRADE_MAX_CHARS"""
+        calls = []
+        degradation = controller()
+        degradation.in_flight = 25
+
+        with patch('app.services.degradation', degradation), patch('app.services.DEGRADE_MAX_CHARS', 20), \
+             patch('app.services.get_http_client', return_value=self.llm(calls)):
+            answer = await ask_llm("hi", request_mock)
+
+        assert answer == "A long answer."
+        assert calls[0][1]["max_length"] == 20
+
+    @pytest.mark.asyncio
+    async def test_busy_tier_skips_the_llm(self, request_mock):
+        """In the busy tier the canned reply is returned without calling the LLM"""
+        calls = []
+        degradation = controller()
+        degradation.in_flight = 35
+
+        with patch('app.services.degradation', degradation), patch('app.services.DEGRADE_BUSY_REPLY', "busy"), \
+             patch('app.services.get_http_client', return_value=self.llm(calls)):
+            answer = await ask_llm("hi", request_mock)
+
+        assert answer == "busy"
+        assert calls == []
+
+
+class TestDegradationHealth:
+    """Test suite for exposing the degradation tier"""
+
+    def test_health_reports_the_tier(self):
+        """/health includes the current tier"""
+        degradation = controller()
+        degradation.in_flight = 15
+
+        with patch('app.main.degradation', degradation):
+            response = TestClient(app).get("/health")
+
+        assert response.status_code == 200
+        assert response.json()["degradation"] == "fallback"
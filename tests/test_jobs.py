@@ -0,0 +1,153 @@
+import pytest
+import asyncio
+import httpx
+import time
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+import app.main as main
+from app.jobs import JobTracker, SENT, FAILED
+from app.lifecycle import WorkTracker
+from app.state import MemoryStore
+
+
+@pytest.fixture
+def client(default_bot):
+    tracker = JobTracker(MemoryStore(), callback_retries=1, allowed_callback_hosts={"producer"})
+    with patch('app.api.jobs', tracker), \
+         patch('app.api.work', WorkTracker()), \
+         patch.object(main, 'work', WorkTracker()), \
+         patch('app.main.WARMUP_ENABLED', False), \
+         patch('app.main.close_http_client', new_callable=AsyncMock):
+        with TestClient(main.app) as client:
+            client.jobs = tracker
+            yield client
+
+
+def wait_for_job(client, status_url):
+    for _ in range(100):
+        job = client.get(status_url).json()
+        if job["status"] != "queued":
+            return job
+        time.sleep(0.01)
+    return job
+
+
+class TestAsyncSend:
+    """Test suite for asynchronous /telegram/send"""
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_async_flag_returns_202_and_job_completes(self, mock_send_telegram, client):
+        """?async=true answers 202 at once and the job reports delivery"""
+        mock_send_telegram.return_value = {"ok": True, "result": {"message_id": 7}}
+
+        response = client.post("/telegram/send?async=true", json={"chat_id": "42", "text": "hi"})
+
+        assert response.status_code == 202
+        data = response.json()
+        assert data["status"] == "queued"
+        assert response.headers["Location"] == data["status_url"] == f"/telegram/send/jobs/{data['job_id']}"
+
+        job = wait_for_job(client, data["status_url"])
+        assert job["status"] == SENT
+        assert job["result"]["result"]["message_id"] == 7
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_prefer_header_selects_async_mode(self, mock_send_telegram, client):
+        """Prefer: respond-async works like the query flag"""
+        mock_send_telegram.return_value = {"ok": False, "description": "chat not found"}
+
+        response = client.post("/telegram/send", json={"chat_id": "42", "text": "hi"},
+                               headers={"Prefer": "respond-async"})
+
+        job = wait_for_job(client, response.json()["status_url"])
+        assert job["status"] == FAILED
+        assert job["error"] == "chat not found"
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_callback_is_posted_on_completion(self, mock_send_telegram, client):
+        """The callback URL receives the finished job"""
+        mock_send_telegram.return_value = {"ok": True}
+        received = []
+
+        def callback(request):
+            received.append(request)
+            return httpx.Response(200)
+
+        http = httpx.AsyncClient(transport=httpx.MockTransport(callback))
+        with patch('app.jobs.get_http_client', return_value=http):
+            response = client.post("/telegram/send", json={"chat_id": "42", "text": "hi"},
+                                   headers={"X-Callback-URL": "http://producer/done"})
+            assert response.status_code == 202
+            wait_for_job(client, response.json()["status_url"])
+            for _ in range(100):
+                if received:
+                    break
+                time.sleep(0.01)
+
+        assert str(received[0].url) == "http://producer/done"
+
+    def test_unknown_job_returns_404(self, client):
+        """Status lookups for unknown ids return 404"""
+        assert client.get("/telegram/send/jobs/missing").status_code == 404
+
+    def test_disallowed_callback_is_rejected(self, client):
+        """Callback hosts outside the allowlist are refused"""
+        response = client.post("/telegram/send?callback_url=http://elsewhere/x", json={"chat_id": "1", "text": "hi"})
+
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("url", ["http://127.0.0.1/x", "http://169.254.169.254/latest", "http://producer/x"])
+    def test_callbacks_are_off_without_an_allowlist(self, client, url):
+        """With JOB_CALLBACK_ALLOWED_HOSTS empty no callback host is accepted"""
+        client.jobs.allowed_callback_hosts = set()
+
+        response = client.post(f"/telegram/send?callback_url={url}", json={"chat_id": "1", "text": "hi"})
+
+        assert response.status_code == 400
+
+    def test_full_queue_returns_503(self, client):
+        """Async sends are refused while too many are pending"""
+        client.jobs.max_pending = 0
+
+        response = client.post("/telegram/send?async=1", json={"chat_id": "1", "text": "hi"})
+
+        assert response.status_code == 503
+
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    def test_sync_mode_is_unchanged(self, mock_send_telegram, client):
+        """Without the flag the caller still gets Telegram's answer"""
+        mock_send_telegram.return_value = {"ok": True}
+
+        response = client.post("/telegram/send", json={"chat_id": "1", "text": "hi"})
+
+        assert response.status_code == 200
+        assert response.json() == {"ok": True}
+
+
+class TestJobShutdown:
+    """Test suite for jobs cut short by the shutdown drain"""
+
+    @pytest.mark.asyncio
+    async def test_drained_job_is_failed_and_notified(self):
+        """A send cancelled by the drain is saved as failed and its callback is still posted"""
+        tracker = JobTracker(MemoryStore(), callback_retries=1, allowed_callback_hosts={"producer"})
+        work = WorkTracker()
+        received = []
+
+        def callback(request):
+            received.append(request)
+            return httpx.Response(200)
+
+        http = httpx.AsyncClient(transport=httpx.MockTransport(callback))
+        job = await tracker.create("42", "default", "http://producer/done")
+        with patch('app.jobs.get_http_client', return_value=http):
+            work.spawn(tracker.run(job, lambda: asyncio.sleep(10)), "send")
+            await asyncio.sleep(0)
+            report = await work.drain(0.05)
+
+        saved = await tracker.get(job["job_id"])
+        assert report["abandoned"] == {"send": 1}
+        assert saved["status"] == FAILED and saved["error"] == "Server is shutting down"
+        assert tracker.pending == 0
+        assert len(received) == 1
@@ -0,0 +1,91 @@
+import pytest
+import asyncio
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+from app.lifecycle import WorkTracker, ShuttingDownError
+
+
+class TestWorkTracker:
+    """Test suite for the WorkTracker used during graceful shutdown"""
+
+    @pytest.mark.asyncio
+    async def test_track_counts_in_flight_work(self):
+        """Tracked work shows up in in_flight while running"""
+        tracker = WorkTracker()
+
+        async with tracker.track("webhook"):
+            assert tracker.in_flight() == {"webhook": 1}
+
+        assert tracker.in_flight() == {}
+
+    @pytest.mark.asyncio
+    async def test_drain_waits_for_background_tasks(self):
+        """Background tasks that finish before the deadline are reported as drained"""
+        tracker = WorkTracker()
+        finished = []
+
+        async def reply():
+            await asyncio.sleep(0.05)
+            finished.append(True)
+
+        tracker.spawn(reply(), "reply")
+        report = await tracker.drain(timeout=1.0, poll_interval=0.01)
+
+        assert finished == [True]
+        assert report == {"drained": {"reply": 1}, "abandoned": {}}
+
+    @pytest.mark.asyncio
+    async def test_drain_abandons_work_after_deadline(self):
+        """Work still running at the deadline is cancelled and reported as abandoned"""
+        tracker = WorkTracker()
+
+        task = tracker.spawn(asyncio.sleep(10), "reply")
+        report = await tracker.drain(timeout=0.05, poll_interval=0.01)
+
+        assert report == {"drained": {}, "abandoned": {"reply": 1}}
+        assert task.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_spawn_is_refused_after_drain_starts(self):
+        """No new background work is accepted once draining"""
+        tracker = WorkTracker()
+        await tracker.drain(timeout=0)
+
+        with pytest.raises(ShuttingDownError):
+            tracker.spawn(asyncio.sleep(0), "reply")
+
+
+class TestShutdown:
+    """Test suite for the application lifespan shutdown"""
+
+    def test_shutdown_drains_and_closes_http_pool(self, default_bot):
+        """Leaving the lifespan drains work and closes the shared HTTP client"""
+        from app.main import app
+        import app.main as main
+
+        tracker = WorkTracker()
+        with patch.object(main, 'work', tracker), \
+             patch('app.main.WARMUP_ENABLED', False), \
+             patch('app.main.close_http_client', new_callable=AsyncMock) as mock_close:
+            with TestClient(app):
+                pass
+
+            assert tracker.accepting is False
+            mock_close.assert_awaited_once()
+
+    def test_requests_are_rejected_while_draining(self):
+        """Webhook calls and health checks return 503 once draining has started"""
+        from app.main import app
+        import app.main as main
+
+        tracker = WorkTracker()
+        tracker.accepting = False
+        client = TestClient(app)
+        with patch.object(main, 'work', tracker):
+            webhook = client.post("/telegram/webhook", json={})
+            health = client.get("/health")
+
+        assert webhook.status_code == 503
+        assert health.status_code == 503
+        assert health.json()["status"] == "draining"
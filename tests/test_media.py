@@ -0,0 +1,274 @@
+import pytest
+import hashlib
+import httpx
+import json
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import send_telegram_media, file_id_cache
+from app.main import app
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("default_bot")
+
+
+def mock_request():
+    request = MagicMock()
+    request.state.logger = MagicMock()
+    return request
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+def telegram_transport(captured, result):
+    def handler(request: httpx.Request):
+        captured.append(request)
+        return httpx.Response(200, json={"ok": True, "result": result})
+    return httpx.MockTransport(handler)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    file_id_cache.clear()
+    yield
+
+
+class TestSendTelegramMedia:
+    """Test suite for the send_telegram_media function"""
+
+    @pytest.mark.asyncio
+    @patch('app.services.TELEGRAM_API_URL', 'https://api.telegram.org')
+    @patch('app.services.TELEGRAM_TOKEN', 'test_token')
+    async def test_upload_streams_multipart_and_caches_file_id(self):
+        """Uploads are sent as multipart and the resulting file_id is cached by content hash"""
+        captured = []
+        result = {"document": {"file_id": "doc-123"}}
+        http = httpx.AsyncClient(transport=telegram_transport(captured, result))
+
+        with patch('app.services.get_http_client', return_value=http):
+            data = await send_telegram_media(
+                "document", 42, mock_request(),
+                body=chunks(b"hello ", b"world"), filename="a.txt", content_type="text/plain",
+                caption="look",
+            )
+
+        assert data["ok"] is True
+        sent = captured[0]
+        assert str(sent.url) == "https://api.telegram.org/bottest_token/sendDocument"
+        assert sent.headers["content-type"].startswith("multipart/form-data; boundary=")
+        assert b'name="chat_id"\r\n\r\n42' in sent.content
+        assert b'name="caption"\r\n\r\nlook' in sent.content
+        assert b'filename="a.txt"\r\nContent-Type: text/plain\r\n\r\nhello world\r\n' in sent.content
+
+        digest = hashlib.sha256(b"hello world").hexdigest()
+        assert file_id_cache.get(("default", "document", digest)) == "doc-123"
+
+    @pytest.mark.asyncio
+    async def test_repeat_send_by_hash_reuses_file_id(self):
+        """A known content hash sends the cached file_id without uploading"""
+        captured = []
+        http = httpx.AsyncClient(transport=telegram_transport(captured, {}))
+        file_id_cache.put(("default", "photo", "abc"), "photo-1")
+
+        with patch('app.services.get_http_client', return_value=http):
+            await send_telegram_media("photo", 42, mock_request(), body=None, content_hash="ABC")
+
+        assert json.loads(captured[0].content) == {"chat_id": "42", "photo": "photo-1"}
+
+    @pytest.mark.asyncio
+    async def test_photo_caches_largest_size(self):
+        """For photos the file_id of the original (last) size is cached"""
+        captured = []
+        result = {"photo": [{"file_id": "small"}, {"file_id": "large"}]}
+        http = httpx.AsyncClient(transport=telegram_transport(captured, result))
+
+        with patch('app.services.get_http_client', return_value=http):
+            await send_telegram_media("photo", 42, mock_request(), body=chunks(b"img"))
+
+        digest = hashlib.sha256(b"img").hexdigest()
+        assert file_id_cache.get(("default", "photo", digest)) == "large"
+
+    @pytest.mark.asyncio
+    async def test_missing_body_and_file_id_raises(self):
+        """Without a body or file_id there is nothing to send"""
+        with pytest.raises(ValueError):
+            await send_telegram_media("voice", 42, mock_request(), body=None)
+
+
+class TestSendMediaEndpoint:
+    """Test suite for the /send/{media} endpoint"""
+
+    @patch('app.api.send_telegram_media', new_callable=AsyncMock)
+    def test_send_photo_upload(self, mock_send_media):
+        """The raw request body is handed to the service as a stream"""
+        mock_send_media.return_value = {"ok": True}
+
+        response = client.post(
+            "/telegram/send/photo?chat_id=42&caption=hi&filename=cat.jpg",
+            content=b"\xff\xd8jpeg",
+            headers={"Content-Type": "image/jpeg"},
+        )
+
+        assert response.status_code == 200
+        args, kwargs = mock_send_media.call_args
+        assert args[0] == "photo"
+        assert args[1] == "42"
+        assert kwargs["filename"] == "cat.jpg"
+        assert kwargs["content_type"] == "image/jpeg"
+        assert kwargs["caption"] == "hi"
+
+    @patch('app.api.send_telegram_media', new_callable=AsyncMock)
+    def test_send_media_uses_routing_id(self, mock_send_media):
+        """The chat can come from X-Routing-ID like text sends"""
+        mock_send_media.return_value = {"ok": True}
+
+        response = client.post(
+            "/telegram/send/voice?file_id=voice-1",
+            headers={"X-Routing-ID": "telegram:42"},
+        )
+
+        assert response.status_code == 200
+        assert mock_send_media.call_args[0][1] == "42"
+        assert mock_send_media.call_args.kwargs["file_id"] == "voice-1"
+
+    def test_unsupported_media_type(self):
+        """Unknown media types are rejected"""
+        response = client.post("/telegram/send/video?chat_id=42", content=b"x")
+
+        assert response.status_code == 404
+
+    def test_empty_upload_is_rejected(self):
+        """An upload without body, file_id or hash is a client error"""
+        response = client.post("/telegram/send/document?chat_id=42", content=b"")
+
+        assert response.status_code == 400
+
+
+def inbound_transport(captured, file_bytes, file_size=None):
+    def handler(request: httpx.Request):
+        captured.append(request)
+        if request.url.path.endswith("/getFile"):
+            result = {"file_id": "f1", "file_path": "voice/file_1.oga"}
+            if file_size is not None:
+                result["file_size"] = file_size
+            return httpx.Response(200, json={"ok": True, "result": result})
+        if "/file/bot" in request.url.path:
+            return httpx.Response(200, content=file_bytes)
+        return httpx.Response(200, json={"response": "transcribed"})
+    return httpx.MockTransport(handler)
+
+
+VOICE = {"type": "voice", "file_id": "f1", "file_size": None, "mime_type": "audio/ogg", "file_name": "voice"}
+
+
+class TestInboundMedia:
+    """Test suite for downloading inbound media and forwarding it to the LLM"""
+
+    def test_extract_media_picks_largest_photo_under_cap(self):
+        """The largest photo size within MEDIA_MAX_BYTES is selected"""
+        from app.media import extract_media
+
+        message = {"photo": [{"file_id": "s", "file_size": 10}, {"file_id": "m", "file_size": 100},
+                             {"file_id": "l", "file_size": 10 ** 9}]}
+
+        assert extract_media(message)["file_id"] == "m"
+
+    def test_extract_media_ignores_text_messages(self):
+        """Messages without media return None"""
+        from app.media import extract_media
+
+        assert extract_media({"text": "hi"}) is None
+
+    @pytest.mark.asyncio
+    @patch('app.media.TELEGRAM_API_URL', 'https://api.telegram.org')
+    @patch('app.media.LLM_MEDIA_URL', 'http://llm/ask-media')
+    async def test_streams_file_to_llm(self):
+        """The downloaded file is forwarded to the LLM media endpoint"""
+        from app.media import ask_llm_with_media
+
+        captured = []
+        http = httpx.AsyncClient(transport=inbound_transport(captured, b"ogg-bytes"))
+        request = mock_request()
+        request.state.logger.extra = {"request_id": "req-1"}
+
+        with patch('app.media.get_http_client', return_value=http):
+            answer = await ask_llm_with_media(VOICE, "what is this?", request)
+
+        assert answer == "transcribed"
+        llm_call = captured[-1]
+        assert str(llm_call.url) == "http://llm/ask-media"
+        assert llm_call.content == b"ogg-bytes"
+        assert llm_call.headers["content-type"] == "audio/ogg"
+        assert llm_call.headers["x-prompt"] == "what%20is%20this%3F"
+
+    @pytest.mark.asyncio
+    @patch('app.media.MEDIA_UPLOAD_MODE', 'spool')
+    async def test_spool_mode_sends_content_length(self):
+        """Spool mode buffers the file and sends it with a Content-Length"""
+        from app.media import ask_llm_with_media
+
+        captured = []
+        http = httpx.AsyncClient(transport=inbound_transport(captured, b"x" * 1000))
+        request = mock_request()
+        request.state.logger.extra = {"request_id": "req-1"}
+
+        with patch('app.media.get_http_client', return_value=http):
+            await ask_llm_with_media(VOICE, "", request)
+
+        assert captured[-1].headers["content-length"] == "1000"
+        assert captured[-1].content == b"x" * 1000
+
+    @pytest.mark.asyncio
+    @patch('app.media.MEDIA_MAX_BYTES', 100)
+    async def test_rejects_files_over_cap_before_download(self):
+        """getFile sizes over the cap stop before the download starts"""
+        from app.media import ask_llm_with_media, MediaTooLargeError
+
+        captured = []
+        http = httpx.AsyncClient(transport=inbound_transport(captured, b"", file_size=1000))
+        request = mock_request()
+        request.state.logger.extra = {"request_id": "req-1"}
+
+        with patch('app.media.get_http_client', return_value=http), pytest.raises(MediaTooLargeError):
+            await ask_llm_with_media(VOICE, "", request)
+
+        assert len(captured) == 1
+
+    @pytest.mark.asyncio
+    @patch('app.media.MEDIA_MAX_BYTES', 100)
+    async def test_rejects_downloads_exceeding_cap(self):
+        """Downloads that grow past the cap are aborted"""
+        from app.media import ask_llm_with_media, MediaTooLargeError
+
+        http = httpx.AsyncClient(transport=inbound_transport([], b"x" * 1000))
+        request = mock_request()
+        request.state.logger.extra = {"request_id": "req-1"}
+
+        with patch('app.media.get_http_client', return_value=http), pytest.raises(MediaTooLargeError):
+            await ask_llm_with_media(VOICE, "", request)
+
+    @patch('app.api.MEDIA_ENABLED', True)
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    @patch('app.api.ask_llm_with_media', new_callable=AsyncMock)
+    def test_webhook_answers_voice_messages(self, mock_ask_media, mock_send_telegram):
+        """Voice updates go through the media path and the answer is sent back"""
+        mock_ask_media.return_value = "you said hi"
+        payload = {"update_id": 1, "message": {"chat": {"id": 42}, "voice": {"file_id": "v1", "duration": 2}}}
+
+        response = client.post("/telegram/webhook", json=payload)
+
+        assert response.status_code == 200
+        assert mock_ask_media.call_args[0][0]["type"] == "voice"
+        assert mock_send_telegram.call_args[0][0].text == "you said hi"
+
+    def test_webhook_rejects_media_when_disabled(self):
+        """Without MEDIA_ENABLED media updates keep the previous 400 behaviour"""
+        payload = {"update_id": 1, "message": {"chat": {"id": 42}, "voice": {"file_id": "v1"}}}
+
+        response = client.post("/telegram/webhook", json=payload)
+
+        assert response.status_code == 400
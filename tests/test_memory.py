@@ -0,0 +1,199 @@
+import pytest
+import tracemalloc
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.main import app
+from app.cache import LRUCache
+from app.memory import MemoryAccountant, deep_size, estimate_size, parse_limits, MB
+from app.similarity import SimilarityCache
+
+client = TestClient(app)
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def filled_cache(count, value_size=1000):
+    cache = LRUCache(count)
+    for i in range(count):
+        cache.put(i, "x" * value_size)
+    return cache
+
+
+class TestSizing:
+    """Test suite for memory size estimates"""
+
+    def test_deep_size_follows_containers_and_objects(self):
+        """Nested containers and instance attributes are counted once each"""
+        class Holder:
+            def __init__(self):
+                self.payload = "x" * 10000
+
+        shared = "y" * 10000
+        assert deep_size({"a": Holder()}) > 10000
+        assert deep_size([shared, shared]) < 2 * 10000
+
+    def test_estimate_scales_the_sample(self):
+        """A sampled estimate of a large container is close to its full size"""
+        cache = filled_cache(1000)
+
+        estimate = estimate_size(cache, sample=10)
+
+        assert 1000 * 1000 < estimate < 1000 * 1200
+
+    def test_parse_limits(self):
+        """MEMORY_LIMITS is component=MB pairs"""
+        assert parse_limits("similarity_cache=64, file_id_cache=0.5") == {
+            "similarity_cache": 64 * MB, "file_id_cache": MB // 2,
+        }
+        assert parse_limits("") == {}
+
+    def test_parse_limits_skips_bad_entries(self):
+        """A malformed entry is left for validate_config() to report rather than failing the import"""
+        assert parse_limits("similarity_cache=lots,file_id_cache=1") == {"file_id_cache": MB}
+
+
+class TestShrink:
+    """Test suite for giving memory back"""
+
+    def test_lru_cache_drops_the_oldest_entries(self):
+        """shrink() drops the least recently used share"""
+        cache = filled_cache(10)
+        cache.get(0)
+
+        assert cache.shrink(0.5) == 5
+        assert 0 in cache and 1 not in cache
+
+    def test_similarity_cache_keeps_its_index_consistent(self):
+        """Shrunk entries leave the LSH index too"""
+        cache = SimilarityCache(threshold=0.5)
+        cache.put("how do i reset my password", "a")
+        cache.put("what are your opening hours", "b")
+
+        cache.shrink(0.5)
+
+        assert len(cache) == 1
+        assert cache.lookup("how do i reset my password") is None
+        assert all(1 in bucket for bucket in cache._buckets.values())
+
+
+class TestMemorySources:
+    """Test suite for the containers components report"""
+
+    def test_similarity_cache_reports_entries_and_index(self):
+        """The LSH buckets are counted alongside the entries"""
+        cache = SimilarityCache(threshold=0.5)
+        cache.put("how do i reset my password", "a")
+
+        entries, buckets = cache.memory_sources()
+
+        assert len(entries) == 1 and len(buckets) > 0
+
+    def test_registered_components_use_memory_sources(self):
+        """Every component the app registers reports through its public memory_sources()"""
+        from app.memory import accountant
+
+        for name, (source, _) in accountant._components.items():
+            assert getattr(source, "__name__", "") in ("memory_sources", "pool_connections"), name
+
+
+class TestMemoryAccountant:
+    """Test suite for soft limits"""
+
+    def test_report_lists_components_by_size(self):
+        """Components are reported with their items and estimated bytes, largest first"""
+        accountant = MemoryAccountant()
+        accountant.register("small", lambda: filled_cache(2))
+        accountant.register("large", lambda: [filled_cache(50), []])
+
+        report = accountant.report()
+
+        assert list(report["components"]) == ["large", "small"]
+        assert report["components"]["large"]["items"] == 50
+        assert report["rss_bytes"] > 0
+
+    def test_component_limit_evicts_down_to_the_limit(self):
+        """A component over its limit is shrunk by enough to get back under it"""
+        cache = filled_cache(1000)
+        accountant = MemoryAccountant(limits={"cache": 500 * 1000}, evict_fraction=0.1)
+        accountant.register("cache", lambda: cache, cache.shrink)
+
+        evicted = accountant.enforce()
+
+        assert evicted["cache"] > 500
+        assert accountant.measure("cache")["bytes"] <= 500 * 1000
+
+    def test_process_limit_shrinks_the_largest_first(self):
+        """Over the RSS limit, the biggest evictable components give back entries first"""
+        large, small, queue = filled_cache(1000), filled_cache(10), [object()] * 5
+        accountant = MemoryAccountant(soft_limit=100 * MB, evict_fraction=0.5)
+        accountant.register("large", lambda: large, large.shrink)
+        accountant.register("small", lambda: small, small.shrink)
+        accountant.register("queue", lambda: queue)
+
+        with patch('app.memory.rss', return_value=100 * MB + 1000):
+            evicted = accountant.enforce()
+
+        assert evicted == {"large": 500}
+        assert len(queue) == 5
+
+    def test_under_the_limits_nothing_is_evicted(self):
+        """Limits that are not reached leave every component alone"""
+        cache = filled_cache(10)
+        accountant = MemoryAccountant(soft_limit=100 * MB, limits={"cache": MB})
+        accountant.register("cache", lambda: cache, cache.shrink)
+
+        with patch('app.memory.rss', return_value=50 * MB):
+            assert accountant.enforce() == {}
+        assert len(cache) == 10
+
+    def test_snapshots_are_diffed(self):
+        """The second snapshot reports the growth since the first"""
+        accountant = MemoryAccountant()
+        try:
+            first = accountant.snapshot()
+            kept = [bytearray(10000) for _ in range(100)]
+            second = accountant.snapshot(limit=5)
+        finally:
+            accountant.stop_tracing()
+
+        assert first["tracing_started"] and not second["tracing_started"]
+        assert second["top"][0]["size_diff"] >= 100 * 10000
+        assert len(kept) == 100
+        assert not tracemalloc.is_tracing()
+
+
+class TestMemoryEndpoints:
+    """Test suite for /admin/memory"""
+
+    @patch('app.admin.ADMIN_TOKEN', "secret")
+    def test_report(self):
+        """GET /admin/memory reports the registered components"""
+        response = client.get("/admin/memory", headers=ADMIN)
+
+        assert response.status_code == 200
+        assert "similarity_cache" in response.json()["components"]
+
+    @patch('app.admin.ADMIN_TOKEN', "secret")
+    def test_snapshot_and_stop(self):
+        """Snapshots start tracing, and DELETE stops it"""
+        response = client.post("/admin/memory/snapshot?limit=3", headers=ADMIN)
+        assert response.status_code == 200
+        assert len(response.json()["top"]) <= 3
+
+        response = client.delete("/admin/memory/snapshot", headers=ADMIN)
+        assert response.json() == {"stopped": True}
+
+    @patch('app.admin.ADMIN_TOKEN', "secret")
+    def test_snapshot_limit_is_checked(self):
+        """An out of range limit is a bad request"""
+        response = client.post("/admin/memory/snapshot?limit=0", headers=ADMIN)
+
+        assert response.status_code == 400
+
+    def test_requires_admin_token(self):
+        """The memory endpoints are admin only"""
+        with patch('app.admin.ADMIN_TOKEN', "secret"):
+            response = client.get("/admin/memory")
+
+        assert response.status_code == 401
@@ -0,0 +1,129 @@
+import pytest
+import asyncio
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+from app.admission import AdmissionController
+from app.priority import (
+    WeightedFairQueue, classify_request, classify_text, parse_chat_rules, parse_weights,
+    COMMAND, INTERACTIVE, BULK, BACKGROUND,
+)
+from app.ratelimit import TokenBucket
+from app.main import app
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("default_bot")
+
+
+class TestWeightedFairQueue:
+    """Test suite for the WeightedFairQueue"""
+
+    def test_serves_classes_in_proportion_to_weight(self):
+        """A backlogged class with four times the weight is served four times as often"""
+        queue = WeightedFairQueue({COMMAND: 8, INTERACTIVE: 4, BULK: 1, BACKGROUND: 1})
+        for i in range(20):
+            queue.push(BULK, f"b{i}")
+            queue.push(INTERACTIVE, f"i{i}")
+
+        served = [queue.pop() for _ in range(10)]
+
+        assert sum(item.startswith("i") for item in served) == 8
+        assert sum(item.startswith("b") for item in served) == 2
+
+    def test_fifo_within_a_class(self):
+        """Items of one class come out in arrival order"""
+        queue = WeightedFairQueue()
+        for i in range(3):
+            queue.push(BULK, i)
+
+        assert [queue.pop() for _ in range(3)] == [0, 1, 2]
+
+    def test_evict_below_takes_newest_lowest_class(self):
+        """Eviction only removes waiters ranked below the newcomer"""
+        queue = WeightedFairQueue()
+        queue.push(BULK, "bulk-1")
+        queue.push(BULK, "bulk-2")
+        queue.push(INTERACTIVE, "chat")
+
+        assert queue.evict_below(BULK) is None
+        assert queue.evict_below(COMMAND) == "bulk-2"
+        assert len(queue) == 2
+
+
+class TestClassification:
+    """Test suite for priority rules"""
+
+    def test_endpoint_and_header_rules(self):
+        """Batch sends are bulk, everything else interactive unless X-Priority says otherwise"""
+        assert classify_request("/telegram/send/batch", {}) == BULK
+        assert classify_request("/telegram/webhook", {}) == INTERACTIVE
+        assert classify_request("/telegram/send", {"X-Priority": "background"}) == BACKGROUND
+        assert classify_request("/telegram/send", {"X-Priority": "urgent"}) == INTERACTIVE
+
+    def test_untrusted_callers_cannot_raise_priority(self):
+        """Without the admin token X-Priority can only lower the endpoint's class"""
+        assert classify_request("/telegram/send", {"X-Priority": "command"}) == INTERACTIVE
+        assert classify_request("/telegram/send/batch", {"X-Priority": "interactive"}) == BULK
+        assert classify_request("/telegram/send", {"X-Priority": "command"}, trusted=True) == COMMAND
+
+    def test_webhook_ignores_the_header(self):
+        """Webhook priority is derived server-side, even for trusted callers"""
+        assert classify_request("/telegram/webhook", {"X-Priority": "command"}) == INTERACTIVE
+        assert classify_request("/telegram/bots/support/webhook", {"X-Priority": "background"}, trusted=True) == INTERACTIVE
+
+    def test_commands_and_config_parsing(self):
+        """Bot commands are promoted; invalid config entries are ignored"""
+        assert classify_text("/start", INTERACTIVE) == COMMAND
+        assert classify_text("hello", BULK) == BULK
+        assert parse_chat_rules("-100=command, 42=nope, 7=bulk") == {"-100": COMMAND, "7": BULK}
+        assert parse_weights("bulk=3,unknown=9")[BULK] == 3.0
+
+
+class TestPriorityScheduling:
+    """Test suite for priority-aware admission and send pacing"""
+
+    @pytest.mark.asyncio
+    async def test_full_queue_sheds_bulk_for_interactive(self):
+        """An interactive request takes the queue slot of a waiting bulk request"""
+        controller = AdmissionController(limit=1, max_queue=1, queue_timeout=1.0)
+        await controller.acquire()
+
+        bulk = asyncio.create_task(controller.acquire(BULK))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(controller.acquire(INTERACTIVE))
+        await asyncio.sleep(0)
+
+        assert await bulk is False
+        controller.release(0.01)
+        assert await interactive is True
+
+    @pytest.mark.asyncio
+    async def test_interactive_sends_overtake_queued_bulk(self):
+        """Tokens go to waiting interactive sends before an earlier bulk backlog"""
+        bucket = TokenBucket(rate=200, burst=1)
+        bucket.try_acquire()
+        order = []
+
+        async def send(name, priority):
+            await bucket.acquire(priority=priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(send(f"bulk{i}", BULK)) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(send("reply", INTERACTIVE)))
+        await asyncio.gather(*tasks)
+
+        assert order.index("reply") < 2
+
+    @patch('app.api.traffic.gateway_percent', 0)
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    def test_webhook_command_is_classified_as_command(self, mock_ask_llm, mock_send_telegram):
+        """A /command update is answered with command priority"""
+        mock_ask_llm.return_value = "help text"
+
+        client.post("/telegram/webhook", json={"message": {"text": "/help", "chat": {"id": 1}}})
+
+        request = mock_send_telegram.call_args[0][1]
+        assert request.state.priority == COMMAND
@@ -0,0 +1,105 @@
+import pytest
+import asyncio
+import threading
+import time
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.metrics import Metrics
+from app.profiling import SamplingProfiler, LoopLagMonitor
+from app.main import app
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def spin(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+class TestHistogram:
+    """Test suite for histogram support in Metrics"""
+
+    def test_renders_cumulative_buckets(self):
+        """Observations are rendered as cumulative Prometheus buckets"""
+        metrics = Metrics()
+        for value in (0.002, 0.02, 3.0):
+            metrics.observe("lag_seconds", value, buckets=(0.01, 0.1))
+
+        text = metrics.render()
+
+        assert 'lag_seconds_bucket{le="0.01"} 1' in text
+        assert 'lag_seconds_bucket{le="0.1"} 2' in text
+        assert 'lag_seconds_bucket{le="+Inf"} 3' in text
+        assert "lag_seconds_count 3" in text
+
+
+class TestSamplingProfiler:
+    """Test suite for the sampling profiler"""
+
+    def test_collapsed_output_names_the_hot_function(self):
+        """Samples of a busy thread end in the function that burns the CPU"""
+        worker = threading.Thread(target=spin, args=(0.2,))
+        worker.start()
+        profiler = SamplingProfiler(worker.ident, interval=0.002).run(0.1)
+        worker.join()
+
+        lines = profiler.collapsed().splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert stack.endswith("test_profiling.py:spin")
+        assert int(count) > 0
+
+
+class TestLoopLagMonitor:
+    """Test suite for the event loop lag monitor"""
+
+    @pytest.mark.asyncio
+    async def test_blocking_call_is_measured_and_reported(self):
+        """A blocking call shows up as lag and is logged with its stack while it runs"""
+        monitor = LoopLagMonitor(interval=0.01, slow_threshold=0.05)
+        with patch('app.profiling.log') as mock_log:
+            monitor.start()
+            await asyncio.sleep(0.03)
+            time.sleep(0.2)
+            await asyncio.sleep(0.03)
+            await monitor.stop()
+
+        assert monitor.max_lag >= 0.1
+        assert monitor.blocked == 1
+        blocked = [call.args[0] for call in mock_log.warning.call_args_list if "blocked" in call.args[0]]
+        assert "test_blocking_call_is_measured_and_reported" in blocked[0]
+
+
+@patch('app.admin.ADMIN_TOKEN', "secret")
+class TestProfilingEndpoints:
+    """Test suite for the profiling admin endpoints"""
+
+    def test_profile_returns_collapsed_stacks(self):
+        """GET /admin/profile samples the loop for the requested time"""
+        response = client.get("/admin/profile?seconds=0.05", headers=ADMIN)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+
+    def test_profile_duration_is_bounded(self):
+        """Durations above PROFILE_MAX_SECONDS are refused"""
+        response = client.get("/admin/profile?seconds=100000", headers=ADMIN)
+
+        assert response.status_code == 400
+
+    def test_profile_header_records_a_request_profile(self):
+        """An admin request with X-Profile gets its profile stored under its request id"""
+        response = client.get("/health", headers={**ADMIN, "X-Profile": "1", "X-Request-ID": "req-1"})
+
+        assert response.headers["X-Profile-Id"] == "req-1"
+        assert client.get("/admin/profile/req-1", headers=ADMIN).status_code == 200
+        assert client.get("/admin/profile/unknown", headers=ADMIN).status_code == 404
+
+    def test_profile_header_needs_admin_token(self):
+        """Without the admin token the header is ignored"""
+        response = client.get("/health", headers={"X-Profile": "1"})
+
+        assert "X-Profile-Id" not in response.headers
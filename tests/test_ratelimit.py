@@ -0,0 +1,27 @@
+import pytest
+import time
+
+from app.ratelimit import TokenBucket
+
+
+class TestTokenBucket:
+    """Test suite for the TokenBucket rate limiter"""
+
+    def test_allows_burst_then_limits(self):
+        """The bucket allows up to its burst and then refuses"""
+        bucket = TokenBucket(rate=1, burst=2)
+
+        assert bucket.try_acquire() is True
+        assert bucket.try_acquire() is True
+        assert bucket.try_acquire() is False
+
+    @pytest.mark.asyncio
+    async def test_acquire_waits_for_refill(self):
+        """acquire() waits until a token becomes available"""
+        bucket = TokenBucket(rate=100, burst=1)
+        bucket.try_acquire()
+
+        start = time.monotonic()
+        await bucket.acquire()
+
+        assert time.monotonic() - start >= 0.005
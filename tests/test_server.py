@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import patch
+
+from app.config import default_workers
+from app.server import server_options, run
+
+
+class TestServerOptions:
+    """Test suite for the production server options"""
+
+    @patch('app.server.RELOAD', False)
+    @patch('app.server.WORKERS', 4)
+    def test_uses_configured_workers(self):
+        """Multiple workers are used when reload is off"""
+        options = server_options()
+
+        assert options["workers"] == 4
+        assert options["reload"] is False
+
+    @patch('app.server.RELOAD', True)
+    @patch('app.server.WORKERS', 4)
+    def test_reload_forces_single_worker(self):
+        """Reload mode always runs a single worker"""
+        options = server_options()
+
+        assert options["workers"] == 1
+        assert options["reload"] is True
+
+    @patch('app.config.STATE_BACKEND', "memory")
+    def test_in_process_state_defaults_to_one_worker(self):
+        """Per-process state would diverge between workers, so the default is one"""
+        assert default_workers() == 1
+
+    @patch('app.config.STATE_BACKEND', "redis")
+    @patch('os.sched_getaffinity', return_value={0, 1}, create=True)
+    def test_shared_state_uses_the_available_cpus(self, mock_affinity):
+        """With redis the default is the CPUs the process may run on, not the host's"""
+        assert default_workers() == 2
+
+    @patch('app.server._available', return_value=True)
+    def test_prefers_uvloop_and_httptools(self, mock_available):
+        """uvloop and httptools are selected when installed"""
+        options = server_options()
+
+        assert options["loop"] == "uvloop"
+        assert options["http"] == "httptools"
+
+    @patch('app.server._available', return_value=False)
+    def test_falls_back_to_asyncio_and_h11(self, mock_available):
+        """asyncio and h11 are used when the fast implementations are missing"""
+        options = server_options()
+
+        assert options["loop"] == "asyncio"
+        assert options["http"] == "h11"
+
+    @patch('app.server.BACKLOG', 4096)
+    @patch('app.server.KEEP_ALIVE_TIMEOUT', 15)
+    @patch('app.server.GRACEFUL_SHUTDOWN_TIMEOUT', 20)
+    def test_exposes_socket_and_timeout_settings(self):
+        """Backlog and timeouts are passed through from configuration"""
+        options = server_options()
+
+        assert options["backlog"] == 4096
+        assert options["timeout_keep_alive"] == 15
+        assert options["timeout_graceful_shutdown"] == 20
+
+    @patch('app.server.uvicorn.run')
+    def test_run_starts_uvicorn_with_app_import_string(self, mock_run):
+        """run() hands the import string to uvicorn so workers can be spawned"""
+        run()
+
+        assert mock_run.call_args[0][0] == "app.main:app"
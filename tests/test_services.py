@@ -429,4 +429,59 @@ class TestServicesIntegration:
             assert telegram_result == telegram_success_response
             
             # Verify that both calls were made
-            assert mock_client.post.call_count == 2
\ No newline at end of file
+            assert mock_client.post.call_count == 2
+
+class TestGatewayEnvelope:
+    """Test suite for the gateway wire formats"""
+
+    def test_json_format_keeps_base64_envelope(self):
+        """The default format is the original base64-in-JSON envelope"""
+        import base64
+        from app.services import encode_gateway_content
+
+        content_type, body = encode_gateway_content("hola", "json")
+
+        assert content_type == "application/json"
+        content = json.loads(body)["content"]
+        assert json.loads(base64.b64decode(content)) == {"prompt": "hola"}
+
+    def test_raw_format_sends_prompt_bytes(self):
+        """The raw format sends the UTF-8 prompt as the body"""
+        from app.services import encode_gateway_content
+
+        content_type, body = encode_gateway_content("hola 🤖", "raw")
+
+        assert content_type == "text/plain; charset=utf-8"
+        assert body == "hola 🤖".encode("utf-8")
+
+    def test_msgpack_format(self):
+        """The msgpack format packs the prompt map"""
+        msgpack = pytest.importorskip("msgpack")
+        from app.services import encode_gateway_content
+
+        content_type, body = encode_gateway_content("hola", "msgpack")
+
+        assert content_type == "application/msgpack"
+        assert msgpack.unpackb(body) == {"prompt": "hola"}
+
+    @pytest.mark.asyncio
+    @patch('app.services.GATEWAY_FORMAT', 'raw')
+    @patch('app.services.GATEWAY_API_URL', 'http://gateway/send')
+    async def test_gateway_uses_configured_format(self):
+        """send_message_to_gateway posts the body and Content-Type of the configured format"""
+        captured = []
+
+        def handler(request):
+            captured.append(request)
+            return httpx.Response(200)
+
+        request = MagicMock()
+        request.state.logger.extra = {"request_id": "req-1"}
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        with patch('app.services.get_http_client', return_value=http):
+            await send_message_to_gateway("hola", "42", request)
+
+        assert captured[0].content == b"hola"
+        assert captured[0].headers["content-type"] == "text/plain; charset=utf-8"
+        assert captured[0].headers["x-routing-id"] == "telegram:42"
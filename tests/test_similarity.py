@@ -0,0 +1,150 @@
+import pytest
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.similarity import SimilarityCache, normalize, response_similarity
+from app.services import ask_llm
+
+
+class TestNormalize:
+    """Test suite for prompt normalization"""
+
+    def test_case_punctuation_and_accents(self):
+        """Case, punctuation and accents do not change the normalized prompt"""
+        assert normalize("Café  OPEN?!") == normalize("cafe open")
+
+    def test_shorthand_is_expanded(self):
+        """Common chat shorthand is expanded to the full words"""
+        assert normalize("what r ur hours") == normalize("What are your hours?")
+
+
+class TestSimilarityCache:
+    """Test suite for the MinHash LSH prompt cache"""
+
+    def test_near_duplicate_is_a_hit(self):
+        """A reworded prompt gets the answer cached for the original"""
+        cache = SimilarityCache(threshold=0.6)
+        cache.put("how do I reset my password", "Use the reset link.")
+
+        hit = cache.lookup("How can i reset my password?")
+
+        assert hit is not None
+        response, score = hit
+        assert response == "Use the reset link."
+        assert score >= 0.6
+        assert cache.hits == 1
+
+    def test_unrelated_prompt_is_a_miss(self):
+        """Prompts about something else never share an answer"""
+        cache = SimilarityCache(threshold=0.8)
+        cache.put("how do I reset my password", "Use the reset link.")
+
+        assert cache.lookup("what is the weather in paris tomorrow") is None
+        assert cache.misses == 1
+
+    def test_scopes_are_isolated(self):
+        """An answer cached for one bot is not returned for another"""
+        cache = SimilarityCache()
+        cache.put("what are your hours", "9 to 5", scope="shop")
+
+        assert cache.lookup("what are your hours", scope="support") is None
+        assert cache.lookup("what are your hours", scope="shop")[0] == "9 to 5"
+
+    def test_eviction_bounds_entries_and_buckets(self):
+        """Past maxsize the least recently used entries go, together with their index buckets"""
+        cache = SimilarityCache(maxsize=2)
+        cache.put("first question about billing", "a")
+        cache.put("second question about shipping", "b")
+        cache.lookup("first question about billing")
+        cache.put("third question about returns", "c")
+
+        assert len(cache) == 2
+        assert cache.lookup("second question about shipping") is None
+        assert cache.lookup("first question about billing")[0] == "a"
+        assert cache.stats()["buckets"] <= 2 * cache.bands
+
+    def test_expired_entries_are_dropped(self):
+        """Entries older than the ttl are not returned"""
+        cache = SimilarityCache(ttl=10)
+        with patch('app.similarity.time.monotonic', return_value=time.monotonic() - 20):
+            cache.put("what are your hours", "9 to 5")
+
+        assert cache.lookup("what are your hours") is None
+        assert len(cache) == 0
+
+    def test_long_prompts_are_not_cached(self):
+        """Prompts over max_chars skip hashing entirely"""
+        cache = SimilarityCache(max_chars=10)
+        cache.put("a prompt longer than ten characters", "x")
+
+        assert len(cache) == 0
+
+    def test_response_similarity(self):
+        """Identical answers agree fully and unrelated ones not at all"""
+        assert response_similarity("Open 9 to 5.", "open 9 to 5") == 1.0
+        assert response_similarity("yes", "no") == 0.0
+
+
+class TestCachedAskLlm:
+    """Test suite for ask_llm with the similarity cache"""
+
+    @pytest.fixture
+    def request_mock(self):
+        request = MagicMock()
+        request.state.logger.extra = {"request_id": "req-1"}
+        return request
+
+    @pytest.mark.asyncio
+    async def test_on_mode_answers_from_cache(self, request_mock):
+        """In on mode a near-duplicate prompt is answered without calling the LLM"""
+        cache = SimilarityCache(threshold=0.6)
+        upstream = AsyncMock(return_value="Use the reset link.")
+
+        with patch('app.services.SIMILARITY_CACHE_MODE', "on"), patch('app.services.similarity_cache', cache), \
+             patch('app.services._ask_llm', upstream):
+            first = await ask_llm("how do I reset my password", request_mock)
+            second = await ask_llm("how can I reset my password?", request_mock)
+
+        assert first == second == "Use the reset link."
+        upstream.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_shadow_mode_always_asks_the_llm(self, request_mock):
+        """In shadow mode hits are measured but the LLM answer is always returned"""
+        cache = SimilarityCache(threshold=0.6)
+        upstream = AsyncMock(side_effect=["cached answer", "fresh answer"])
+
+        with patch('app.services.SIMILARITY_CACHE_MODE', "shadow"), patch('app.services.similarity_cache', cache), \
+             patch('app.services._ask_llm', upstream):
+            await ask_llm("what are your hours", request_mock)
+            answer = await ask_llm("what r ur hours", request_mock)
+
+        assert answer == "fresh answer"
+        assert upstream.await_count == 2
+        assert cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_miss_hashes_the_prompt_once(self, request_mock):
+        """The signature computed for the lookup is reused to store the answer"""
+        cache = SimilarityCache()
+        upstream = AsyncMock(return_value="9 to 5")
+
+        with patch('app.services.SIMILARITY_CACHE_MODE', "on"), patch('app.services.similarity_cache', cache), \
+             patch('app.services._ask_llm', upstream), \
+             patch.object(cache.hasher, 'signature', wraps=cache.hasher.signature) as signature:
+            await ask_llm("what are your hours", request_mock)
+
+        assert signature.call_count == 1
+        assert len(cache) == 1
+
+    @pytest.mark.asyncio
+    async def test_off_mode_bypasses_the_cache(self, request_mock):
+        """With the cache off nothing is looked up or stored"""
+        cache = SimilarityCache()
+        upstream = AsyncMock(return_value="answer")
+
+        with patch('app.services.SIMILARITY_CACHE_MODE', "off"), patch('app.services.similarity_cache', cache), \
+             patch('app.services._ask_llm', upstream):
+            await ask_llm("what are your hours", request_mock)
+
+        assert len(cache) == 0
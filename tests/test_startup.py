@@ -0,0 +1,81 @@
+import pytest
+import os
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+from app.lifecycle import Readiness, WorkTracker
+import app.main as main
+
+IMPORT_BUDGET_SECONDS = 2.0
+
+
+class TestReadiness:
+    """Test suite for the /ready endpoint and pool warmup"""
+
+    def test_not_ready_before_warmup(self):
+        """/ready answers 503 until startup work has finished"""
+        client = TestClient(main.app)
+
+        with patch.object(main, 'readiness', Readiness()):
+            response = client.get("/ready")
+
+        assert response.status_code == 503
+        assert response.json()["ready"] is False
+
+    def test_ready_after_pools_are_warm(self, default_bot):
+        """Startup warms the connection pool and then reports ready"""
+        state = Readiness()
+        warm = AsyncMock(return_value={"https://api.telegram.org/": "ok"})
+
+        with patch.object(main, 'readiness', state), \
+             patch.object(main, 'work', WorkTracker()), \
+             patch('app.main.warm_http_client', warm), \
+             patch('app.main.close_http_client', new_callable=AsyncMock), \
+             patch('app.main.WARMUP_ENABLED', True):
+            with TestClient(main.app) as client:
+                for _ in range(100):
+                    if state.ready:
+                        break
+                    client.get("/health")
+                response = client.get("/ready")
+
+        assert response.status_code == 200
+        assert response.json()["warmup"] == {"https://api.telegram.org/": "ok"}
+        warm.assert_awaited_once()
+
+
+class TestColdStart:
+    """Test suite for import-time cost of app.main"""
+
+    @pytest.mark.slow
+    def test_import_is_quiet_and_within_budget(self):
+        """Importing app.main needs no configuration, prints nothing and stays within budget"""
+        env = {k: v for k, v in os.environ.items() if k != "TELEGRAM_TOKEN"}
+        env["SKIP_DOTENV"] = "true"
+        snippet = "import time; t = time.perf_counter(); import app.main; import sys; sys.stderr.write(str(time.perf_counter() - t))"
+
+        result = subprocess.run(
+            [sys.executable, "-c", snippet],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, capture_output=True, text=True,
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout == ""
+        assert float(result.stderr.strip().splitlines()[-1]) < IMPORT_BUDGET_SECONDS
+
+    @pytest.mark.slow
+    def test_httpx_is_not_imported(self):
+        """httpx stays off the import path until the first outbound request"""
+        env = {**os.environ, "SKIP_DOTENV": "true"}
+        snippet = "import app.main, sys; print('httpx' in sys.modules)"
+
+        result = subprocess.run(
+            [sys.executable, "-c", snippet],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, capture_output=True, text=True,
+        )
+
+        assert result.stdout.strip() == "False", result.stderr
@@ -0,0 +1,153 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+from app.ratelimit import KeyedRateLimiter
+from app.throttle import InboundThrottle, parse_tiers, parse_user_tiers
+from app.main import app
+from app import config
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("default_bot")
+
+
+def make_throttle(**overrides):
+    options = dict(
+        tiers=parse_tiers("default=1/2,trusted=1/5,staff=0"),
+        user_tiers=parse_user_tiers("10=trusted,11=staff,12=missing"),
+        chat_rate=0,
+        chat_burst=0,
+        maxsize=100,
+    )
+    options.update(overrides)
+    return InboundThrottle(**options)
+
+
+class TestInboundThrottle:
+    """Test suite for per-user and per-chat inbound limits"""
+
+    def test_user_is_limited_to_tier_burst(self):
+        """A default-tier user is throttled once the burst is used up"""
+        throttle = make_throttle()
+
+        results = [throttle.check("default", 1, 1) for _ in range(3)]
+
+        assert results == [None, None, "user"]
+
+    def test_tiers_change_the_limit(self):
+        """Trusted users get a bigger burst, staff are unlimited, unknown tiers fall back to default"""
+        throttle = make_throttle()
+
+        assert [throttle.check("default", 10, 10) for _ in range(5)] == [None] * 5
+        assert all(throttle.check("default", 11, 11) is None for _ in range(50))
+        assert throttle.tier(12) == "default"
+
+    def test_chat_limit_applies_across_users(self):
+        """Many users in one group share the chat limit"""
+        throttle = make_throttle(chat_rate=1, chat_burst=3)
+
+        results = [throttle.check("default", user_id, -100) for user_id in range(4)]
+
+        assert results == [None, None, None, "chat"]
+
+    def test_updates_without_a_chat_only_use_the_user_limit(self):
+        """Inline callback queries have no chat and must not share one chat bucket"""
+        throttle = make_throttle(chat_rate=1, chat_burst=3)
+
+        results = [throttle.check("default", user_id, None) for user_id in range(6)]
+
+        assert results == [None] * 6
+
+    def test_chat_limited_message_does_not_use_the_user_allowance(self):
+        """A message refused by the chat limit leaves the sender's own bucket untouched"""
+        throttle = make_throttle(chat_rate=1, chat_burst=1)
+
+        assert throttle.check("default", 1, -100) is None
+        assert [throttle.check("default", 1, -100) for _ in range(3)] == ["chat"] * 3
+        assert [throttle.check("default", 1, 1) for _ in range(2)] == [None, "user"]
+
+    def test_limiter_memory_is_bounded(self):
+        """Only maxsize keys are kept"""
+        limiter = KeyedRateLimiter(rate=1, burst=1, maxsize=10)
+        for key in range(100):
+            limiter.try_acquire(key)
+
+        assert len(limiter) == 10
+
+    def test_disabled_throttle_allows_everything(self):
+        """With limits disabled nothing is throttled"""
+        throttle = make_throttle(enabled=False)
+
+        assert all(throttle.check("default", 1, 1) is None for _ in range(10))
+
+
+class TestTierConfig:
+    """Test suite for parsing and validating the tier settings"""
+
+    def test_bad_tier_spec_does_not_raise_at_import(self):
+        """Malformed entries are skipped when parsed, so importing the app never fails"""
+        assert parse_tiers("default=fast,trusted=2/40") == {"trusted": (2.0, 40.0), "default": (0.0, 0.0)}
+
+    @pytest.mark.parametrize("tiers,users", [
+        ("default=fast", ""),
+        ("default=1/0", ""),
+        ("default=1/5", "alice=default"),
+        ("default=1/5", "10=trsuted"),
+        ("default=1/5", "10"),
+    ])
+    def test_validate_config_rejects_bad_tiers(self, tiers, users):
+        """validate_config() reports bad tier settings at startup"""
+        with patch('app.config.TELEGRAM_TOKEN', "token"), \
+                patch('app.config.INBOUND_LIMIT_TIERS', tiers), \
+                patch('app.config.INBOUND_USER_TIERS', users):
+            with pytest.raises(ValueError, match="INBOUND_"):
+                config.validate_config()
+
+    def test_validate_config_accepts_good_tiers(self):
+        """Well formed tiers pass validation"""
+        with patch('app.config.TELEGRAM_TOKEN', "token"), \
+                patch('app.config.INBOUND_LIMIT_TIERS', "default=0.5/10,trusted=2/40,staff=0"), \
+                patch('app.config.INBOUND_USER_TIERS', "10=trusted, -5=staff"):
+            config.validate_config()
+
+
+class TestWebhookThrottling:
+    """Test suite for throttling in the webhook"""
+
+    @pytest.fixture
+    def throttle(self):
+        throttle = make_throttle(tiers=parse_tiers("default=0.001/1"))
+        with patch('app.api.throttle', throttle):
+            yield throttle
+
+    @patch('app.api.traffic.gateway_percent', 0)
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    def test_over_limit_message_is_dropped_before_llm(self, mock_ask_llm, mock_send_telegram, throttle):
+        """The second message in the window never reaches the LLM"""
+        mock_ask_llm.return_value = "hi"
+        payload = {"message": {"text": "hello", "from": {"id": 5}, "chat": {"id": 5}}}
+
+        first = client.post("/telegram/webhook", json=payload)
+        second = client.post("/telegram/webhook", json=payload)
+
+        assert first.json()["source"] == "llm"
+        assert second.status_code == 200
+        assert second.json() == {"ok": True, "throttled": "user"}
+        assert mock_ask_llm.await_count == 1
+        assert 'anygram_inbound_throttled_total{scope="user",tier="default"}' in client.get("/metrics").text
+
+    @patch('app.api.INBOUND_THROTTLE_ACTION', "reply")
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    def test_reply_action_sends_one_notice(self, mock_ask_llm, mock_send_telegram, throttle):
+        """In reply mode a flooding chat gets a single canned notice"""
+        throttle.check("default", 6, 6)
+        payload = {"message": {"text": "hello", "from": {"id": 6}, "chat": {"id": 6}}}
+
+        for _ in range(3):
+            client.post("/telegram/webhook", json=payload)
+
+        mock_ask_llm.assert_not_awaited()
+        assert mock_send_telegram.await_count == 1
@@ -0,0 +1,222 @@
+import pytest
+import asyncio
+import httpx
+import json
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.tracing import Tracer, FileExporter, OTLPExporter, NOOP_SPAN, parse_traceparent
+from app.main import app
+
+client = TestClient(app)
+INCOMING = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+pytestmark = pytest.mark.usefixtures("default_bot")
+
+
+class RecordingExporter:
+    def __init__(self):
+        self.spans = []
+
+    async def export(self, spans):
+        self.spans.extend(spans)
+
+
+class TestTraceContext:
+    """Test suite for W3C traceparent handling"""
+
+    def test_parse_traceparent(self):
+        """Valid headers are parsed, malformed or all-zero ones are ignored"""
+        assert parse_traceparent(INCOMING) == ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)
+        assert parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+        assert parse_traceparent("garbage") is None
+        assert parse_traceparent(None) is None
+
+    def test_disabled_tracer_is_a_no_op(self):
+        """With tracing off no span objects are created and nothing is injected"""
+        tracer = Tracer(enabled=False)
+
+        with tracer.start_trace("GET /", INCOMING) as root:
+            with tracer.span("llm.ask") as span:
+                headers = tracer.inject({})
+
+        assert root is NOOP_SPAN and span is NOOP_SPAN
+        assert headers == {}
+
+
+class TestSampling:
+    """Test suite for head and tail sampling"""
+
+    @pytest.mark.asyncio
+    async def test_sampled_parent_is_continued(self):
+        """An incoming sampled trace keeps its id and child spans are linked to it"""
+        exporter = RecordingExporter()
+        tracer = Tracer(enabled=True, sample_rate=0, exporter=exporter)
+
+        with tracer.start_trace("POST /telegram/webhook", INCOMING) as root:
+            with tracer.span("llm.ask") as span:
+                headers = tracer.inject({})
+
+        assert await tracer.flush() == 2
+        assert {s.trace.trace_id for s in exporter.spans} == {"4bf92f3577b34da6a3ce929d0e0e4736"}
+        assert root.parent_id == "00f067aa0ba902b7"
+        assert span.parent_id == root.span_id
+        assert headers["traceparent"] == f"00-4bf92f3577b34da6a3ce929d0e0e4736-{span.span_id}-01"
+
+    @pytest.mark.asyncio
+    async def test_tail_sampling_keeps_errors_only(self):
+        """Unsampled traces are exported when they fail and dropped when they succeed"""
+        exporter = RecordingExporter()
+        tracer = Tracer(enabled=True, sample_rate=0, tail_errors=True, exporter=exporter)
+
+        with tracer.start_trace("ok"):
+            with tracer.span("llm.ask") as span:
+                span.set_status_code(200)
+        with tracer.start_trace("failed"):
+            with tracer.span("llm.ask") as span:
+                span.set_status_code(502)
+
+        await tracer.flush()
+        assert [s.name for s in exporter.spans] == ["failed", "llm.ask"]
+        assert exporter.spans[1].error == "HTTP 502"
+
+    @pytest.mark.asyncio
+    async def test_tail_sampling_keeps_slow_traces(self):
+        """Unsampled traces slower than tail_slow are exported"""
+        exporter = RecordingExporter()
+        tracer = Tracer(enabled=True, sample_rate=0, tail_slow=0.000001, exporter=exporter)
+
+        with tracer.start_trace("slow"):
+            sum(range(10000))
+
+        await tracer.flush()
+        assert [s.name for s in exporter.spans] == ["slow"]
+
+    @pytest.mark.asyncio
+    async def test_unsampled_trace_without_tail_sampling_records_nothing(self):
+        """Without tail sampling, unsampled traces only propagate their context"""
+        tracer = Tracer(enabled=True, sample_rate=0, exporter=RecordingExporter())
+
+        with tracer.start_trace("GET /") as root:
+            with tracer.span("llm.ask"):
+                headers = tracer.inject({})
+
+        assert root.trace.spans == []
+        assert headers["traceparent"].endswith("-00")
+        assert await tracer.flush() == 0
+
+
+class TestShutdown:
+    """Test suite for exporting the last spans at shutdown"""
+
+    @pytest.mark.asyncio
+    async def test_close_waits_for_an_export_in_progress(self):
+        """Spans taken by a running export are not lost when the exporter is stopped"""
+        exported, started = [], asyncio.Event()
+
+        class SlowExporter:
+            async def export(self, spans):
+                started.set()
+                await asyncio.sleep(0.05)
+                exported.extend(spans)
+
+        tracer = Tracer(enabled=True, sample_rate=1, exporter=SlowExporter())
+        with tracer.start_trace("GET /"):
+            pass
+        tracer.start_exporter(0.001)
+        await started.wait()
+        with tracer.start_trace("GET /later"):
+            pass
+
+        await tracer.close()
+
+        assert [span.name for span in exported] == ["GET /", "GET /later"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_export_puts_spans_back(self):
+        """A flush cancelled mid-export leaves its spans in the buffer"""
+        class HangingExporter:
+            async def export(self, spans):
+                await asyncio.sleep(10)
+
+        tracer = Tracer(enabled=True, sample_rate=1, exporter=HangingExporter())
+        with tracer.start_trace("GET /"):
+            pass
+        flush = asyncio.create_task(tracer.flush())
+        await asyncio.sleep(0)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+
+        assert [span.name for span in tracer._buffer] == ["GET /"]
+
+
+class TestExporters:
+    """Test suite for span exporters"""
+
+    @pytest.mark.asyncio
+    async def test_file_exporter_writes_otlp_json_lines(self, tmp_path):
+        """Spans are appended as NDJSON in the OTLP span shape"""
+        path = tmp_path / "traces.ndjson"
+        tracer = Tracer(enabled=True, sample_rate=1, exporter=FileExporter(str(path)))
+
+        with tracer.start_trace("GET /health", **{"http.method": "GET"}) as root:
+            root.set_status_code(200)
+        await tracer.flush()
+
+        span = json.loads(path.read_text().splitlines()[0])
+        assert span["name"] == "GET /health"
+        assert span["kind"] == 2
+        assert {"key": "http.status_code", "value": {"intValue": "200"}} in span["attributes"]
+
+    @pytest.mark.asyncio
+    async def test_otlp_exporter_posts_to_collector(self):
+        """Spans are posted to the collector as OTLP/HTTP JSON"""
+        received = []
+
+        def collector(request):
+            received.append(json.loads(request.content))
+            return httpx.Response(200, json={})
+
+        tracer = Tracer(enabled=True, sample_rate=1, exporter=OTLPExporter("http://collector/v1/traces"))
+        with tracer.start_trace("GET /"):
+            pass
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(collector)) as mock_client:
+            with patch('app.http_client.get_http_client', return_value=mock_client):
+                assert await tracer.flush() == 1
+
+        spans = received[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert spans[0]["name"] == "GET /"
+
+
+class TestRequestTracing:
+    """Test suite for tracing through the webhook"""
+
+    def test_webhook_propagates_traceparent_to_llm(self):
+        """The LLM call carries a traceparent that continues the inbound trace"""
+        exporter = RecordingExporter()
+        tracer = Tracer(enabled=True, sample_rate=0, exporter=exporter)
+        upstream = []
+
+        def handler(request):
+            upstream.append(request)
+            if "api.telegram.org" in str(request.url):
+                return httpx.Response(200, json={"ok": True})
+            return httpx.Response(200, json={"response": "hi"})
+
+        mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch('app.main.tracer', tracer), patch('app.services.tracer', tracer), \
+             patch('app.api.traffic.gateway_percent', 0), \
+             patch('app.services.get_http_client', return_value=mock_client):
+            response = client.post("/telegram/webhook", json={"message": {"text": "hi", "chat": {"id": 1}}},
+                                   headers={"traceparent": INCOMING})
+
+        assert response.status_code == 200
+        llm_request = next(r for r in upstream if "api.telegram.org" not in str(r.url))
+        trace_id, parent_id, sampled = parse_traceparent(llm_request.headers["traceparent"])
+        assert trace_id == "4bf92f3577b34da6a3ce929d0e0e4736" and sampled
+
+        names = {span.span_id: span.name for span in tracer._buffer}
+        assert names[parent_id] == "llm.ask"
+        assert set(names.values()) == {"POST /telegram/webhook", "llm.ask", "telegram.sendMessage"}
@@ -0,0 +1,165 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+from app.traffic import TrafficSplitter, GATEWAY, LLM
+from app.main import app
+
+client = TestClient(app)
+
+TEXT_UPDATE = {"update_id": 1, "message": {"text": "hello", "chat": {"id": 42}}}
+
+pytestmark = pytest.mark.usefixtures("default_bot")
+
+
+class TestTrafficSplitter:
+    """Test suite for the TrafficSplitter"""
+
+    def test_split_follows_percentage(self):
+        """0% and 100% send everything to one side"""
+        splitter = TrafficSplitter(gateway_percent=100)
+        assert splitter.choose() == GATEWAY
+
+        splitter.set_split(0)
+        assert splitter.choose() == LLM
+
+    def test_set_split_is_clamped(self):
+        """Out of range percentages are clamped"""
+        splitter = TrafficSplitter(gateway_percent=50)
+
+        splitter.set_split(150)
+
+        assert splitter.gateway_percent == 100
+
+    @pytest.mark.asyncio
+    async def test_saturated_path_overflows(self):
+        """When the chosen path is at max_in_flight traffic overflows to the other one"""
+        splitter = TrafficSplitter(gateway_percent=100, max_in_flight=1)
+
+        async with splitter.track(GATEWAY):
+            assert splitter.choose() == LLM
+
+        assert splitter.choose() == GATEWAY
+
+    @pytest.mark.asyncio
+    async def test_unused_gateway_takes_no_overflow(self):
+        """With 0% to the gateway and GATEWAY_ENABLED off, a saturated LLM path does not spill over"""
+        splitter = TrafficSplitter(gateway_percent=0, max_in_flight=1)
+
+        async with splitter.track(LLM):
+            assert splitter.choose() == LLM
+            assert splitter.fallback(LLM) is None
+
+    @pytest.mark.asyncio
+    async def test_erroring_path_is_tripped(self):
+        """A path whose error rate crosses the threshold is taken out of rotation"""
+        splitter = TrafficSplitter(gateway_percent=100, error_threshold=0.5, min_samples=3, alpha=0.5)
+
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                async with splitter.track(GATEWAY):
+                    raise RuntimeError("gateway down")
+
+        assert splitter.available(GATEWAY) is False
+        assert splitter.choose() == LLM
+        assert splitter.fallback(LLM) is None
+
+    @pytest.mark.asyncio
+    async def test_reset_clears_tripped_paths(self):
+        """reset() puts tripped paths back in rotation"""
+        splitter = TrafficSplitter(gateway_percent=100, min_samples=1, alpha=1.0)
+        with pytest.raises(RuntimeError):
+            async with splitter.track(GATEWAY):
+                raise RuntimeError("gateway down")
+
+        splitter.reset()
+
+        assert splitter.available(GATEWAY) is True
+
+
+class TestWebhookRouting:
+    """Test suite for runtime routing in the webhook"""
+
+    @patch('app.api.traffic', TrafficSplitter(gateway_percent=100))
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    @patch('app.api.send_message_to_gateway', new_callable=AsyncMock)
+    def test_gateway_failure_fails_over_to_llm(self, mock_gateway, mock_ask_llm, mock_send_telegram):
+        """A failing gateway call is retried on the direct LLM path"""
+        mock_gateway.side_effect = RuntimeError("gateway down")
+        mock_ask_llm.return_value = "direct answer"
+
+        response = client.post("/telegram/webhook", json=TEXT_UPDATE)
+
+        assert response.status_code == 200
+        assert response.json() == {"ok": True, "source": "llm"}
+        assert mock_send_telegram.call_args[0][0].text == "direct answer"
+
+    @patch('app.api.traffic', TrafficSplitter(gateway_percent=0, gateway_enabled=True))
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    @patch('app.api.send_message_to_gateway', new_callable=AsyncMock)
+    def test_llm_failure_fails_over_to_gateway(self, mock_gateway, mock_ask_llm):
+        """A failing LLM call hands the message to an enabled gateway"""
+        mock_ask_llm.side_effect = RuntimeError("llm down")
+
+        response = client.post("/telegram/webhook", json=TEXT_UPDATE)
+
+        assert response.status_code == 200
+        assert response.json() == {"ok": True, "source": "gateway"}
+        mock_gateway.assert_awaited_once()
+
+    @patch('app.api.traffic', TrafficSplitter(gateway_percent=0))
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    @patch('app.api.send_message_to_gateway', new_callable=AsyncMock)
+    def test_llm_failure_without_gateway_is_an_error(self, mock_gateway, mock_ask_llm):
+        """With the gateway unused, a failing LLM call is not sent to it"""
+        mock_ask_llm.side_effect = RuntimeError("llm down")
+
+        response = client.post("/telegram/webhook", json=TEXT_UPDATE)
+
+        assert response.status_code == 500
+        mock_gateway.assert_not_awaited()
+
+
+class TestRoutingAdmin:
+    """Test suite for the /admin/routing endpoint"""
+
+    def test_admin_disabled_without_token(self):
+        """Without ADMIN_TOKEN the admin API is disabled"""
+        with patch('app.admin.ADMIN_TOKEN', None):
+            response = client.get("/admin/routing")
+
+        assert response.status_code == 403
+
+    def test_admin_rejects_wrong_token(self):
+        """A wrong admin token is rejected"""
+        with patch('app.admin.ADMIN_TOKEN', 's3cret'):
+            response = client.get("/admin/routing", headers={"X-Admin-Token": "nope"})
+
+        assert response.status_code == 401
+
+    def test_update_split_at_runtime(self):
+        """PUT /admin/routing changes the split without a restart"""
+        splitter = TrafficSplitter(gateway_percent=0)
+
+        with patch('app.admin.ADMIN_TOKEN', 's3cret'), patch('app.admin.traffic', splitter):
+            response = client.put(
+                "/admin/routing",
+                json={"gateway_percent": 30},
+                headers={"X-Admin-Token": "s3cret"},
+            )
+
+        assert response.status_code == 200
+        assert response.json()["gateway_percent"] == 30
+        assert splitter.gateway_percent == 30
+
+    def test_update_split_validates_range(self):
+        """Percentages outside 0-100 are rejected"""
+        with patch('app.admin.ADMIN_TOKEN', 's3cret'):
+            response = client.put(
+                "/admin/routing",
+                json={"gateway_percent": 130},
+                headers={"X-Admin-Token": "s3cret"},
+            )
+
+        assert response.status_code == 422
@@ -0,0 +1,121 @@
+import pytest
+import json
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+from app.bots import BotRegistry
+from app.metrics import metrics
+from app.main import app
+
+client = TestClient(app)
+
+VALID_UPDATE = {"update_id": 1, "message": {"text": "hello", "chat": {"id": 42}}}
+
+pytestmark = pytest.mark.usefixtures("default_bot")
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+
+
+@pytest.fixture
+def secured_registry(tmp_path):
+    path = tmp_path / "bots.json"
+    path.write_text(json.dumps({"bots": [{"id": "support", "token": "t1", "secret_token": "support-secret"}]}))
+    registry = BotRegistry(str(path), default_token="default-token", default_secret="default-secret")
+    with patch('app.api.registry', registry):
+        yield registry
+
+
+class TestSecretToken:
+    """Test suite for X-Telegram-Bot-Api-Secret-Token verification"""
+
+    @patch('app.api.read_update', new_callable=AsyncMock)
+    def test_missing_secret_is_rejected_before_reading_body(self, mock_read_update, secured_registry):
+        """Requests without the secret never get their body parsed"""
+        response = client.post("/telegram/webhook", json=VALID_UPDATE)
+
+        assert response.status_code == 401
+        mock_read_update.assert_not_called()
+        assert metrics.get("anygram_webhook_rejected_total", reason="secret_token") == 1
+
+    def test_wrong_secret_is_rejected(self, secured_registry):
+        """A wrong secret is rejected for a per-bot webhook path"""
+        response = client.post(
+            "/telegram/support/webhook",
+            json=VALID_UPDATE,
+            headers={"X-Telegram-Bot-Api-Secret-Token": "nope"},
+        )
+
+        assert response.status_code == 401
+
+    @patch('app.api.traffic.gateway_percent', 0)
+    @patch('app.api.send_telegram_message', new_callable=AsyncMock)
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    def test_secret_selects_bot_on_shared_path(self, mock_ask_llm, mock_send_telegram, secured_registry):
+        """On /telegram/webhook the secret token identifies which bot the update is for"""
+        mock_ask_llm.return_value = "hi"
+
+        response = client.post(
+            "/telegram/webhook",
+            json=VALID_UPDATE,
+            headers={"X-Telegram-Bot-Api-Secret-Token": "support-secret"},
+        )
+
+        assert response.status_code == 200
+        assert mock_send_telegram.call_args.kwargs["bot"].id == "support"
+
+
+class TestWebhookBodyChecks:
+    """Test suite for body size limits and update type filtering"""
+
+    @patch('app.api.WEBHOOK_MAX_BODY_BYTES', 10)
+    def test_oversized_body_is_rejected(self):
+        """Bodies over WEBHOOK_MAX_BODY_BYTES get a 413"""
+        response = client.post("/telegram/webhook", json=VALID_UPDATE)
+
+        assert response.status_code == 413
+        assert metrics.get("anygram_webhook_rejected_total", reason="body_too_large") == 1
+
+    def test_invalid_json_is_rejected(self):
+        """Malformed JSON gets a 400 instead of a 500"""
+        response = client.post("/telegram/webhook", content=b"{not json", headers={"Content-Type": "application/json"})
+
+        assert response.status_code == 400
+        assert metrics.get("anygram_webhook_rejected_total", reason="invalid_json") == 1
+
+    @patch('app.api.ask_llm', new_callable=AsyncMock)
+    def test_disallowed_update_type_is_acknowledged_and_ignored(self, mock_ask_llm):
+        """Update types outside the allowlist are answered 200 without upstream calls"""
+        response = client.post("/telegram/webhook", json={"update_id": 1, "edited_message": {"text": "x"}})
+
+        assert response.status_code == 200
+        assert response.json() == {"ok": True, "ignored": "edited_message"}
+        mock_ask_llm.assert_not_called()
+        assert metrics.get("anygram_webhook_ignored_total", update_type="edited_message") == 1
+
+    def test_unknown_update_types_share_one_label(self):
+        """Keys that are not Telegram update types cannot add metric series or break /metrics"""
+        for key in ('x"} 1\nfake_metric 2', "junk"):
+            client.post("/telegram/webhook", json={"update_id": 1, key: {}})
+
+        assert metrics.get("anygram_webhook_ignored_total", update_type="other") == 2
+        assert "fake_metric" not in client.get("/metrics").text
+
+    def test_label_values_are_escaped(self):
+        """Quotes, backslashes and newlines in label values are escaped in the text format"""
+        metrics.inc("anygram_test_total", reason='a"b\\c\nd')
+
+        assert 'anygram_test_total{reason="a\\"b\\\\c\\nd"} 1' in metrics.render()
+
+    def test_rejections_are_exposed_in_metrics_endpoint(self):
+        """Rejection counters appear on /metrics"""
+        client.post("/telegram/webhook", content=b"[]", headers={"Content-Type": "application/json"})
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert 'anygram_webhook_rejected_total{reason="invalid_json"} 1' in response.text
+        assert "anygram_admission_in_flight" in response.text